@@ -0,0 +1,360 @@
+import os
+import sys
+import gc
+import json
+import math
+import time
+import random
+import argparse
+import contextlib
+
+import sim
+
+# Scaling benchmark over synthetic worlds, driven through the offline stand-in.
+# For every world size the bot is initialized, stepped through the full update
+# callback and then every public Bot method is timed on its own.
+#
+#   python bench.py                                   # default sizes, compare with the baseline
+#   python bench.py --sizes 1000 10000 --repeat 20
+#   python bench.py --save-baseline                   # store the current numbers as the baseline
+#   python bench.py --add-to-baseline                 # store only metrics the baseline does not have yet
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+SIZES = (1000, 3000, 10000, 30000, 100000)
+
+# share of entities per faction: own, enemy, neutral (deposits, trees, plants)
+MIXES = {
+    "balanced": (0.15, 0.35, 0.50),
+    "siege": (0.10, 0.60, 0.30),
+    "economy": (0.35, 0.15, 0.50),
+}
+
+# own buildings placed around the nucleus, the rest of the own share are units
+OWN_BUILDINGS = (
+    ("drill", 8), ("pump", 2), ("factory", 2), ("laboratory", 2), ("forgepress", 3),
+    ("smelter", 2), ("concrete plant", 1), ("bot assembler", 1), ("arsenal", 1),
+    ("experimental assembler", 1), ("generator", 1), ("talos", 4),
+)
+OWN_UNITS = (("juggernaut", 5), ("ATV", 2), ("colossus", 1))
+ENEMY_UNITS = (("golem", 5), ("eagle", 1), ("thor", 1), ("kitsune", 1))
+
+METHODS = {
+    "snapshot": lambda bot: bot.index(),
+    "get_own_buildings": lambda bot: bot.get_own_buildings(),
+    "assign_recipes": lambda bot: bot.assign_recipes(),
+    "attack": lambda bot: bot.attack(closest_to_self=True),
+    # what defend() runs once the army is big, every enemy on the map is a target
+    "attack (aggression)": lambda bot: bot.attack(aggression=True, closest_to_self=True),
+    "attack_nearest_enemies": lambda bot: bot.attack_nearest_enemies(),
+    "scatter": lambda bot: bot.scatter(),
+    "send_to_talos": lambda bot: bot.send_to_talos(),
+    "build_talos": lambda bot: (bot.build_talos(with_gap=True), bot.planner.poll(bot.step)),
+    "build_talos2": lambda bot: (bot.build_talos2(), bot.planner.poll(bot.step)),
+    "get_closest_ores": lambda bot: bot.get_closest_ores(),
+}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def weighted(items, rng):
+    names = [name for name, _ in items]
+    weights = [w for _, w in items]
+    return lambda: rng.choices(names, weights)[0]
+
+
+def build_world(size, mix="balanced", enemies=1, seed=0):
+    # a planet with tile spacing of the default sim map and about `size` entities
+    rng = random.Random(seed)
+    positions = max(6000, size)
+    sim_map = sim.SimMap.sphere(count=positions, radius=600.0 * math.sqrt(positions / 6000))
+    game = sim.SimGame(seed=seed, sim_map=sim_map, rules=False)
+    unit = lambda name: game.proto_id(sim.Prototype.Unit, name)
+    own_share, enemy_share, _ = MIXES[mix]
+
+    me = game.add_force()
+    forces = [game.add_force(sim.Policy.Enemy) for _ in range(enemies)]
+    spawns = [rng.randrange(positions) for _ in range(enemies + 1)]
+    # entities of a faction are spread over an area that grows with the world
+    spread = 200 + 4 * math.sqrt(size)
+    areas = [game.map.area_neighborhood(s, spread) for s in spawns]
+
+    game.add_entity(unit("nucleus"), spawns[0], force=me)
+    own_budget = int(size * own_share)
+    deposit_recipes = {}
+    for name, n in OWN_BUILDINGS:
+        for _ in range(n):
+            pos = rng.choice(areas[0])
+            recipe = None
+            if name in ("drill", "pump"):
+                deposit = "oil deposit" if name == "pump" else rng.choice(["metal deposit", "crystals deposit"])
+                game.add_entity(unit(deposit), pos)
+                recipe = deposit_recipes.get((name, deposit))
+                if recipe is None:
+                    for r in game.prototypes.unit(unit(name)).get("recipes", []):
+                        if game.prototypes.recipes(r).get("placeOver") == unit(deposit):
+                            recipe = deposit_recipes[(name, deposit)] = r
+            game.add_entity(unit(name), pos, force=me, recipe=recipe)
+            own_budget -= 1
+    own_unit = weighted(OWN_UNITS, rng)
+    for _ in range(max(0, own_budget)):
+        game.add_entity(unit(own_unit()), rng.choice(areas[0]), force=me)
+
+    enemy_unit = weighted(ENEMY_UNITS, rng)
+    per_enemy = int(size * enemy_share) // enemies
+    for force, spawn, area in zip(forces, spawns[1:], areas[1:]):
+        game.add_entity(unit("nucleus"), spawn, force=force)
+        for _ in range(per_enemy - 1):
+            game.add_entity(unit(enemy_unit()), rng.choice(area), force=force)
+
+    deposits = [unit(f"{name} deposit") for name in ("metal", "crystals", "oil", "aether")]
+    decorations = [p for p in game.prototypes.all() if game.prototypes.name(p).startswith(("tree ", "plant "))]
+    neutral = size - len(game.world.entities())
+    for i in range(max(0, neutral)):
+        if i % 10 == 0:
+            game.add_entity(rng.choice(deposits), rng.choice(areas[i % len(areas)]))
+        else:
+            game.add_entity(rng.choice(decorations), rng.randrange(positions))
+    return game
+
+
+def perturb(game, rng, fraction=0.02):
+    # move a few units to a neighboring tile so every step sees a slightly different world.
+    # Buildings stay put as in a match, a moved nucleus would start a new base distance field
+    units = [e for e in game.world.entities().values()
+             if e.has("Unit") and e.has("Owner") and not game.prototypes.unit(e.Proto.proto).get("buildingRadius")]
+    for e in rng.sample(units, max(1, int(len(units) * fraction))):
+        neighbors = game.map.neighbors_of_position(e.Position.position)
+        if neighbors:
+            game.move_entity(e, rng.choice(neighbors))
+
+
+def bench_world(size, mix="balanced", enemies=1, steps=200, repeat=10, seed=0):
+    from main import Bot
+
+    t = time.perf_counter()
+    game = build_world(size, mix, enemies, seed)
+    build_time = time.perf_counter() - t
+    rng = random.Random(seed)
+    random.seed(seed)
+    timings = {}
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        # init on `repeat` fresh bots over the same world, one run is too noisy to
+        # compare; only the last bot stays registered and goes on below.
+        # Planner jobs (per map tables, placement searches) run off the callback
+        # in a match, they are timed on their own lines and not as callback time
+        handlers = list(game._update_handlers)
+        init, init_jobs = [], []
+        for _ in range(repeat):
+            game._update_handlers[:] = handlers
+            bot = Bot(game=game)
+            planner = bot.planner
+            jobs = planner.job_time
+            # the garbage of building the world and the previous bot is not init's cost
+            gc.collect()
+            t = time.perf_counter()
+            game.step()
+            init.append(time.perf_counter() - t - (planner.job_time - jobs))
+            init_jobs.append(planner.job_time - jobs)
+        timings["init (step 1)"] = init
+        timings["init planner jobs"] = init_jobs
+
+        # without a stored map the base distance field is measured in slices over
+        # the first steps, those are timed apart from the steady state below
+        warmup = []
+        while bot.pending_field is not None:
+            perturb(game, rng)
+            jobs = planner.job_time
+            t = time.perf_counter()
+            game.step()
+            warmup.append(time.perf_counter() - t - (planner.job_time - jobs))
+        if warmup:
+            timings["field warmup"] = warmup
+
+        # the full update callback, most steps run no task at all so p99 is the interesting one
+        step_times = []
+        for _ in range(steps):
+            perturb(game, rng)
+            jobs = planner.job_time
+            t = time.perf_counter()
+            game.step()
+            step_times.append(time.perf_counter() - t - (planner.job_time - jobs))
+        timings["update_callback"] = step_times
+
+        # each method on a fresh step. The snapshot of that step is built before
+        # the clock starts and timed on its own line, a method is charged only
+        # for its own work whichever of them happens to build it first in a match
+        for name, fn in METHODS.items():
+            times = []
+            errors = 0
+            for _ in range(repeat):
+                perturb(game, rng)
+                bot.step += 1
+                game.commands._orders.clear()
+                if name == "get_closest_ores":
+                    bot.resources_map.clear()
+                if name != "snapshot":
+                    bot.index()
+                t = time.perf_counter()
+                try:
+                    fn(bot)
+                except Exception:
+                    errors += 1
+                times.append(time.perf_counter() - t)
+            timings[name] = times
+            if errors:
+                timings[f"{name} (errors)"] = [errors]
+        game.commands.issued.clear()
+
+    result = {"entities": len(game.world.entities()), "positions": len(game.map.positions()), "build s": build_time}
+    for name, times in timings.items():
+        if name.endswith("(errors)"):
+            result[name] = times[0]
+            continue
+        result[name] = {
+            "p50": percentile(times, 50) * 1000,
+            "p99": percentile(times, 99) * 1000,
+            "max": max(times) * 1000,
+        }
+    return result
+
+
+def metrics(results):
+    names = []
+    for r in results.values():
+        for name, v in r.items():
+            if isinstance(v, dict) and name not in names:
+                names.append(name)
+    return names
+
+
+def report(results):
+    sizes = sorted(results, key=int)
+    print(f"{'size':>8}{'entities':>10}{'tiles':>8}{'world s':>9}")
+    for s in sizes:
+        r = results[s]
+        print(f"{s:>8}{r['entities']:>10}{r['positions']:>8}{r['build s']:>9.1f}")
+    print()
+
+    print(f"{'ms p50 / p99':<24}" + "".join(f"{s:>18}" for s in sizes) + f"{'scaling':>10}")
+    for name in metrics(results):
+        cells = []
+        for s in sizes:
+            v = results[s].get(name)
+            cells.append(f"{v['p50']:>8.3f} /{v['p99']:>8.3f}" if v else f"{'-':>18}")
+        print(f"{name:<24}" + "".join(cells) + f"{scaling(results, name):>10}")
+        for s in sizes:
+            errors = results[s].get(f"{name} (errors)")
+            if errors:
+                print(f"  {name} raised in {errors} runs at size {s}")
+
+
+def scaling(results, name):
+    # exponent k of time ~ n^k fitted through the smallest and largest size
+    sizes = [s for s in sorted(results, key=int) if name in results[s]]
+    if len(sizes) < 2:
+        return "-"
+    a, b = sizes[0], sizes[-1]
+    ta = max(results[a][name]["p50"], 1e-4)
+    tb = max(results[b][name]["p50"], 1e-4)
+    k = math.log(tb / ta) / math.log(results[b]["entities"] / results[a]["entities"])
+    return f"n^{k:.2f}"
+
+
+def compare(results, baseline, threshold):
+    # p50 slower than threshold x baseline (and by more than 0.05 ms) is a regression
+    regressions = []
+    for s, r in results.items():
+        base = baseline.get(s)
+        if base is None:
+            continue
+        for name in metrics({s: r}):
+            old = base.get(name)
+            if not old:
+                continue
+            new = r[name]["p50"]
+            if new > old["p50"] * threshold and new - old["p50"] > 0.05:
+                regressions.append((s, name, old["p50"], new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the bot over synthetic worlds of increasing size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--mix", choices=sorted(MIXES), default="balanced")
+    parser.add_argument("--enemies", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=200, help="update callback steps per world")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per method per world")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--add-to-baseline", action="store_true",
+                        help="store only the metrics the baseline lacks, the recorded ones stay as they are")
+    parser.add_argument("--threshold", type=float, default=1.5, help="slowdown ratio reported as a regression")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # every synthetic world is a new map, keep them out of the map cache
+    os.environ.setdefault("BOT_MAP_CACHE", "0")
+    # planner jobs run inline on the next poll, so the placement searches are
+    # timed with the methods that submit them
+    os.environ.setdefault("BOT_PLANNER_THREAD", "0")
+    sim.install()
+    results = {}
+    for size in args.sizes:
+        print(f"size {size}...", file=sys.stderr, flush=True)
+        results[str(size)] = bench_world(size, args.mix, args.enemies, args.steps, args.repeat, args.seed)
+    report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    key = f"{args.mix}/{args.enemies}"
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    if args.save_baseline:
+        stored[key] = results
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+    if args.add_to_baseline:
+        base = stored.setdefault(key, {})
+        added = 0
+        for size, r in results.items():
+            old = base.setdefault(size, {})
+            for name, v in r.items():
+                if name not in old:
+                    old[name] = v
+                    added += 1
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2)
+        # the recorded ones are still compared below
+        print(f"\n{added} new entries added to {args.baseline}")
+    if key not in stored:
+        print(f"\nno baseline for {key}, run with --save-baseline to store one")
+        return 0
+
+    regressions = compare(results, stored[key], args.threshold)
+    print()
+    if not regressions:
+        print(f"no regressions against the baseline (threshold {args.threshold}x)")
+        return 0
+    for s, name, old, new in regressions:
+        print(f"REGRESSION size {s} {name}: p50 {old:.3f} ms -> {new:.3f} ms ({new / old:.1f}x)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
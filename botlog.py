@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import atexit
+import threading
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+# BOT_LOG_LEVEL=debug|info|warning|error, BOT_LOG_FILE appends to a file instead of stdout,
+# BOT_LOG_THREAD=1 drains from a background thread instead of at the end of each step
+LEVEL = LEVELS.get(os.environ.get("BOT_LOG_LEVEL", "info").lower(), INFO)
+FILE = os.environ.get("BOT_LOG_FILE", "")
+THREAD = os.environ.get("BOT_LOG_THREAD", "") not in ("", "0")
+
+
+class Logger:
+    # leveled logger for the update callback. Messages are %-style templates with
+    # their arguments; a call below the level returns before anything is built and
+    # enabled records go into a bounded ring buffer as (level, template, args).
+    # Formatting and I/O happen in drain(), at the end of a step or on a
+    # background thread. `every` rate limits a message (keyed by its template
+    # unless a key is given) to one per that many seconds.
+    def __init__(self, level=LEVEL, capacity=4096, out=FILE, threaded=THREAD, interval=0.1):
+        self.level = level
+        self.out = out
+        self.interval = interval
+        self.dropped = 0
+        self.suppressed = 0
+        self._buffer = deque(maxlen=capacity)
+        self._last = {}
+        self._skipped = {}
+        self._file = None
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+        if threaded:
+            self.start_thread()
+        atexit.register(self.close)
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, msg, *args, every=0, key=None):
+        if level >= self.level:
+            self._log(level, msg, args, every, key)
+
+    def debug(self, msg, *args, every=0, key=None):
+        if DEBUG >= self.level:
+            self._log(DEBUG, msg, args, every, key)
+
+    def info(self, msg, *args, every=0, key=None):
+        if INFO >= self.level:
+            self._log(INFO, msg, args, every, key)
+
+    def warning(self, msg, *args, every=0, key=None):
+        if WARNING >= self.level:
+            self._log(WARNING, msg, args, every, key)
+
+    def error(self, msg, *args, every=0, key=None):
+        if ERROR >= self.level:
+            self._log(ERROR, msg, args, every, key)
+
+    def _log(self, level, msg, args, every, key):
+        if every:
+            key = key or msg
+            now = time.monotonic()
+            if now - self._last.get(key, -every) < every:
+                self._skipped[key] = self._skipped.get(key, 0) + 1
+                self.suppressed += 1
+                return
+            self._last[key] = now
+            skipped = self._skipped.pop(key, 0)
+            if skipped:
+                msg = f"{msg} (%d similar suppressed)"
+                args = args + (skipped,)
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            self.dropped += 1
+        buffer.append((level, msg, args))
+
+    def drain(self):
+        buffer = self._buffer
+        if not buffer:
+            return
+        with self._lock:
+            lines = []
+            while buffer:
+                level, msg, args = buffer.popleft()
+                try:
+                    text = msg % args if args else msg
+                except Exception as e:
+                    text = f"{msg!r} {args!r} (bad log format: {e})"
+                lines.append(f"{NAMES[level]}: {text}" if level >= WARNING else text)
+            self._write("\n".join(lines) + "\n")
+
+    def _write(self, text):
+        if not self.out:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            return
+        if self._file is None:
+            self._file = open(self.out, "a")
+        self._file.write(text)
+        self._file.flush()
+
+    def start_thread(self):
+        if self._thread is not None:
+            return
+        self._stop = threading.Event()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.drain()
+
+        self._thread = threading.Thread(target=run, name="bot log", daemon=True)
+        self._thread.start()
+
+    def step_end(self):
+        # called by the update callback, the thread drains on its own
+        if self._thread is None:
+            self.drain()
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.drain()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        return f"{self.suppressed} rate limited, {self.dropped} lost to a full buffer"
+
+
+log = Logger()
@@ -0,0 +1,156 @@
+import os
+import json
+import operator
+import yaml
+from botlog import log
+
+# BOT_BUILD_ORDER points at another spec, YAML or JSON
+PATH = os.environ.get("BOT_BUILD_ORDER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "build_order.yaml"))
+
+OPS = {">=": operator.ge, ">": operator.gt, "<=": operator.le, "<": operator.lt, "==": operator.eq, "!=": operator.ne}
+
+# counts that take a name, the rest (juggernauts, colossus, atvs) do not
+NAMED = ("building", "construction", "built", "drill", "resource", "rate")
+UNNAMED = ("juggernauts", "colossus", "atvs")
+
+ACTIONS = ("build_nearby_drill", "build_nearby_building", "build_drills", "build_talos", "destroy_building",
+           "destroy_temporary_laboratory")
+
+
+class Rule:
+    __slots__ = ("name", "conditions", "keys", "action", "args", "stop")
+
+    def __init__(self, name, conditions, action, args, stop):
+        self.name = name
+        # (key, op, n) with key (count, name)
+        self.conditions = conditions
+        self.keys = {key for key, _, _ in conditions}
+        self.action = action
+        self.args = args
+        self.stop = stop
+
+    def holds(self, counts):
+        return all(op(counts[key], n) for key, op, n in self.conditions)
+
+
+def parse_condition(text, flags):
+    # returns a (key, op, n) condition, or True/False for a flag
+    words = str(text).split()
+    if len(words) in (1, 2) and words[-1] in flags and (len(words) == 1 or words[0] == "not"):
+        return bool(flags[words[-1]]) != (len(words) == 2)
+    if len(words) < 3 or words[-2] not in OPS:
+        raise ValueError(f"bad condition {text!r}")
+    count, name = words[0], " ".join(words[1:-2])
+    if count in NAMED and not name or count in UNNAMED and name or count not in NAMED + UNNAMED:
+        raise ValueError(f"bad condition {text!r}")
+    return (count, name), OPS[words[-2]], float(words[-1])
+
+
+def resolve(value, params):
+    if isinstance(value, str) and value.startswith("$"):
+        if value[1:] not in params:
+            raise ValueError(f"unknown parameter {value}")
+        return params[value[1:]]
+    return value
+
+
+class BuildOrder:
+    # declarative build order, see build_order.yaml. Rules are compiled once:
+    # flags are folded in (a rule with a false flag is dropped), and every
+    # count a condition reads maps to the rules that read it. run() collects
+    # the counts, re-checks only the rules whose counts changed since the last
+    # pass and then walks the rules in order on the cached results, so the
+    # order of the spec decides as the if-chain did. A pass is skipped when no
+    # count changed and the last pass ran no action. After an action that lets
+    # the pass continue the counts are collected again, the action may have
+    # changed them for the rules below it.
+    def __init__(self, rules):
+        self.rules = rules
+        self.passes = 0
+        self.skipped = 0
+        self.checks = 0
+        self._dependents = {}
+        for i, rule in enumerate(rules):
+            for key in rule.keys:
+                self._dependents.setdefault(key, []).append(i)
+        self._counts = {}
+        # a rule left without conditions holds on every pass
+        self._holds = [not rule.conditions for rule in rules]
+        self._acted = True
+
+    @staticmethod
+    def load(path=PATH, params=None):
+        with open(path) as f:
+            spec = json.load(f) if path.endswith(".json") else yaml.safe_load(f)
+        return BuildOrder.compile(spec, params)
+
+    @staticmethod
+    def compile(spec, params=None):
+        flags = dict(spec.get("flags") or {})
+        params = dict(params or {}, **flags)
+        rules = []
+        for i, r in enumerate(spec.get("rules") or []):
+            name = r.get("name", f"rule {i}")
+            conditions = []
+            live = True
+            for text in r.get("when") or []:
+                c = parse_condition(text, flags)
+                if c is False:
+                    live = False
+                elif c is not True:
+                    conditions.append(c)
+            action = r.get("do")
+            if action is not None and action not in ACTIONS:
+                raise ValueError(f"rule {name!r}: unknown action {action!r}")
+            then = r.get("then", "stop")
+            if then not in ("stop", "continue"):
+                raise ValueError(f"rule {name!r}: then must be stop or continue, not {then!r}")
+            args = {k: resolve(v, params) for k, v in (r.get("args") or {}).items()}
+            if live:
+                rules.append(Rule(name, conditions, action, args, then == "stop"))
+        return BuildOrder(rules)
+
+    def keys(self):
+        return list(self._dependents)
+
+    def check_names(self, known):
+        # warn about building names no prototype has, usually a typo in the spec
+        for count, name in self.keys():
+            if count in ("building", "construction", "built") and name not in known:
+                log.warning("build order: no building called %r", name)
+
+    def _sync(self, count):
+        counts = {key: count(*key) for key in self._dependents}
+        dirty = set()
+        for key, value in counts.items():
+            if self._counts.get(key) != value:
+                dirty.update(self._dependents[key])
+        self._counts = counts
+        for i in dirty:
+            self._holds[i] = self.rules[i].holds(counts)
+        self.checks += len(dirty)
+        return dirty
+
+    def run(self, bot):
+        # bot provides count(count, name) and the actions; returns the rules that acted
+        dirty = self._sync(bot.count)
+        if not dirty and not self._acted:
+            self.skipped += 1
+            return []
+        self.passes += 1
+        acted = []
+        for i, rule in enumerate(self.rules):
+            if not self._holds[i]:
+                continue
+            if rule.action is not None:
+                log.debug("build order: %s", rule.name)
+                getattr(bot, rule.action)(**rule.args)
+                acted.append(rule.name)
+            if rule.stop:
+                break
+            self._sync(bot.count)
+        self._acted = bool(acted)
+        return acted
+
+    def stats(self):
+        return f"{len(self.rules)} rules, {self.passes} passes, {self.skipped} skipped, {self.checks} rule checks"
@@ -0,0 +1,147 @@
+import traceback
+from botlog import log
+
+# a setting equal to the last one sent is not sent again for this many steps,
+# unless the entity already reports it; after that it is assumed lost
+SETTING_RESEND = 20
+
+# setting -> (component, field) the entity reports it in
+SETTINGS = {
+    "recipe": ("Recipe", "recipe"),
+    "priority": ("Priority", "priority"),
+}
+
+
+def order_key(order):
+    return (int(order.order_type), order.entity, order.position)
+
+
+class CommandQueue:
+    # stands in for game.commands. Orders and recipe/priority settings are staged
+    # and sent once per step by flush(): several orders to the same unit within a
+    # step collapse into the last one, and a command identical to the last one
+    # sent to that entity is dropped: orders while the unit still runs them,
+    # settings for SETTING_RESEND steps or while the entity already has them.
+    # Placing constructions and self destructs are staged as well and go out
+    # last, in the order they were made, so a building destroyed in a step
+    # still gets that step's settings and orders first. Order constructors and
+    # queries go straight to game.commands.
+    def __init__(self, game):
+        self.game = game
+        self.commands = game.commands
+        self._orders = {}
+        self._settings = {}
+        # (command name, args) to send as they are
+        self._actions = []
+        self._sent_orders = {}
+        self._sent_settings = {}
+        self._current = {}
+        self.flushes = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __getattr__(self, name):
+        return getattr(self.commands, name)
+
+    def orders(self, unit):
+        # staged order first, otherwise what the server reports, queried once per step
+        order = self._orders.get(unit)
+        if order is not None:
+            return [order]
+        current = self._current.get(unit)
+        if current is None:
+            current = self.commands.orders(unit)
+            self._current[unit] = current
+        return current
+
+    def order(self, unit, order):
+        if unit in self._orders:
+            self.coalesced += 1
+        self._orders[unit] = order
+
+    def command_set_recipe(self, unit, recipe):
+        self._set(unit, "recipe", recipe)
+
+    def command_set_priority(self, unit, priority):
+        self._set(unit, "priority", int(priority))
+
+    def command_place_construction(self, *args):
+        self._actions.append(("command_place_construction", args))
+
+    def command_self_destruct(self, unit):
+        self._actions.append(("command_self_destruct", (unit,)))
+
+    def _set(self, unit, kind, value):
+        key = (unit, kind)
+        if key in self._settings:
+            self.coalesced += 1
+        self._settings[key] = value
+
+    def forget(self, ids):
+        # entities that left the world
+        for _id in ids:
+            self._sent_orders.pop(_id, None)
+            for kind in SETTINGS:
+                self._sent_settings.pop((_id, kind), None)
+
+    def flush(self):
+        orders, self._orders = self._orders, {}
+        settings, self._settings = self._settings, {}
+        actions, self._actions = self._actions, []
+
+        self.flushes += 1
+        entities = self.game.world.entities() if settings else None
+        for (unit, kind), value in settings.items():
+            if self._has_setting(entities.get(unit), kind, value):
+                self.dropped += 1
+                continue
+            sent = self._sent_settings.get((unit, kind))
+            if sent is not None and sent[0] == value and self.flushes - sent[1] < SETTING_RESEND:
+                self.dropped += 1
+                continue
+            self._send(self._send_setting, unit, kind, value)
+
+        for unit, order in orders.items():
+            key = order_key(order)
+            if self._sent_orders.get(unit) == key and self._running(unit, key):
+                self.dropped += 1
+                continue
+            self._send(self._send_order, unit, order, key)
+
+        for name, args in actions:
+            self._send(getattr(self.commands, name), *args)
+
+        self._current.clear()
+
+    @staticmethod
+    def _has_setting(e, kind, value):
+        component, field = SETTINGS[kind]
+        return e is not None and e.has(component) and getattr(getattr(e, component), field) == value
+
+    def _running(self, unit, key):
+        current = self._current.get(unit)
+        if current is None:
+            current = self.commands.orders(unit)
+        return any(order_key(o) == key for o in current)
+
+    def _send(self, fn, *args):
+        try:
+            fn(*args)
+            self.sent += 1
+        except Exception as e:
+            log.error("sending command %s: %s\n%s", args, e, traceback.format_exc())
+
+    def _send_setting(self, unit, kind, value):
+        if kind == "recipe":
+            self.commands.command_set_recipe(unit, value)
+        else:
+            self.commands.command_set_priority(unit, value)
+        self._sent_settings[(unit, kind)] = (value, self.flushes)
+
+    def _send_order(self, unit, order, key):
+        self.commands.order(unit, order)
+        self._sent_orders[unit] = key
+
+    def stats(self):
+        return f"{self.sent} sent, {self.dropped} dropped as duplicates, {self.coalesced} coalesced"
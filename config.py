@@ -0,0 +1,71 @@
+import os
+import json
+import hashlib
+
+# MARK manual strategy
+# every tunable constant of the strategy with its default; sweep.py searches over these
+DEFAULTS = {
+    # enemies closer to the nucleus than this are attacked
+    "defense_distance": 820,
+    # ... and any enemy on the map once the army is big enough
+    "aggression_distance": 20000,
+    "juggernaut_aggression": 8,
+    "colossus_aggression": 3,
+    # chance that an idle army scatters instead of rallying at a talos
+    "scatter_chance": 0.2,
+    # chance that a unit takes the second closest target
+    "second_target_chance": 0.2,
+    # chance per defend run that the army scatters instead
+    "defend_scatter_chance": 0.0001,
+    # talos rings around the nucleus
+    "talos_distance": 260,
+    "inner_talos_distance": 160,
+    # with an enemy this close a talos goes to the front instead of the ring
+    "talos_threat_distance": 1200,
+    # with enough taloses in the ring, chance that the next one goes to the front
+    "talos_front_threshold": 0.6,
+    "talos_front_chance": 0.1,
+    # front talos: at least this far from the nearest enemy, sampled share of candidates
+    "front_min_distance": 120,
+    "front_sample": 0.2,
+}
+
+# BOT_CONFIG is a JSON object of overrides, inline or a path to a file
+ENV = os.environ.get("BOT_CONFIG", "")
+
+
+class Config:
+    # strategy constants of one bot. Unknown names are an error so a typo in
+    # a sweep does not silently tune nothing; values keep the type of their
+    # default. key() hashes the full set, defaults included.
+    __slots__ = tuple(DEFAULTS)
+
+    def __init__(self, **overrides):
+        for name, value in DEFAULTS.items():
+            setattr(self, name, value)
+        for name, value in overrides.items():
+            if name not in DEFAULTS:
+                raise ValueError(f"unknown config {name!r}")
+            setattr(self, name, type(DEFAULTS[name])(value))
+
+    @staticmethod
+    def from_env(text=ENV):
+        if not text:
+            return Config()
+        if os.path.exists(text):
+            with open(text) as f:
+                return Config(**json.load(f))
+        return Config(**json.loads(text))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in DEFAULTS}
+
+    def key(self):
+        return hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()[:12]
+
+    def changes(self):
+        # the values that differ from the defaults
+        return {k: v for k, v in self.to_dict().items() if v != DEFAULTS[k]}
+
+    def __repr__(self):
+        return f"Config({', '.join(f'{k}={v!r}' for k, v in self.changes().items())})"
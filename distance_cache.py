@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+
+class DistanceCache:
+    # bounded LRU around map.distance_estimate, symmetric in its two positions.
+    # The map is static, so entries stay valid for the whole match. With a
+    # store attached (see map_cache.py) misses are looked up in the distances
+    # saved by earlier matches on the same map before asking the engine.
+    def __init__(self, game, size=250000):
+        self.game = game
+        self.size = size
+        self.store = None
+        self.hits = 0
+        self.stored = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __call__(self, a, b):
+        a = int(a)
+        b = int(b)
+        key = (a << 32) | b if a <= b else (b << 32) | a
+        cache = self._cache
+        d = cache.get(key)
+        if d is not None:
+            self.hits += 1
+            cache.move_to_end(key)
+            return d
+
+        d = self.store.distance(key) if self.store is not None else None
+        if d is not None:
+            self.stored += 1
+        else:
+            self.misses += 1
+            d = self.game.map.distance_estimate(a, b)
+        cache[key] = d
+        if len(cache) > self.size:
+            cache.popitem(last=False)
+        return d
+
+    def entries(self):
+        return dict(self._cache)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.stored = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.stored + self.misses
+        ratio = (self.hits + self.stored) / total if total else 0.0
+        return f"{len(self._cache)} entries, {self.hits} hits, {self.stored} from the map cache, {self.misses} misses ({ratio:.1%} hit rate)"
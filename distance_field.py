@@ -0,0 +1,77 @@
+from time import perf_counter
+import numpy as np
+
+# tiles measured between two looks at the clock in PendingField.measure()
+CHUNK = 256
+
+
+class DistanceField:
+    # map.distance_estimate from one origin to every tile, as a flat array
+    # indexed by position. Meant for origins that never move (the nucleus):
+    # the field is measured once, a slice of each step (PendingField), or read
+    # back from the map cache, and every distance to the origin afterwards is an array read.
+    # of() and within() take many positions at once.
+    def __init__(self, origin, values):
+        self.origin = int(origin)
+        self.values = values
+
+    @staticmethod
+    def name(origin):
+        # the map cache entry of the field around origin
+        return f"distance_field_{int(origin)}"
+
+    @staticmethod
+    def load(origin, store):
+        values = store.get(DistanceField.name(origin)) if store is not None else None
+        return DistanceField(origin, values) if values is not None else None
+
+    def __call__(self, position):
+        return float(self.values[int(position)])
+
+    def of(self, positions):
+        return self.values[np.asarray(positions, dtype=np.int64)]
+
+    def within(self, positions, radius):
+        # mask of the positions closer than radius
+        return self.of(positions) < radius
+
+
+class EstimatedField:
+    # the queries of a DistanceField, each distance asked from the bot's
+    # DistanceCache. Stands in for a field still being measured, and serves
+    # origins not worth a whole field, like a talos asked once in a while
+    def __init__(self, origin, distance):
+        self.origin = int(origin)
+        self.distance = distance
+
+    def __call__(self, position):
+        return self.distance(self.origin, position)
+
+    def of(self, positions):
+        return np.array([self.distance(self.origin, p) for p in np.asarray(positions).tolist()], dtype=np.float64)
+
+    def within(self, positions, radius):
+        return self.of(positions) < radius
+
+
+class PendingField:
+    # a DistanceField measured a few chunks of tiles per call, on the main
+    # thread where the engine is called from anyway
+    def __init__(self, origin, count):
+        self.origin = int(origin)
+        self.values = np.empty(count, dtype=np.float64)
+        self.done = 0
+
+    def measure(self, estimate, seconds):
+        # estimate: map.distance_estimate; returns the DistanceField once every
+        # tile is measured, None while some are left
+        origin = self.origin
+        count = len(self.values)
+        start = perf_counter()
+        while self.done < count:
+            end = min(self.done + CHUNK, count)
+            self.values[self.done:end] = [estimate(origin, p) for p in range(self.done, end)]
+            self.done = end
+            if perf_counter() - start >= seconds:
+                break
+        return DistanceField(origin, self.values) if self.done == count else None
@@ -0,0 +1,71 @@
+import os
+import re
+from collections import Counter
+from botlog import log, DEBUG, INFO, WARNING, ERROR
+
+# engine messages we never want to see, matched on the raw bytes before decoding.
+# BOT_ENGINE_LOG_SUPPRESS replaces them (comma separated prefixes) and
+# BOT_ENGINE_LOG_SAMPLE keeps one in n of a prefix ("skipping =100,schedule: =50")
+SUPPRESS = (b"need to wait ", b"schedule: ", b"skipping ")
+SAMPLE = {}
+
+if os.environ.get("BOT_ENGINE_LOG_SUPPRESS"):
+    SUPPRESS = tuple(p.encode() for p in os.environ["BOT_ENGINE_LOG_SUPPRESS"].split(",") if p)
+if os.environ.get("BOT_ENGINE_LOG_SAMPLE"):
+    for rule in os.environ["BOT_ENGINE_LOG_SAMPLE"].split(","):
+        prefix, _, n = rule.rpartition("=")
+        SAMPLE[prefix.encode()] = int(n)
+
+# uw.Severity value -> bot log level (Note, Hint, Warning, Info, Error, Critical)
+SEVERITY_LEVELS = (DEBUG, DEBUG, WARNING, INFO, ERROR, ERROR)
+
+
+class EngineLogFilter:
+    # takes over the engine log callback. Every message goes through one
+    # precompiled regex over all suppress and sample prefixes, longest first;
+    # suppressed messages are counted per prefix and never decoded, sampled ones
+    # pass once every n, the rest are decoded and handed to the bot logger.
+    def __init__(self, suppress=SUPPRESS, sample=SAMPLE):
+        self.rules = {p: 0 for p in suppress}
+        self.rules.update(sample)
+        prefixes = sorted(self.rules, key=len, reverse=True)
+        self._match = re.compile(b"|".join(re.escape(p) for p in prefixes)).match if prefixes else None
+        self.dropped = Counter()
+        self.sampled = Counter()
+        self.passed = 0
+        self._ffi = None
+        self._delegate = None
+
+    def install(self, game):
+        ffi = getattr(game, "_ffi", None)
+        if ffi is None:
+            # the offline stand-in calls its handler with plain bytes
+            game.engine_log_callback = self.handle
+            return
+        self._ffi = ffi
+        # keep a reference, cffi frees the callback together with the delegate
+        self._delegate = ffi.callback("UwLogCallbackType", self._callback)
+        game._log_delegate = self._delegate
+        game._api.uwSetLogCallback(self._delegate)
+
+    def _callback(self, data):
+        self.handle(self._ffi.string(data.message), data.severity)
+
+    def handle(self, message, severity=3):
+        match = self._match(message) if self._match is not None else None
+        if match is not None:
+            prefix = match.group()
+            n = self.rules[prefix]
+            if n and not (self.dropped[prefix] + self.sampled[prefix] + 1) % n:
+                self.sampled[prefix] += 1
+            else:
+                self.dropped[prefix] += 1
+                return
+        self.passed += 1
+        level = SEVERITY_LEVELS[severity] if 0 <= severity < len(SEVERITY_LEVELS) else INFO
+        if log.enabled(level):
+            log.log(level, "%s", message.decode("utf-8", "replace"))
+
+    def stats(self):
+        dropped = ", ".join(f"{p.decode()!r}: {n}" for p, n in self.dropped.most_common())
+        return f"{self.passed} passed, {sum(self.sampled.values())} sampled, dropped {{{dropped}}}"
@@ -0,0 +1,197 @@
+from heapq import heappush, heappop, heapreplace
+import numpy as np
+from map_cache import csr
+
+# optional: builds the table in compiled code, the pure Python Dijkstra below is the fallback
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+except ImportError:
+    dijkstra = None
+
+# landmarks per map, each costs a float32 per tile and one more term per bound
+COUNT = 8
+
+# tile pairs compared against the estimator when the bounds are calibrated
+CALIBRATION_PAIRS = 64
+
+# candidates nearest() measures in order of their lower bound to find a search radius
+MEASURE = 8
+
+# exact distances nearest() measures at most to prove its answer, beyond that the
+# bounds did not prune and the caller's exact search is cheaper
+VERIFY = 32
+
+# targets below which a k-d tree over them answers faster than the bounds. The tree
+# won on every bench world up to 30k entities (10k enemies): for far sources the
+# bounds rank poorly and the straight line ball is as large as the tree's, so
+# landmarks stay off until a world is larger than that
+MIN_TARGETS = 50000
+
+# path length stored for tiles a landmark cannot reach, finite so the bounds need no nan checks
+UNREACHABLE = 1e30
+
+# the calibrated ratios are widened by this much, a sample never sees the extremes
+MARGIN = 0.05
+
+
+def edge_lengths(coords, indptr, data):
+    # straight line length of every CSR edge
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    return np.sqrt(((coords[rows] - coords[data]) ** 2).sum(axis=1))
+
+
+def shortest_paths(indptr, data, weights, source):
+    # Dijkstra over the tile graph, arguments as plain lists; unreachable tiles stay inf.
+    # Only used without scipy
+    inf = float("inf")
+    dist = [inf] * (len(indptr) - 1)
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heappop(heap)
+        if d > dist[u]:
+            continue
+        for i in range(indptr[u], indptr[u + 1]):
+            v = data[i]
+            nd = d + weights[i]
+            if nd < dist[v]:
+                dist[v] = nd
+                heappush(heap, (nd, v))
+    return dist
+
+
+class Landmarks:
+    # ALT distance oracle over the tiles of a map. The table holds the shortest
+    # path length along the tile graph from each landmark to every tile, and the
+    # triangle inequality turns it into bounds for any pair:
+    #   max_l |d(l, a) - d(l, b)|  <=  d(a, b)  <=  min_l d(l, a) + d(l, b)
+    # Path lengths along tile centers are not what map.distance_estimate returns,
+    # so calibrate() scales the lower bound by the smallest and the upper bound by
+    # the largest ratio between the two seen on a sample of pairs. The bounds are
+    # then in estimator units and good for ranking, not a guarantee: nearest()
+    # proves its answer with the straight line distance, the same lower bound
+    # the k-d tree relies on, and gives up when that takes too many measurements.
+    # Landmarks are picked farthest first, which spreads them over the planet.
+    # build() only touches arrays and can run on the planner. Batched queries
+    # against the same targets can share their columns(), gathered once.
+    def __init__(self, table, lower_scale=1.0, upper_scale=1.0):
+        self.table = np.asarray(table)
+        self.lower_scale = lower_scale
+        self.upper_scale = upper_scale
+
+    @staticmethod
+    def build(coords, indptr, data, count=COUNT):
+        weights = edge_lengths(coords, indptr, data)
+        n = len(indptr) - 1
+        if dijkstra is not None:
+            graph = csr_matrix((weights, np.asarray(data), np.asarray(indptr)), shape=(n, n))
+            paths = lambda source: dijkstra(graph, directed=True, indices=source)
+        else:
+            weights, indptr, data = weights.tolist(), np.asarray(indptr).tolist(), np.asarray(data).tolist()
+            paths = lambda source: np.asarray(shortest_paths(indptr, data, weights, source))
+        # the tile farthest from tile 0 is the first landmark
+        nearest = paths(0)
+        rows = []
+        for _ in range(min(count, n)):
+            landmark = int(np.argmax(nearest))
+            row = paths(landmark)
+            rows.append(row)
+            nearest = row if len(rows) == 1 else np.minimum(nearest, row)
+        return Landmarks(np.minimum(np.array(rows), UNREACHABLE).astype(np.float32))
+
+    @staticmethod
+    def from_neighbors(coords, neighbors, count=COUNT):
+        # build() from the engine's adjacency lists, when no map cache holds them as CSR
+        return Landmarks.build(coords, *csr(neighbors), count)
+
+    def __len__(self):
+        return len(self.table)
+
+    def sources(self):
+        # landmark positions, the tile at distance 0 of each row
+        return np.argmin(self.table, axis=1).tolist()
+
+    def calibrate(self, distance, pairs=CALIBRATION_PAIRS, seed=0):
+        # distance: the exact estimator, e.g. the bot's DistanceCache. The table
+        # rows are exact path lengths from their landmark, so landmark to tile
+        # pairs give the ratio of the estimator to the path length directly.
+        n = self.table.shape[1]
+        rng = np.random.default_rng(seed)
+        sources = self.sources()
+        ratios = []
+        for row, b in zip(rng.integers(len(sources), size=pairs).tolist(), rng.integers(n, size=pairs).tolist()):
+            path = float(self.table[row, b])
+            if path <= 0 or path >= UNREACHABLE:
+                continue
+            ratios.append(distance(sources[row], b) / path)
+        if ratios:
+            self.lower_scale = min(ratios) * (1 - MARGIN)
+            self.upper_scale = max(ratios) * (1 + MARGIN)
+
+    def lower(self, a, b):
+        return float(np.abs(self.table[:, int(a)] - self.table[:, int(b)]).max()) * self.lower_scale
+
+    def upper(self, a, b):
+        return float((self.table[:, int(a)] + self.table[:, int(b)]).min()) * self.upper_scale
+
+    def columns(self, targets):
+        return self.table[:, np.asarray(targets, dtype=np.int64)]
+
+    def bounds(self, source, targets, columns=None):
+        # (lower, upper) arrays for one source and many target positions
+        t = self.columns(targets) if columns is None else columns
+        s = self.table[:, int(source)].tolist()
+        # a loop over the few landmarks beats reducing over the short axis
+        lower = np.abs(t[0] - s[0])
+        upper = t[0] + s[0]
+        for row, d in zip(t[1:], s[1:]):
+            np.maximum(lower, np.abs(row - d), out=lower)
+            np.minimum(upper, row + d, out=upper)
+        return lower * self.lower_scale, upper * self.upper_scale
+
+    def nearest(self, source, targets, k, distance, coords, points=None, columns=None):
+        # indices into targets of the k closest, ordered by distance(source, target),
+        # or None when the bounds do not prune and an exact search is cheaper.
+        # The MEASURE candidates with the lowest lower bound are measured first,
+        # their k-th distance is the search radius. Every target closer than
+        # that in a straight line (points: their coordinates) may still be
+        # closer and is measured too, so the answer is exact as long as the
+        # straight line never exceeds the estimator.
+        if not len(targets):
+            return []
+        lower, _ = self.bounds(source, targets, columns)
+        k = min(k, len(targets))
+        limit = max(MEASURE, k)
+        first = np.argpartition(lower, limit - 1)[:limit] if len(lower) > limit else np.arange(len(lower))
+        first = first[np.argsort(lower[first], kind="stable")]
+        # distances per position, targets often stand on the same tile
+        at = {}
+        measured = {}
+        best = []
+        for i, lo in zip(first.tolist(), lower[first].tolist()):
+            if len(best) == k and lo >= -best[0][0]:
+                break
+            p = int(targets[i])
+            if p not in at:
+                at[p] = distance(source, p)
+            measured[i] = d = at[p]
+            if len(best) < k:
+                heappush(best, (-d, i))
+            elif d < -best[0][0]:
+                heapreplace(best, (-d, i))
+        points = coords[np.asarray(targets, dtype=np.int64)] if points is None else points
+        line = np.sqrt(((points - coords[int(source)]) ** 2).sum(axis=1))
+        inside = line < -best[0][0]
+        # the tree would measure this ball too, bail out before building lists for it
+        if np.count_nonzero(inside) > VERIFY + len(measured):
+            return None
+        rest = [i for i in np.flatnonzero(inside).tolist() if i not in measured]
+        if len({int(targets[i]) for i in rest} - at.keys()) > VERIFY:
+            return None
+        for i in rest:
+            p = int(targets[i])
+            if p not in at:
+                at[p] = distance(source, p)
+            measured[i] = at[p]
+        return sorted(measured, key=lambda i: (measured[i], i))[:k]
@@ -6,25 +6,114 @@ import json
 from collections import defaultdict
 import traceback
 import time
+from snapshot import Snapshot, ProtoColumns
+from proto_info import ProtoInfo
+from spatial import SpatialIndex
+from distance_cache import DistanceCache
+from neighborhood import Neighborhoods, NameIndex
+from tracker import EntityTracker
+from scheduler import Scheduler, COMBAT, ECONOMY, BUILD, REPORTING
+from profiler import Profiler
+from command_queue import CommandQueue
+from recipe_cache import RecipeCache
+from botlog import log, DEBUG, INFO
+from engine_log import EngineLogFilter
+from planner import Planner
+from placement import Placement
+import map_cache
+from map_cache import MapCache
+import landmarks
+from landmarks import Landmarks
+from distance_field import DistanceField, EstimatedField, PendingField
+from threat_map import ThreatMap
+from build_order import BuildOrder
+from production import Production
+from config import Config
+import numpy as np
+
+# MARK manual strategy
+# the tunable constants live in config.py
+
+# recipes a producer without a special rule runs when it can: plasma emitter, shield projector, juggernaut, ATV
+DEFAULT_RECIPES = ("plasma emitter", "shield projector", "juggernaut", "ATV")
+
+# seconds of bot work per step before lower priority tasks are deferred
+STEP_BUDGET = 0.020
+# seconds of a step spent measuring the base distance field until it is done
+FIELD_SLICE = 0.002
 
 class Bot:
-    def __init__(self):
-        self.game = uw.Game()
+    def __init__(self, game=None, config=None):
+        # game can be any uw.Game compatible object, e.g. the offline stand-in from sim.py
+        self.game = game if game is not None else uw.Game()
+        # strategy constants, BOT_CONFIG overrides the defaults
+        self.config = config if config is not None else Config.from_env()
+        # engine log spam is dropped before it is decoded, see engine_log.py
+        self.engine_log = EngineLogFilter()
+        self.engine_log.install(self.game)
         self.step = 0
+        # opt-in, see profiler.py
+        self.profiler = Profiler()
+        self.profiler.instrument_game(self.game)
+        # the scheduler times whole tasks, these are timed one by one within them
+        self.profiler.wrap_methods(self, (
+            "get_own_buildings", "assign_recipes", "attack", "attack_nearest_enemies", "send_to_talos",
+            "scatter", "build_talos", "build_talos2", "get_closest_ores",
+        ))
         self.prototypes = {} 
+        self.proto_table = {}
+        # the proto table as columns for the snapshots
+        self.proto_columns = ProtoColumns(self.proto_table)
         self.construction_ids = {}
         self.construction_names = {}
         self.recipe_id_by_name = {}
+        # recipe graph, built the first time a rate is asked for
+        self.production = None
         self.main_building = None
-        self.resources_map = defaultdict(list)
+        # deposit positions per resource, nearest to the nucleus first
+        self.resources_map = {}
         self.drill_positions = defaultdict(list)
         self.talos_positions = defaultdict(list) 
         self.building_positions = defaultdict(list)
 
+        # own entities as snapshot views, refreshed by get_own_buildings
         self.resource_counts = defaultdict(int)
         self.constructions = defaultdict(list)
         self.buildings = defaultdict(list)
+        self.atvs = []
+        self.juggernauts = []
+        self.colossus = []
+        self.enemy_main_buildings = []
 
+        self.snapshot = None
+        # every distance the bot needs goes through this cache
+        self.distance = DistanceCache(self.game)
+        self.neighborhoods = Neighborhoods(self.game)
+        self.nearby_names = NameIndex(self.neighborhoods, self.proto_table)
+        self.tracker = EntityTracker(self.proto_table)
+        self.scheduler = Scheduler(budget=STEP_BUDGET, profiler=self.profiler)
+        # orders and settings are staged here and sent once at the end of each step
+        self.commands = CommandQueue(self.game)
+        # recipes are decided when a producer appears or a building they look at changes
+        self.recipe_cache = RecipeCache(self.proto_table, {
+            "laboratory": ("generator",),
+            "forgepress": ("forgepress",),
+        })
+        # placement searches run off the update callback on coordinate arrays
+        self.planner = Planner()
+        self.placement = Placement(self.game)
+        # map static data shared between matches, opened once the map is known
+        self.map_cache = None
+        # distance bounds for pruning target searches, built on the planner once a search has enough targets
+        self.landmarks = None
+        # distance from the nucleus to every tile, estimated until it is measured, see base_distances()
+        self.base_field = None
+        self.pending_field = None
+        self.field_task = None
+        # enemy dps per map region, see threats()
+        self.threat_map = None
+        # economic strategy, see build_order.yaml
+        self.build_rules = BuildOrder.load(params=self.config.to_dict())
         self.initialized = False
 
         # register update callback
@@ -43,6 +132,9 @@ class Bot:
             if port:
                 self.game.set_start_gui(True)
                 self.game.connect_direct("192.168.2.102", port)
+                self.save_map_cache()
+                self.profiler.close()
+                log.close()
                 os.kill(pid, signal.SIGTERM)
                 return
 
@@ -53,6 +145,10 @@ class Bot:
             self.game.connect_new_server(extra_params=f"-m {random_map}") # --allowUwApiAdmin 1")
             #self.game.connect_new_server(extra_params="-m planets/triangularprism.uw") # --allowUwApiAdmin 1")
 
+        self.save_map_cache()
+        self.profiler.close()
+        log.close()
+
         os.kill(pid, signal.SIGTERM)
 
     def entity_to_json(self, e, distance=False, show_recipe=False, show_prototype=False):
@@ -85,13 +181,14 @@ class Bot:
         info = dict(filter(lambda x: x[1] is not None, info.items()))
 
         if distance:
-            dist = self.game.map.distance_estimate(self.main_building.Position.position, pos)
+            dist = self.base_distances()(pos)
             info["distance_to_main_building"] = dist
 
         return json.dumps(info, indent=4)
 
     def print_entity(self, e, print_distance=True):
-        print(self.entity_to_json(e, print_distance))
+        if log.enabled(DEBUG):
+            log.debug("%s", self.entity_to_json(e, print_distance))
     
     def unit(self, entity):
         self.game.prototypes.unit(entity.Proto.proto)
@@ -99,338 +196,422 @@ class Bot:
     def is_atv(self, entity):
         return entity.has("Unit") and entity.name() == "ATV"
         
+    def index(self):
+        # built lazily on first use in a step and shared by everything else in it
+        if self.snapshot is None or self.snapshot.step != self.step:
+            self.snapshot = Snapshot(self.game, self.step, self.proto_columns)
+        return self.snapshot
+
     def init_prototypes(self):
         if len(self.prototypes) > 0:
             return
         for p in self.game.prototypes.all():
             name = str(self.game.prototypes.name(p))
             type = str(self.game.prototypes.type(p))
+            props = self.game.prototypes.json(p)
             self.prototypes[p] = {
                 "id": p,
                 "name": name,
                 "type": type,
-                "json": self.game.prototypes.json(p),
+                "json": props,
             }
+            self.proto_table[p] = ProtoInfo(p, name, type, props if isinstance(props, dict) else {})
             if type == "Prototype.Construction":
-                print(f"Adding construction prototype: {name}")
+                log.debug("Adding construction prototype: %s", name)
                 self.construction_ids[name] = p
                 self.construction_names[p] = name
             elif type == "Prototype.Recipe":
                 self.recipe_id_by_name[name] = p
+        self.proto_columns = ProtoColumns(self.proto_table)
 
     def get_closest_ores(self):
         if self.resources_map:
             return
-        for e in self.game.world.entities().values():
-            if not (hasattr(e, "Unit")) and not e.own():
-                continue
-            unit = self.game.prototypes.unit(e.Proto.proto)
-            if not unit:
-                continue
-            if "deposit" not in unit.get("name", ""):
-                continue
-            name = unit.get("name", "").replace(" deposit", "")
-            self.resources_map[name].append(e)
+        index = self.index()
+        for name, deposits in index.group(index.is_deposit).items():
+            self.resources_map[name.replace(" deposit", "")] = np.array([d.position for d in deposits], dtype=np.int64)
         if not self.main_building:
             return
-        for r in self.resources_map:
-            self.resources_map[r].sort(key=lambda x: self.game.map.distance_estimate(
-                        self.main_building.Position.position, x.Position.position
-                    ))
+        site = self.main_building.Position.position
+        order = self.map_cache.deposit_order(site) if self.map_cache else None
+        if order is not None:
+            # deposits are static, the order from an earlier match on this base site still holds
+            for r, positions in self.resources_map.items():
+                rank = {p: i for i, p in enumerate(order.get(r, []))}
+                ranks = np.array([rank.get(int(p), len(rank)) for p in positions])
+                self.resources_map[r] = positions[np.argsort(ranks, kind="stable")]
+            return
+        field = self.base_distances()
+        for r, positions in self.resources_map.items():
+            self.resources_map[r] = positions[np.argsort(field.of(positions), kind="stable")]
+        if self.map_cache:
+            self.map_cache.set_deposit_order(site, {
+                r: positions.tolist() for r, positions in self.resources_map.items()
+            })
+
+    def open_map_cache(self):
+        if not map_cache.ENABLED:
+            return
+        try:
+            self.map_cache = MapCache.open(self.game)
+        except Exception as e:
+            log.warning("Map cache disabled: %s", e)
+            return
+        self.distance.store = self.map_cache
+        self.neighborhoods.store = self.map_cache
+        self.placement.use(self.map_cache.coords)
+
+    def save_map_cache(self):
+        if self.map_cache is None:
+            return
+        try:
+            self.map_cache.save(areas=self.neighborhoods.areas(), distances=self.distance.entries())
+        except Exception as e:
+            log.warning("Map cache not saved: %s", e)
+
+    def load_landmarks(self):
+        table = self.map_cache.get("landmarks") if self.map_cache else None
+        if table is not None:
+            self.use_landmarks(Landmarks(table))
+            return
+        coords = self.placement.coords()
+        if self.map_cache:
+            build, args = Landmarks.build, (coords, self.map_cache.neighbors_indptr, self.map_cache.neighbors_data)
+        else:
+            # the adjacency lists are turned into CSR on the planner as well
+            build, args = Landmarks.from_neighbors, (coords, self.game.map.neighbors())
+        # the table holds for the whole match, however long the build takes
+        self.planner.submit(
+            "landmarks", build, *args,
+            step=self.step, apply=self.use_landmarks, max_age=float("inf"),
+        )
+
+    def use_landmarks(self, landmarks):
+        landmarks.calibrate(self.distance)
+        self.landmarks = landmarks
+        if self.map_cache and self.map_cache.get("landmarks") is None:
+            self.map_cache.put("landmarks", landmarks.table)
+
+    def nearest_enemies(self, rows):
+        # nearest(position, k) against a fixed set of enemies, rows of this step's
+        # snapshot. The k-d tree answers from at most spatial.MEASURE_LIMIT
+        # estimates per query, units standing on the same tile share one answer.
+        # The landmarks only take over for many targets and hand back to the
+        # tree when they cannot prune
+        index = self.index()
+        enemies = index.select(rows)
+        spatial = []
+        answers = {}
+
+        def exact(pos, k):
+            key = (int(pos), k)
+            found = answers.get(key)
+            if found is None:
+                if not spatial:
+                    spatial.append(SpatialIndex(self.game, enemies))
+                found = answers[key] = spatial[0].nearest(pos, k, self.distance)
+            return found
+
+        if len(rows) < landmarks.MIN_TARGETS:
+            return exact
+        if self.landmarks is None:
+            # first time this many targets, the table is built (or loaded) from now on
+            if not self.planner.busy("landmarks"):
+                self.load_landmarks()
+            if self.landmarks is None:
+                return exact
+        table = self.landmarks
+        positions = index.positions[rows]
+        columns = table.columns(positions)
+        coords = self.placement.coords()
+        points = coords[positions]
+
+        def nearest(pos, k):
+            found = table.nearest(pos, positions, k, self.distance, coords, points, columns)
+            return exact(pos, k) if found is None else [enemies[i] for i in found]
+
+        return nearest
 
     def find_main_base(self):
         if self.main_building:
             return
-        for e in self.game.world.entities().values():
-            if not (e.own() and hasattr(e, "Unit")):
-                continue
-            unit = self.game.prototypes.unit(e.Proto.proto)
-            if not unit:
-                continue
-            if unit.get("name", "") == "nucleus":
-                self.main_building = e
+        nuclei = self.index().own_by_name("nucleus")
+        if nuclei:
+            self.main_building = nuclei[-1].entity()
+            self.base_distances()
+
+    def base_distances(self):
+        # the nucleus does not move, the field is only measured again for a new one.
+        # Measuring takes an estimate per tile, so measure_base_distances() spreads
+        # it over steps and the DistanceCache answers until it is done
+        site = int(self.main_building.Position.position)
+        if self.base_field is None or self.base_field.origin != site:
+            self.base_field = DistanceField.load(site, self.map_cache)
+            self.pending_field = None
+            if self.base_field is None:
+                self.base_field = EstimatedField(site, self.distance)
+                self.pending_field = PendingField(site, len(self.game.map.positions()))
+                if self.field_task is None:
+                    # a slice per step from the next one, not during init (which ends
+                    # as step 2 and already does a full pass over the world)
+                    self.field_task = self.scheduler.every("base distances", self.measure_base_distances, 1,
+                                                           offset=max(self.step, 2) + 1, priority=BUILD, budget=FIELD_SLICE)
+        return self.base_field
+
+    def measure_base_distances(self):
+        if self.pending_field is not None:
+            field = self.pending_field.measure(self.game.map.distance_estimate, FIELD_SLICE)
+            if field is None:
+                return
+            self.pending_field = None
+            self.use_base_distances(field)
+        # done, base_distances() schedules it again for a new nucleus
+        self.scheduler.cancel(self.field_task)
+        self.field_task = None
+
+    def use_base_distances(self, field):
+        # a field for a nucleus that is gone by now is of no use
+        if self.base_field is None or self.base_field.origin != field.origin:
+            return
+        self.base_field = field
+        if self.map_cache:
+            self.map_cache.put(DistanceField.name(field.origin), field.values)
+
+    def threats(self):
+        # brought up to date at most once per step
+        if self.threat_map is None:
+            self.threat_map = ThreatMap(self.placement.coords())
+        if self.threat_map.step != self.step:
+            self.threat_map.update(self.index().enemy_units, self.proto_table, self.step)
+        return self.threat_map
 
     def attack(self, aggression=False, closest_to_self=False):
-        own_units = [
-            e
-            for e in self.game.world.entities().values()
-            if e.own()
-            and e.has("Unit")
-            and self.game.prototypes.unit(e.Proto.proto)
-            and self.game.prototypes.unit(e.Proto.proto).get("dps", 0) > 0
-        ]
+        index = self.index()
+        own_units = index.armed
         if not own_units:
             return
 
-        enemy_units = [
-            { "e": e, "dist": self.game.map.distance_estimate(e.Position.position, self.main_building.Position.position) }
-            for e in self.game.world.entities().values()
-            if e.policy() == uw.Policy.Enemy and e.has("Unit") and self.game.prototypes.unit(e.Proto.proto).get("name", "") != "eagle"
-        ]
+        candidates = index.is_enemy & index.is_unit & ~index.named("eagle")
         # MARK distance thresholds
-        DEFENSE_DISTANCE = 820
-        threshold = 20000 if aggression else DEFENSE_DISTANCE
-        enemy_units = sorted(filter(lambda x: x["dist"] < threshold, enemy_units), key=lambda x: x["dist"])
-        if not enemy_units:
-            print("No enemy units found - falling back to nucleus")
-            if random.random() > 0.80:
+        config = self.config
+        threshold = config.aggression_distance if aggression else config.defense_distance
+        close, dist = index.closer(candidates, self.base_distances(), threshold)
+        if not len(close):
+            log.info("No enemy units found - falling back to nucleus", every=5)
+            if random.random() > 1 - config.scatter_chance:
                 self.scatter()
             else:
                 self.send_to_talos()
             return
 
-        print(f"Attacking closest enemy unit, distance {enemy_units[0]['dist']}")
+        log.debug("Attacking closest enemy unit, distance %s", dist[0])
+        nearest = None
+        if closest_to_self:
+            nearest = self.nearest_enemies(close)
+        else:
+            enemy_units = index.select(close[:2])
+
         for u in own_units:
             _id = u.Id
-            pos = u.Position.position
-            if len(self.game.commands.orders(_id)) > 0:
+            pos = u.position
+            if len(self.commands.orders(_id)) > 0:
                continue
             
-            if closest_to_self:
-                enemy_units = sorted(enemy_units, key=lambda x: self.game.map.distance_estimate(x["e"].Position.position, pos))
+            if nearest is not None:
+                targets = nearest(pos, 2)
+            else:
+                targets = enemy_units[:2]
             
-            if random.random() > 0.80 and len(enemy_units) > 1:
-                self.game.commands.order(
-                    _id, self.game.commands.fight_to_entity(enemy_units[1]["e"].Id)
+            if random.random() > 1 - config.second_target_chance and len(targets) > 1:
+                self.commands.order(
+                    _id, self.commands.fight_to_entity(targets[1].Id)
                 )
             else:
-                self.game.commands.order(
-                    _id, self.game.commands.fight_to_entity(enemy_units[0]["e"].Id)
+                self.commands.order(
+                    _id, self.commands.fight_to_entity(targets[0].Id)
                 )
     
 
     def attack_nearest_enemies(self, clear_orders=True, entity=None):
-        own_units = [
-            e
-            for e in self.game.world.entities().values()
-            if e.own()
-            and e.has("Unit")
-            and self.game.prototypes.unit(e.Proto.proto)
-            and self.game.prototypes.unit(e.Proto.proto).get("dps", 0) > 0
-        ]
+        index = self.index()
+        own_units = index.armed
         if not own_units:
             return
 
-        enemy_units = [
-            e
-            for e in self.game.world.entities().values()
-            if e.policy() == uw.Policy.Enemy and e.has("Unit")
-        ]
-        if not enemy_units:
+        enemy_units = np.flatnonzero(index.is_enemy & index.is_unit)
+        if not len(enemy_units):
             return
 
+        nearest = self.nearest_enemies(enemy_units) if entity is None else None
+
         for u in own_units:
             _id = u.Id
-            pos = u.Position.position
-            if len(self.game.commands.orders(_id)) == 0 or clear_orders:
-                enemy = sorted(
-                    enemy_units,
-                    key=lambda x: self.game.map.distance_estimate(
-                        pos, x.Position.position
-                    ),
-                )[0]
+            pos = u.position
+            if len(self.commands.orders(_id)) == 0 or clear_orders:
                 if entity is not None:
                     enemy = entity
-                self.game.commands.order(
-                    _id, self.game.commands.fight_to_entity(enemy.Id)
+                else:
+                    enemy = nearest(pos, 1)[0]
+                self.commands.order(
+                    _id, self.commands.fight_to_entity(enemy.Id)
                 )
     
     def scatter(self, include_atvs=False):
-        own_units = [
-            e
-            for e in self.game.world.entities().values()
-            if e.own()
-            and e.has("Unit")
-            and self.game.prototypes.unit(e.Proto.proto)
-            and (self.game.prototypes.unit(e.Proto.proto).get("dps", 0) > 0 or include_atvs)
-        ]
+        index = self.index()
+        own_units = index.own_units if include_atvs else index.armed
         if not own_units:
             return
 
         for u in own_units:
             _id = u.Id
-            pos = u.Position.position
+            pos = u.position
             neighbors = self.game.map.neighbors_of_position(pos)
             new_pos = random.choice(neighbors)
-            self.game.commands.order(
-                _id, self.game.commands.run_to_position(new_pos)
+            self.commands.order(
+                _id, self.commands.run_to_position(new_pos)
             )
     
     def send_to_talos(self):
-        own_units = [
-            e
-            for e in self.game.world.entities().values()
-            if e.own()
-            and e.has("Unit")
-            and self.game.prototypes.unit(e.Proto.proto)
-            and self.game.prototypes.unit(e.Proto.proto).get("dps", 0) > 0
-        ]
-        talos = self.buildings.get("talos", []) + [self.main_building]
-
-        enemy_units = [
-            e
-            for e in self.game.world.entities().values()
-            if e.policy() == uw.Policy.Enemy and e.has("Unit")
-        ]
-        # find talos closest to enemy
-        the_talos = random.choice(talos)
-        dist = 1000000
-        for t in talos:
-            closest_dist = 1000000
-            for e in enemy_units:
-                d = self.game.map.distance_estimate(t.Position.position, e.Position.position)
-                if d < closest_dist and random.random() > 0.8:
-                    closest_dist = d
-            
-            if closest_dist < dist and random.random() > 0.2:
-                dist = closest_dist
-                the_talos = t
-        
+        index = self.index()
+        own_units = index.armed
+        # (id, position) of the taloses and the nucleus
+        talos = [(t.Id, t.Position.position) for t in self.buildings.get("talos", [])]
+        talos.append((self.main_building.Id, self.main_building.Position.position))
+
+        # rally at the talos closest to an armed enemy, wherever that enemy is
+        threats = self.threats()
+        closest = [threats.closest(EstimatedField(pos, self.distance)) for _, pos in talos]
+        dist = [c[1] if c is not None else float("inf") for c in closest]
+        the_talos = talos[dist.index(min(dist))] if min(dist) < float("inf") else random.choice(talos)
+
         for u in own_units:
             _id = u.Id
-            if len(self.game.commands.orders(_id)) == 0:
+            if len(self.commands.orders(_id)) == 0:
                 # run to entity
-                self.game.commands.order(_id, self.game.commands.run_to_entity(the_talos.Id))
+                self.commands.order(_id, self.commands.run_to_entity(the_talos[0]))
 
     def assign_recipes(self):
-        already_have_armor_plates = False
-        for e in self.game.world.entities().values():
-            if not (e.own() and hasattr(e, "Unit")):
-                continue
-            unit = self.game.prototypes.unit(e.Proto.proto)
-            if not unit:
-                continue
-            name = unit.get("name", "")
-            recipes = unit["recipes"]
-            if len(recipes) > 0:
-                if name == "laboratory":
-                    if self.is_nearby(e, "crystals deposit", radius=15):
-                        self.game.commands.command_set_recipe(e.Id, self.recipe_id_by_name.get("shield projector"))
-                    elif self.is_nearby(e, "generator", radius=2):
-                        self.game.commands.command_set_recipe(e.Id, self.recipe_id_by_name.get("quantum ray"))
-                    else:
-                        # smelter
-                        self.game.commands.command_set_recipe(e.Id, self.recipe_id_by_name.get("atomic forge"))
-                elif name == "forgepress":
-                    if already_have_armor_plates:
-                        self.game.commands.command_set_recipe(e.Id, self.recipe_id_by_name.get("reinforced plates"))
-                        continue
-
-                    for i in [4, 6, 8, 10, 12, 14, 16]:
-                        if self.is_nearby(e, "smelter", radius=i):
-                            # smelter
-                            self.game.commands.command_set_recipe(e.Id, self.recipe_id_by_name.get("reinforced plates"))
-                            continue
-                    else:
-                        self.game.commands.command_set_recipe(e.Id, self.recipe_id_by_name.get("armor plates"))
-                        already_have_armor_plates = True
-                elif name == "experimental assembler":
-                    self.game.commands.command_set_recipe(e.Id, self.recipe_id_by_name.get("colossus"))
-                else:
-                    recipe = None
-                    for r in recipes:
-                        # plasma blaster, shield priojector, jaggernaut, atv
-                        if r in [2688628973, 4128605704, 3556640323, 2717031940]:
-                            self.game.commands.command_set_recipe(e.Id, r)
-    
+        cache = self.recipe_cache
+        if cache.dirty:
+            already_have_armor_plates = False
+            for _id in cache.take_dirty():
+                e = cache.producers[_id]
+                recipe = self.desired_recipe(e, cache.name(_id), already_have_armor_plates)
+                if cache.name(_id) == "forgepress" and recipe == self.recipe_id_by_name.get("armor plates"):
+                    already_have_armor_plates = True
+                cache.desired[_id] = recipe
+
+        for _id, recipe in cache.changes():
+            self.commands.command_set_recipe(_id, recipe)
+
+    def desired_recipe(self, e, name, already_have_armor_plates=False):
+        if name == "laboratory":
+            if self.is_nearby(e, "crystals deposit", radius=15):
+                return self.recipe_id_by_name.get("shield projector")
+            elif self.is_nearby(e, "generator", radius=2):
+                return self.recipe_id_by_name.get("quantum ray")
+            else:
+                # smelter
+                return self.recipe_id_by_name.get("atomic forge")
+        elif name == "forgepress":
+            # the first forgepress in world order makes armor plates, the rest
+            # reinforced plates; the smelter check of the original loop never
+            # decided anything, its for/else always ended on armor plates
+            if already_have_armor_plates:
+                return self.recipe_id_by_name.get("reinforced plates")
+            return self.recipe_id_by_name.get("armor plates")
+        elif name == "experimental assembler":
+            return self.recipe_id_by_name.get("colossus")
+        else:
+            recipe = None
+            defaults = [self.recipe_id_by_name.get(r) for r in DEFAULT_RECIPES]
+            for r in self.proto_table[e.Proto.proto].recipes:
+                if r in defaults:
+                    recipe = r
+            return recipe
+
+    def production_flow(self):
+        # steady state of the recipes the own buildings run, memoized per mix
+        mix = defaultdict(int)
+        for _id, e in self.recipe_cache.producers.items():
+            recipe = e.Recipe.recipe if e.has("Recipe") else None
+            recipe = recipe or self.recipe_cache.desired.get(_id)
+            if recipe in self.prototypes:
+                mix[self.prototypes[recipe]["name"]] += 1
+        if self.production is None:
+            self.production = Production.from_prototypes(self.prototypes)
+        return self.production.steady_state(mix)
+
     def is_nearby(self, entity, name, radius=1):
         # neighbours = self.game.map.neighbors_of_position(entity.Position.position)
-        total_radius = self.game.prototypes.unit(entity.Proto.proto).get("buildingRadius", 0) + radius
-        positions = self.game.map.area_neighborhood(entity.Position.position, total_radius)
-
-        for pos in positions:
-            entities = self.game.map.entities(pos)
-            for e_ in entities:
-                e = self.game.world.entities().get(e_)
-                if e.has("Unit") and self.game.prototypes.unit(e.Proto.proto).get("name", "") == name:
-                    return True
-        
-        return False
+        total_radius = self.proto_table[entity.Proto.proto].building_radius + radius
+        # the index holds the tile each unit stands on, like map.entities()
+        self.nearby_names.sync(self.game.world.entities(), self.step)
+        return self.nearby_names.has(entity.Position.position, name, total_radius)
 
 
     def get_recipe(self, name):
         self.game.recipes.get(name)
 
     def get_own_buildings(self):
-        self.atvs = []
-        self.juggernauts = []
-        self.colossus = []
-        self.buildings = defaultdict(list)
-        self.drill_positions = defaultdict(list)
-        self.building_positions = defaultdict(list)
-        self.resource_counts = defaultdict(int)
-        self.constructions = defaultdict(list) 
-        self.enemy_main_buildings = []
-
-        for e in self.game.world.entities().values():
-            
-            if not e.has("Proto"):
-                continue
-            
-            prototype = self.prototypes.get(e.Proto.proto, {})
-            type = prototype.get("type", "")
-            name = prototype.get("name", "")
-
-            if name == "nucleus" and not e.own():
-                self.enemy_main_buildings.append(e)  
-
-            if not e.own():
-                continue
-
-            if type == "Prototype.Construction":
-                self.constructions[name].append(e)
-                print(f"Enabling {name}")
+        entities = self.game.world.entities()
+        appeared, removed, changed = self.tracker.update(entities)
+        tracker = self.tracker
+        self.commands.forget(removed)
+        self.commands.forget(changed)
+        for _id in removed:
+            self.recipe_cache.remove(_id)
+        for _id in changed:
+            self.recipe_cache.remove(_id)
+        for e in appeared:
+            if e.own():
+                self.recipe_cache.add(e)
+
+        for _id in changed:
+            self.nearby_names.add(entities[_id])
+
+        for e in appeared:
+            kind, name = tracker.kind(e.Id)
+            if kind == "construction":
+                log.debug("Enabling %s", name)
                 # recipes = self.game.prototypes.unit(prototype.id).get("recipes", [])
                 # for r in recipes:
                 #     if r in [2688628973, 4128605704, 3556640323, 2717031940]:
-                #         self.game.commands.command_set_recipe(e.Id, r)
-
-                self.game.commands.command_set_priority(e.Id, 1)
-                continue
-
-            if type == "Prototype.Resource":
-                self.resource_counts[name] += e.Amount.amount
-                continue
-
-            if name == "ATV":
-                self.atvs.append(e)
-                continue
-
-            if name == "juggernaut":
-                self.juggernauts.append(e)
-                continue
-            
-            if name == "colossus":
-                self.colossus.append(e)
-                continue
-
-            props = self.game.prototypes.json(e.Proto.proto)
-
-            if props.get("buildingRadius", 0) > 0:
-                self.buildings[name].append(e)
-                self.building_positions[name].append(int(e.Position.position))
-
-                # print(f"Building: {self.entity_to_json(e)}")
-                if name == "nucleus":
-                    self.main_building = e
-                elif name in ["drill", "pump"]:
-                    # get recipe
-                    recipe_id = e.Recipe.recipe
-                    recipe = self.game.prototypes.recipes(recipe_id)
-                    self.drill_positions[recipe["name"]].append(int(e.Position.position))
-                continue
-
-            self.print_entity(e)
+                #         self.commands.command_set_recipe(e.Id, r)
+
+                self.commands.command_set_priority(e.Id, 1)
+            elif kind == "other":
+                self.print_entity(e)
+
+        # views are rebuilt from the tracker (own base only), which also drops
+        # positions that build() / build_drills() noted since the last pass.
+        # Masks and counts over the whole world come from the snapshot, see index()
+        self.atvs = list(tracker.atvs.values())
+        self.juggernauts = list(tracker.juggernauts.values())
+        self.colossus = list(tracker.colossus.values())
+        self.buildings = defaultdict(list, {name: list(b.values()) for name, b in tracker.buildings.items() if b})
+        self.constructions = defaultdict(list, {name: list(c.values()) for name, c in tracker.constructions.items() if c})
+        self.building_positions = defaultdict(list, {
+            name: [int(e.Position.position) for e in b] for name, b in self.buildings.items()
+        })
+        self.drill_positions = defaultdict(list, {
+            resource: [int(e.Position.position) for e in d.values()] for resource, d in tracker.drills.items() if d
+        })
+        self.resource_counts = defaultdict(int, tracker.resource_counts)
+        self.enemy_main_buildings = list(tracker.enemy_main_buildings.values())
+
+        if tracker.main_building is not None:
+            self.main_building = tracker.main_building
 
     def build(self, construction, position):
-        print(f"Building {construction} at {position} @ step {self.step}")
+        log.info("Building %s at %s @ step %d", construction, position, self.step)
         construction_id = self.construction_ids.get(construction)
         if position is None:
-            print(f"ERROR: No position passed for {construction} - using nucleuas position")
+            log.error("No position passed for %s - using nucleuas position", construction)
             position = self.main_building.Position.position
             position = self.game.map.find_construction_placement(construction_id, position)
 
-        self.game.commands.command_place_construction(construction_id, position)
+        self.commands.command_place_construction(construction_id, position)
         self.building_positions[construction].append(int(position))
         # print(f"buildings[{construction}]: {self.buildings[construction]}")
 
@@ -442,7 +623,7 @@ class Bot:
             construction_id = self.construction_ids.get(construction)
 
         if construction_id is None:
-            print(f"ERROR: No construction_id found for {construction}")
+            log.error("No construction_id found for %s", construction)
             return
 
         pos = self.game.map.find_construction_placement(construction_id, position)
@@ -452,17 +633,17 @@ class Bot:
     def build_nearby_drill(self, construction, resource, index=0, with_gap=False):
         drills = self.drill_positions.get(resource, [])
         deposits = self.resources_map.get(resource, [])
-        drills += list(map(lambda x: x.Position.position, deposits))
+        drills += [int(p) for p in deposits]
         drills += [self.main_building.Position.position] * (index + 2)
         
-        print(f"Building {construction} near {resource}")
+        log.info("Building %s near %s", construction, resource)
         construction_id = None
         if with_gap:
             construction_id = self.construction_ids.get("experimental assembler")
         else:
             construction_id = self.construction_ids.get(construction)
 
-        print(f"construction_id: {construction_id} for '{construction}'")
+        log.debug("construction_id: %s for '%s'", construction_id, construction)
         pos = self.game.map.find_construction_placement(construction_id, drills[index])
         self.build(construction, pos)
         return pos
@@ -471,12 +652,15 @@ class Bot:
         buildings = self.buildings.get(building, [])
 
         if not buildings or len(buildings) == 0:
-            print(f"No buildings found for {building}")
-            buildings = self.constructions.get(building, [self.main_building] * (index + 2))
+            log.info("No buildings found for %s", building)
+            buildings = self.constructions.get(building)
 
-        building_positions = list(map(lambda x: x.Position.position, buildings))
+        if buildings:
+            building_positions = [b.Position.position for b in buildings]
+        else:
+            building_positions = [self.main_building.Position.position] * (index + 2)
 
-        print(f"Building {construction} near {building}")
+        log.info("Building %s near %s", construction, building)
         # print(f"buildings: {buildings}")
 
         construction_id = None
@@ -492,172 +676,142 @@ class Bot:
     def build_drills(self, resource, count):
         if resource in ["metal", "crystals"]:
             # drill
-            print("Building drill")
+            log.info("Building drill")
             construction_id = 3148228606
         else:
             # pump
-            print("Building pump")
+            log.info("Building pump")
             construction_id = 2775974627
 
-        deposits = self.resources_map.get(resource, [])
-        print(f"Building {count} {resource} drills")
-        print(f"Main building: {self.main_building.Position.position}")
+        deposits = self.resources_map.get(resource, np.empty(0, dtype=np.int64))
+        log.info("Building %d %s drills", count, resource)
+        log.debug("Main building: %s", self.main_building.Position.position)
         # print(f"Found {resource} deposits: {len(deposits)}")
-        for e in deposits[:count]:
-            # self.print_entity(e)
-            self.game.commands.command_place_construction(construction_id, e.Position.position)
-            print(f"Building drill at {e.Position.position}")
-            self.drill_positions[resource].append(int(e.Position.position))
+        for pos in deposits[:count].tolist():
+            self.commands.command_place_construction(construction_id, pos)
+            log.info("Building drill at %s", pos)
+            self.drill_positions[resource].append(pos)
     
     def print_stats(self):
-        print(f"\n\n========= STATS @ step {self.step} =========")
-        print(f"Main building: {self.main_building.Position.position}")
-        print(f"ATVs: {len(self.atvs)}")
-        print(f"Juggernauts: {len(self.juggernauts)}")
-        print(f"Drills:")
+        if not log.enabled(INFO):
+            return
+        log.info("\n\n========= STATS @ step %d =========", self.step)
+        log.info("Main building: %s", self.main_building.Position.position)
+        log.info("Distance cache: %s", self.distance.stats())
+        log.info("Commands: %s", self.commands.stats())
+        log.info("Log: %s", log.stats())
+        log.info("Engine log: %s", self.engine_log.stats())
+        log.info("Planner: %s", self.planner.stats())
+        log.info("Build order: %s", self.build_rules.stats())
+        flow = self.production_flow()
+        log.info("Production per minute: %s", ", ".join(f"{item} {rate:+.1f}" for item, rate in sorted(flow.rates.items())))
+        if flow.bottlenecks:
+            log.info("Bottlenecks: %s", ", ".join(f"{item} ({share:.0%} of demand)" for item, share in flow.bottlenecks))
+        log.info("ATVs: %d", len(self.atvs))
+        log.info("Juggernauts: %d", len(self.juggernauts))
+        log.info("Drills:")
         for resource in self.drill_positions.keys():
-            print(f"  {resource}: {len(self.drill_positions[resource])}")
-        print(f"Buildings:")
+            log.info("  %s: %d", resource, len(self.drill_positions[resource]))
+        log.info("Buildings:")
         for building in self.buildings.keys():
-            print(f"  {building}: {len(self.buildings[building])}")
-        print(f"Constructions:")
+            log.info("  %s: %d", building, len(self.buildings[building]))
+        log.info("Constructions:")
         for building in self.constructions.keys():
-            print(f"  {building}: {len(self.constructions[building])}")
-        print(f"Resources:")
+            log.info("  %s: %d", building, len(self.constructions[building]))
+        log.info("Resources:")
         for resource in self.resource_counts.keys():
-            print(f"  {resource}: {self.resource_counts[resource]}")
+            log.info("  %s: %s", resource, self.resource_counts[resource])
+        log.info("Tasks (%d steps over budget):", self.scheduler.overruns)
+        log.info("%s", self.scheduler.stats())
 
     def build_talos(self, with_gap=False, distance=260):
-        enemies = [
-            e
-            for e in self.game.world.entities().values()
-            if e.policy() == uw.Policy.Enemy
-            and e.has("Unit")
-            # and self.game.prototypes.unit(e.Proto.proto).get("name", "") != "eagle"
-        ]
-        closest_enemy = None
-        min_dist = 1000000
-        for e in enemies:
-            dist = self.game.map.distance_estimate(e.Position.position, self.main_building.Position.position)
-            if dist < min_dist:
-                min_dist = dist
-                closest_enemy = e
-        
-        if min_dist < 1200:
+        closest = self.threats().closest(self.base_distances())
+        if closest is not None and closest[1] < self.config.talos_threat_distance:
            return self.build_talos2(distance=distance)
 
         talos_count = len(self.buildings["talos"])
         # set random threshold to asymtoticly approach 1 as talos_count increases 
         random_threshold = 0.99 - 0.99 * (1 / (talos_count + 1))
-        print(f"Talos building random threshold: {random_threshold}")
+        log.debug("Talos building random threshold: %s", random_threshold)
 
-        if random_threshold > 0.6 and random.random() > 0.9:
+        if random_threshold > self.config.talos_front_threshold and random.random() > 1 - self.config.talos_front_chance:
             return self.build_talos2(distance=distance)
 
-        positions = self.game.map.area_neighborhood(self.main_building.Position.position, distance)
-        taloses = self.buildings.get("talos", []) + self.constructions.get("talos", [])
-
-        bwst_pos = random.choice(positions)
-        max_dist = 0
-        for pos in positions:
-            closest_talos = random.choice(taloses)
-            min_dist = 1000000
-            for t in taloses:
-                tpos = t.Position.position
-                dist = self.game.map.distance_estimate(pos, tpos)
-                if dist < min_dist:
-                    min_dist = dist
-                    closest_talos = pos
-            
-            if min_dist > max_dist and random.random() > random_threshold:
-                max_dist = min_dist
-                bwst_pos = closest_talos
+        positions = self.neighborhoods(self.main_building.Position.position, distance)
+        taloses = self.talos_sites()
 
-        self.build_nearby("talos", bwst_pos, with_gap=with_gap)
-        return
+        # the search runs on the planner, the talos is placed once it is done
+        # unless another talos appeared in the meantime
+        # coordinates are (re)built here, the worker only reads them
+        self.placement.coords()
+        rng = np.random.default_rng(random.getrandbits(32))
+        self.planner.submit(
+            "talos", self.placement.spread_position, positions, taloses, random_threshold, rng,
+            step=self.step,
+            apply=lambda pos: self.build_nearby("talos", pos, with_gap=with_gap),
+            valid=lambda: self.talos_sites() == taloses,
+        )
+
+    def talos_sites(self):
+        return sorted(int(t.Position.position) for t in self.buildings.get("talos", []) + self.constructions.get("talos", []))
 
     def attack_nearest_base(self):
-        bases = [{
-            "dist": self.game.map.distance_estimate(e.Position.position, self.main_building.Position.position),
-            "e": e
-        } for e in self.game.world.entities().values() 
-            if e.policy() == uw.Policy.Enemy
-            and e.has("Unit")
-            #and e.game.prototypes.unit(e.Proto.proto).get("name", "") == "nucleus"
-            ]
-
-        sorted_bases = sorted(bases, key=lambda x: x["dist"])
+        index = self.index()
+        bases = np.flatnonzero(index.is_enemy & index.is_unit)
+        # bases = bases[index.named("nucleus")[bases]]
+        dist = self.base_distances().of(index.positions[bases])
+        sorted_bases = np.argsort(dist, kind="stable")
         x = 40
         if x > len(sorted_bases):
             x = len(sorted_bases) - 1
-        second_closest = sorted_bases[x]["e"]
+        second_closest = index.select(bases[sorted_bases[x:x + 1]])[0]
 
         self.attack_nearest_enemies(entity=second_closest)
 
 
     def build_talos2(self, distance=270):
-        positions = self.game.map.area_neighborhood(self.main_building.Position.position, distance)
-        dist = 1000000
-        nearest_enemy = None
-        for e in self.game.world.entities().values():
-            if e.policy() != uw.Policy.Enemy:
-                continue
-
-            d = self.game.map.distance_estimate(e.Position.position, self.main_building.Position.position)
-            if d < dist:
-                dist = d
-                nearest_enemy = e
-                continue
-        
-        if nearest_enemy:
-            closest_position = None
-            dist = 1000000
-            for pos in positions:
-                d = self.game.map.distance_estimate(pos, nearest_enemy.Position.position) 
-                if d < dist and d > 120 and random.random() > 0.80:
-                    dist = d
-                    closest_position = pos
-
-        self.build_nearby("talos", closest_position, with_gap=True)
+        positions = self.neighborhoods(self.main_building.Position.position, distance)
+        index = self.index()
+        enemies = np.flatnonzero(index.is_enemy)
+        if not len(enemies):
+            return
+        nearest_enemy = int(index.positions[enemies[np.argmin(self.base_distances().of(index.positions[enemies]))]])
+
+        taloses = self.talos_sites()
+        # coordinates are (re)built here, the worker only reads them
+        self.placement.coords()
+        rng = np.random.default_rng(random.getrandbits(32))
+        self.planner.submit(
+            "talos", self.placement.front_position, positions, nearest_enemy,
+            self.config.front_min_distance, self.config.front_sample, rng,
+            step=self.step,
+            apply=lambda pos: self.build_nearby("talos", pos, with_gap=True),
+            valid=lambda: self.talos_sites() == taloses,
+        )
     
     def destroy_building(self, name):
-        print(f"Destroying {name}")
+        log.info("Destroying %s", name)
         building = None
-        for e in self.game.world.entities().values():
-            if not e.own():
-                continue
-            if not e.has("Unit"):
-                continue
-            unit = self.game.prototypes.unit(e.Proto.proto)
-            if not unit:
-                continue
-            if unit.get("name", "") == name:
-                building = e
-                self.game.commands.command_self_destruct(building.Id)
-                self.buildings[name] = list(filter(lambda x: x.Id != building.Id, self.buildings[name]))
-                return
+        for e in self.index().own_by_name(name):
+            building = e
+            self.commands.command_self_destruct(building.Id)
+            self.buildings[name] = list(filter(lambda x: x.Id != building.Id, self.buildings[name]))
+            return
         
         if building is None:
-            print(f"Building {name} not found")
+            log.warning("Building %s not found", name)
             return
     
     def destroy_temporary_laboratory(self):
         name = "laboratory"
-        for e in self.game.world.entities().values():
-            if not e.own():
-                continue
-            # if not e.has("Unit"):
-            #     continue
-            unit = self.game.prototypes.unit(e.Proto.proto)
-            if not unit:
-                continue
-            if unit.get("name", "") == name:
-                print(f"Found {name} at {e.Position.position}")
-                if not self.is_nearby(e, "crystals deposit", radius=2) and not self.is_nearby(e, "generator", radius=2):
-                    print(f"Destroying {name} - near crystals deposit: {self.is_nearby(e, 'crystals deposit', radius=2)}, near generator: {self.is_nearby(e, 'generator', radius=2)}")
-                    self.game.commands.command_self_destruct(e.Id)
-                    self.buildings[name] = list(filter(lambda x: x.Id != e.Id, self.buildings[name]))
-                    break
+        for e in self.index().own_by_name(name):
+            log.debug("Found %s at %s", name, e.position)
+            live = e.entity()
+            if not self.is_nearby(live, "crystals deposit", radius=2) and not self.is_nearby(live, "generator", radius=2):
+                log.info("Destroying %s - not near crystals deposit or generator", name)
+                self.commands.command_self_destruct(e.Id)
+                self.buildings[name] = list(filter(lambda x: x.Id != e.Id, self.buildings[name]))
+                break
         
 
 
@@ -665,8 +819,8 @@ class Bot:
         # iterate all own buildings
         for name, items in self.constructions.items():
             for e in items:
-                print(f"Enabling {name} at {e.Position.position}")
-                self.game.commands.command_set_priority(e.Id, 1)
+                log.debug("Enabling %s at %s", name, e.Position.position)
+                self.commands.command_set_priority(e.Id, 1)
 
     def have_building(self, name, count):
         return len(self.buildings.get(name, [])) >= count
@@ -697,21 +851,16 @@ class Bot:
         self.destroy_building(name)
     
     def send_to_nucleus(self):
-        own_units = [
-            e
-            for e in self.game.world.entities().values()
-            if e.own() and e.has("Unit")
-            and self.game.prototypes.unit(e.Proto.proto).get("dps", 0) > 0
-        ]
-        print(f"Sending {len(own_units)} units to nucleus")
+        own_units = self.index().armed
+        log.info("Sending %d units to nucleus", len(own_units))
 
         if not own_units:
             return
 
         for u in own_units:
             _id = u.Id
-            if len(self.game.commands.orders(_id)) == 0:
-                self.game.commands.order(_id, self.game.commands.run_to_entity(self.main_building.Id))
+            if len(self.commands.orders(_id)) == 0:
+                self.commands.order(_id, self.commands.run_to_entity(self.main_building.Id))
 
     def update_callback_closure(self):
         def update_callback(stepping):
@@ -722,9 +871,12 @@ class Bot:
             try:
                 if self.step == 1:
                     self.init_prototypes()
+                    self.open_map_cache()
                     self.find_main_base()
                     self.get_own_buildings()
                     self.get_closest_ores()
+                    self.build_rules.check_names({p["name"] for p in self.prototypes.values()})
+                    self.register_tasks()
 
                     self.initialized = True                
                     self.step = 2
@@ -732,206 +884,99 @@ class Bot:
                 if not self.initialized:
                     return
 
-                if self.step % 100 == 0:
-                    self.game.log_info(f"step: {self.step}")
-                
-                if self.step % 10 == 3:
-                    self.get_own_buildings()
-                    self.assign_recipes()
-                    # self.enable_constructions()
-
-                if self.step == 13:
-                    self.build_drills("metal", 3)
-
-                # MARK manual strategy
-                # DEFENSE_DISTANCE
-                TALOS_DISTANCE = 260
-                JAGGERNAUT_AGGRESSION = 8
-                COLOSSUS_AGGRESSION = 3 
-
-                if self.step % 15 == 0:
-                    if random.random() > 0.9999:
-                        self.scatter()
-                    else:
-                        # self.scatter()
-                        aggression = self.have_jaggernaut(JAGGERNAUT_AGGRESSION) or self.have_colossus(COLOSSUS_AGGRESSION)
-                        # self.send_to_nucleus()
-                        # self.attack_nearest_base()
-                        self.attack(aggression=aggression, closest_to_self=True)
-                        # self.attack_nearest_enemies(clear_orders=True)
-
-                if self.step == 29:
-                    print("Manual Instructions")
-                    self.scatter()
-                    self.build_talos(with_gap=True, distance=TALOS_DISTANCE)
-                    self.scatter(include_atvs=True)
-                    # self.send_to_nucleus()
-                    # self.rebuild("blender")
-                    # self.destroy_building("laboratory")
-                    # self.build_nearby_building("smelter", "smelter")
-                    # self.build_nearby_building("arsenal", "arsenal")
-                    # self.destroy_building("talos")
-
-                    
-                if self.step % 50 == 0:                
-                    self.get_own_buildings()
-                    self.print_stats()
-                    return
-
-                if self.step % 40 == 11:
-                    if self.have_jaggernaut(1) and self.have_resources("metal", 6) and self.have_resources("reinforced concrete", 6) and not self.have_construction("talos", 2):
-                        self.build_talos(with_gap=True, distance=TALOS_DISTANCE)
-                        # self.build_talos2()
-                        return
-
-                    # build
-
-                    c_strat = True
-
-                    if self.have_drill("metal", 1) and self.should_build_building("concrete plant", 1):
-                        self.build_nearby_drill("concrete plant", "metal", 0)
-                        return
-                    
-                    if not self.have_building_or_construction("bot assembler", 1) and self.have_building_or_construction("concrete plant", 1) and self.should_build_building("concrete plant", 2):
-                        self.build_nearby_building("concrete plant", "concerte plant")
-                        return
-
-                    if self.have_building("concrete plant", 2) and self.have_building("drill", 2) and self.should_build_building("drill", 4):
-                        self.build_drills("crystals", 1)
-                        return
-
-                    if not self.have_building("drill", 4) and self.have_building("concrete plant", 2) and self.should_build_building("talos", 1):
-                        self.build_nearby_drill("talos", "crystals", 0, with_gap=True)
-                        return
-                
-                    if (self.have_building_or_construction("drill", 4)) and self.should_build_building("laboratory", 1):
-                        self.build_nearby_drill("laboratory", "crystals")
-                        return
-
-                    if self.have_building_or_construction("laboratory", 1) and self.should_build_building("pump", 1):
-                        self.build_drills("oil", 1)
-                        return
-
-                    if not self.have_building("pump", 1) and self.have_building("concrete plant", 2) and self.should_build_building("talos", 2):
-                        self.build_nearby_drill("talos", "oil", 0, with_gap=True)
-                        return
-                    
-                    if self.have_building("laboratory", 1) and self.have_building("drill", 3) and self.should_build_building("arsenal", 1):
-                        self.build_nearby_drill("arsenal", "metal", 2)
-                        return
-
-                    if self.have_drill("oil", 1) and self.should_build_building("bot assembler", 1):
-                        self.build_nearby_building("bot assembler", "laboratory", with_gap=c_strat)
-                        return
-
-                    if self.have_building("arsenal", 1) and self.should_build_building("talos", 3):
-                        self.build_talos(with_gap=True, distance=160)
-                        return
-
-                    if self.have_building("bot assembler", 1) and self.have_building("concrete plant", 2) and not c_strat:
-                        self.destroy_building("concrete plant")
-                    
-                    if len(self.atvs) < 9 and self.should_build_building("factory", 1):
-                        self.build_nearby_drill("factory", "metal", 1, with_gap=True)
-                    
-                    if len(self.atvs) > 20 and self.have_building("factory", 1):
-                        self.destroy_building("factory")
-                    
-                    if (self.have_building_or_construction("bot assembler", 1) and self.have_building("concrete plant", 2) and self.have_resources("reinforced concrete", 5)) or (self.have_building("bot assembler", 1) and self.have_building("concrete plant", 2)):
-                        self.destroy_building("concrete plant")
-                        return
-
-                    # if self.have_building("bot assembler", 1) and self.have_jaggernaut(1) and self.should_build_building("bot assembler", 2):
-                    #     self.build_nearby_building("bot assembler", "nucleus")
-                    #     return
-
-                    # if self.have_building("bot assembler", 2) and self.have_jaggernaut(3):
-                    #     self.destroy_concrete_plant()
-
-                    if not c_strat or not self.have_resources("metal", 4) or not self.have_resources("reinforced concrete", 4) or not self.have_jaggernaut(1):
-                        return
-
-                    if self.should_build_building("forgepress", 1):
-                        # share metal with concrete plant temporarily
-                        self.build_nearby_drill("forgepress", "metal", 2, with_gap=True)
-                        return
-
-                    if self.have_building("forgepress", 1) and self.should_build_building("pump", 2): 
-                        self.build_drills("aether", 1)
-                        return
-
-                    if self.have_drill("aether", 1) and self.have_building("forgepress", 1) and self.should_build_building("generator", 1):                    
-                        # built for armor plates from forgepress
-                        self.build_nearby_building("generator", "nucleus", with_gap=True)
-                        return
-
-                    if self.have_building("generator", 1) and self.should_build_building("smelter", 1):
-                        # share the same metal with the factory
-                        # build from power cell
-                        self.build_nearby_drill("smelter", "metal", 1, with_gap=True)
-                        return
-
-                    if self.have_drill("aether", 1) and self.have_building("generator", 1) and self.should_build_building("blender", 1):
-                        self.build_nearby_drill("blender", "aether")
-                        return
-
-                    if self.have_building("blender", 1) and self.should_build_building("blender", 2):
-                        self.build_nearby_drill("blender", "aether", with_gap=True)
-                        return
-
-                    if self.have_building("blender", 2) and self.should_build_building("blender", 3):
-                        self.build_nearby_drill("blender", "aether", with_gap=True)
-                        return
-
-                    if self.have_building("smelter", 1) and self.should_build_building("forgepress", 2):
-                        self.build_nearby_building("forgepress", "smelter", with_gap=True)
-                        return
-                    
-                    if self.have_building_or_construction("generator", 1) and self.have_building("smelter", 1) and self.should_build_building("laboratory", 2):
-                        self.build_nearby_building("laboratory", "smelter", with_gap=True)
-                        return
-                    
-                    if self.have_building("blender", 1) and self.have_building("laboratory", 2) and self.should_build_building("laboratory", 3):
-                        # quantum ray
-                        self.build_nearby_building("laboratory", "generator")
-                        return                    
-
-                    if self.have_building_or_construction("laboratory", 3) and self.should_build_building("experimental assembler", 1):
-                        self.build_nearby_building("experimental assembler", "smelter")
-                        return
-
-                    if self.have_building("experiental assembler", 1) and self.have_building("laboratory", 3):
-                        print("Trying to destroy laboratory")
-                        self.destroy_temporary_laboratory()
-                        return
-                    
+                self.planner.poll(self.step)
+                self.scheduler.run(self.step)
 
             except Exception as e:
-                print(f"Error: {e}\n", flush=True)
-                # print exception stack trace
-                traceback.print_exc()
+                # with the stack trace
+                log.error("%s\n%s", e, traceback.format_exc())
+
+            finally:
+                self.commands.flush()
+                log.step_end()
 
         return update_callback
-    
+
+    def register_tasks(self):
+        # MARK task schedule
+        # periods and offsets spread the work over steps, the scheduler defers
+        # lower priority tasks to the next step when a step runs over budget
+        tasks = self.scheduler
+        tasks.every("log step", lambda: self.game.log_info(f"step: {self.step}"), 100, priority=REPORTING, budget=0.0001)
+        tasks.every("refresh", self.refresh, 10, offset=3, priority=ECONOMY)
+        tasks.at("initial drills", lambda: self.build_drills("metal", 3), 13, priority=BUILD)
+        tasks.every("defend", self.defend, 15, priority=COMBAT)
+        tasks.at("manual instructions", self.manual_instructions, 29, priority=BUILD)
+        tasks.every("stats", self.report_stats, 50, priority=REPORTING)
+        tasks.every("build order", self.build_order, 40, offset=11, priority=BUILD)
+        tasks.every("map cache", self.save_map_cache, 1000, priority=REPORTING)
+        if self.profiler.enabled:
+            tasks.every("profile dump", lambda: self.profiler.dump(self.step), self.profiler.every, priority=REPORTING)
+
+    def refresh(self):
+        self.get_own_buildings()
+        self.assign_recipes()
+        # self.enable_constructions()
+
+    def defend(self):
+        if random.random() > 1 - self.config.defend_scatter_chance:
+            self.scatter()
+        else:
+            # self.scatter()
+            aggression = self.have_jaggernaut(self.config.juggernaut_aggression) or self.have_colossus(self.config.colossus_aggression)
+            # self.send_to_nucleus()
+            # self.attack_nearest_base()
+            self.attack(aggression=aggression, closest_to_self=True)
+            # self.attack_nearest_enemies(clear_orders=True)
+
+    def manual_instructions(self):
+        log.info("Manual Instructions")
+        self.scatter()
+        self.build_talos(with_gap=True, distance=self.config.talos_distance)
+        self.scatter(include_atvs=True)
+        # self.send_to_nucleus()
+        # self.rebuild("blender")
+        # self.destroy_building("laboratory")
+        # self.build_nearby_building("smelter", "smelter")
+        # self.build_nearby_building("arsenal", "arsenal")
+        # self.destroy_building("talos")
+
+    def report_stats(self):
+        self.get_own_buildings()
+        self.print_stats()
+
+    def build_order(self):
+        self.build_rules.run(self)
+
+    def count(self, count, name=""):
+        # counts the build order conditions read, see build_order.yaml
+        if count == "building":
+            return len(self.buildings.get(name, []))
+        if count == "construction":
+            return len(self.constructions.get(name, []))
+        if count == "built":
+            return len(self.buildings.get(name, [])) + len(self.constructions.get(name, []))
+        if count == "drill":
+            return len(self.drill_positions.get(name, []))
+        if count == "resource":
+            return self.resource_counts.get(name, 0)
+        if count == "juggernauts":
+            return len(self.juggernauts)
+        if count == "colossus":
+            return len(self.colossus)
+        if count == "atvs":
+            return len(self.atvs)
+        if count == "rate":
+            return round(self.production_flow().rates.get(name, 0.0), 3)
+        raise ValueError(f"unknown count {count!r}")
+
     def write_prototypes(self):
         with open("prototypes.json", "w") as f:
             f.write(json.dumps(self.prototypes, indent=4))
-            print("Prototypes written to file")
+            log.info("Prototypes written to file")
 
 
 if __name__ == "__main__":
     bot = Bot()
     bot.start()
 
-
-# def _log_callback(self, data):
-#     log_data = LogCallback.from_c(self._ffi, data)
-#     skip_messages = [
-#         "need to wait ",
-#         "schedule: ",
-#         "skipping ",
-#     ]
-#     for skip_message in skip_messages:
-#         if log_data.message.startswith(skip_message):
-#             return
-#     print(log_data.message, flush=True)
\ No newline at end of file
@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import numpy as np
+from botlog import log
+
+# bump when the layout or the meaning of a stored array changes
+VERSION = 1
+
+# BOT_MAP_CACHE sets the cache directory, BOT_MAP_CACHE=0 turns the cache off
+DIRECTORY = os.environ.get("BOT_MAP_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_cache"))
+ENABLED = DIRECTORY not in ("", "0")
+
+
+def map_key(game, coords):
+    # map name plus a hash of the geometry, so an edited map with the same name gets its own entry
+    m = game.map
+    name = m.name()
+    name = name.decode("utf-8", "replace") if isinstance(name, bytes) else str(name)
+    guid = m.guid()
+    guid = guid if isinstance(guid, bytes) else str(guid).encode()
+    h = hashlib.sha1(guid)
+    h.update(coords.tobytes())
+    for ns in m.neighbors():
+        h.update(np.asarray(ns, dtype=np.int32).tobytes())
+        h.update(b";")
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "map"
+    return f"{slug}-{h.hexdigest()[:16]}"
+
+
+def csr(lists):
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(x) for x in lists])
+    data = np.fromiter((v for x in lists for v in x), dtype=np.int32, count=int(indptr[-1]))
+    return indptr, data
+
+
+class MapCache:
+    # per-map precomputation stored as .npy files in DIRECTORY/<map>-<hash>/,
+    # the area and distance tables memory-mapped on load, the rest read in:
+    #   coords            float64 (positions, 3) tile centers
+    #   neighbors_*       CSR adjacency of the tiles
+    #   area_*            CSR of every (center, radius) neighborhood the bot asked for
+    #   distance_*        sorted (a << 32 | b) keys and distance_estimate values
+    # plus meta.json with the version and the deposit ordering per base site.
+    # Further per-map tables (e.g. landmarks.py) are stored by name with put()
+    # and listed in meta["arrays"]; an entry without one just lacks that table.
+    # The static parts are written on first encounter, the learned parts
+    # (areas, distances, deposit orders) by save() as the match goes on.
+    def __init__(self, path, coords, neighbors, areas, distances, meta, arrays=None):
+        self.path = path
+        self.coords = coords
+        self.neighbors_indptr, self.neighbors_data = neighbors
+        self.area_keys, self.area_indptr, self.area_data = areas
+        self.distance_keys, self.distance_values = distances
+        self.meta = meta
+        self.arrays = arrays or {}
+        self._area_slots = {(int(c), float(r)): i for i, (c, r) in enumerate(self.area_keys)}
+
+    @staticmethod
+    def open(game, directory=DIRECTORY):
+        coords = np.array([(v.x, v.y, v.z) for v in game.map.positions()], dtype=np.float64)
+        path = os.path.join(directory, map_key(game, coords))
+        try:
+            cache = MapCache.load(path)
+            if cache is not None:
+                log.info("Map cache loaded from %s", path)
+                return cache
+        except Exception as e:
+            log.warning("Map cache at %s unreadable, rebuilding: %s", path, e)
+
+        neighbors = csr(game.map.neighbors())
+        empty = (np.zeros((0, 2), dtype=np.float64), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+        cache = MapCache(path, coords, neighbors, empty,
+                         (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)),
+                         {"version": VERSION, "deposit_order": {}})
+        cache.save()
+        log.info("Map cache built at %s", path)
+        return cache
+
+    @staticmethod
+    def load(path):
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("version") != VERSION:
+            return None
+        arrays = {}
+        # only the lookup tables read here stay mapped, save() lets go of them
+        # before the swap; what the bot holds on to is read into memory, a
+        # mapped file cannot be renamed on Windows
+        for name in ("area_keys", "area_indptr", "area_data", "distance_keys", "distance_values"):
+            arrays[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in ("coords", "neighbors_indptr", "neighbors_data"):
+            arrays[name] = np.load(os.path.join(path, f"{name}.npy"))
+        extra = {name: np.load(os.path.join(path, f"{name}.npy")) for name in meta.get("arrays", [])}
+        return MapCache(
+            path, arrays["coords"],
+            (arrays["neighbors_indptr"], arrays["neighbors_data"]),
+            (arrays["area_keys"], arrays["area_indptr"], arrays["area_data"]),
+            (arrays["distance_keys"], arrays["distance_values"]),
+            meta, extra,
+        )
+
+    def neighbors_of(self, position):
+        return self.neighbors_data[self.neighbors_indptr[position]:self.neighbors_indptr[position + 1]].tolist()
+
+    def area(self, position, radius):
+        i = self._area_slots.get((int(position), radius))
+        if i is None:
+            return None
+        return self.area_data[self.area_indptr[i]:self.area_indptr[i + 1]].tolist()
+
+    def distance(self, key):
+        keys = self.distance_keys
+        i = int(np.searchsorted(keys, key))
+        if i < len(keys) and keys[i] == key:
+            return float(self.distance_values[i])
+        return None
+
+    def deposit_order(self, site):
+        return self.meta["deposit_order"].get(str(int(site)))
+
+    def set_deposit_order(self, site, order):
+        self.meta["deposit_order"][str(int(site))] = order
+
+    def get(self, name):
+        return self.arrays.get(name)
+
+    def put(self, name, array):
+        # written with the next save()
+        self.arrays[name] = np.asarray(array)
+
+    def save(self, areas=None, distances=None):
+        # areas: {(center, radius): [positions]}, distances: {key: value}, both merged with what is stored
+        area_keys, area_indptr, area_data = self.area_keys, self.area_indptr, self.area_data
+        new_areas = {k: v for k, v in (areas or {}).items() if k not in self._area_slots}
+        if new_areas:
+            keys = list(self._area_slots) + list(new_areas)
+            lists = [self.area(c, r) for c, r in self._area_slots] + list(new_areas.values())
+            area_keys = np.array(keys, dtype=np.float64).reshape(-1, 2)
+            area_indptr, area_data = csr(lists)
+
+        distance_keys, distance_values = self.distance_keys, self.distance_values
+        if distances:
+            k = np.fromiter(distances.keys(), dtype=np.int64, count=len(distances))
+            v = np.fromiter(distances.values(), dtype=np.float64, count=len(distances))
+            k = np.concatenate([distance_keys, k])
+            v = np.concatenate([distance_values, v])
+            distance_keys, first = np.unique(k, return_index=True)
+            distance_values = v[first]
+
+        # in memory copies, the mapped tables are let go of before the swap
+        area_keys, area_indptr, area_data = np.array(area_keys), np.array(area_indptr), np.array(area_data)
+        distance_keys, distance_values = np.array(distance_keys), np.array(distance_values)
+        meta = dict(self.meta, arrays=sorted(self.arrays))
+
+        # write next to the old entry and swap, a crash never leaves a half written
+        # cache; self only takes the new tables once they are written
+        tmp = self.path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, array in (("coords", self.coords), ("neighbors_indptr", self.neighbors_indptr),
+                            ("neighbors_data", self.neighbors_data), ("area_keys", area_keys),
+                            ("area_indptr", area_indptr), ("area_data", area_data),
+                            ("distance_keys", distance_keys), ("distance_values", distance_values)):
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(array))
+        for name, array in self.arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), array)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        self.area_keys, self.area_indptr, self.area_data = area_keys, area_indptr, area_data
+        self.distance_keys, self.distance_values = distance_keys, distance_values
+        self.meta = meta
+        self._area_slots = {(int(c), float(r)): i for i, (c, r) in enumerate(area_keys)}
+
+        old = self.path + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.rename(self.path, old)
+        try:
+            os.rename(tmp, self.path)
+        except OSError:
+            if os.path.exists(old):
+                os.rename(old, self.path)
+            raise
+        shutil.rmtree(old, ignore_errors=True)
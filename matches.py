@@ -0,0 +1,175 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import sim
+
+# Headless matches of the bot against the offline stand-in, many at a time.
+# Every match runs in its own worker process on its own planet and seed, and
+# the per-match outcome and update callback timings are gathered into one
+# report.
+#
+#   python matches.py --matches 32                     # seeds 0..31, all cores
+#   python matches.py --seeds 3 7 --positions 6000 12000 --steps 6000
+#   python matches.py --matches 64 --json results.json
+
+# worker defaults: no shared map cache between concurrent matches, and
+# placement searches inline so a seed always plays the same match
+WORKER_ENV = {"BOT_MAP_CACHE": "0", "BOT_PLANNER_THREAD": "0", "BOT_LOG_LEVEL": "warning"}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def play(match):
+    # match: {"seed", "positions", "enemies", "steps"} and optionally "config" overrides; runs in a worker process
+    for k, v in WORKER_ENV.items():
+        os.environ.setdefault(k, v)
+    sim.install()
+    from main import Bot
+    from config import Config
+
+    random.seed(match["seed"])
+    game = sim.make_game(seed=match["seed"], positions=match["positions"], enemies=match["enemies"])
+    out = io.StringIO()
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        bot = Bot(game=game, config=Config(**match.get("config", {})))
+        times = []
+
+        def timed(callback):
+            def run(stepping):
+                start = time.perf_counter()
+                callback(stepping)
+                times.append(time.perf_counter() - start)
+            return run
+
+        game._update_handlers = [timed(c) for c in game._update_handlers]
+        game.step(match["steps"])
+        bot.planner.close()
+    elapsed = time.perf_counter() - t
+
+    entities = game.world.entities().values()
+    units = Counter(e.name for e in bot.index().own_units)
+    return dict(match, **{
+        "result": game.result or "running",
+        "tick": game.tick(),
+        "wall s": elapsed,
+        "own": sum(1 for e in entities if e.own()),
+        "enemy": sum(1 for e in entities if e.has("Owner") and not e.own() and e.policy() == sim.Policy.Enemy),
+        "juggernauts": units.get("juggernaut", 0),
+        "buildings": {name: len(b) for name, b in bot.buildings.items()},
+        "commands": dict(Counter(c[1] for c in game.commands.issued)),
+        "errors": out.getvalue().count("ERROR: "),
+        "step ms": {
+            "mean": sum(times) / max(1, len(times)) * 1000,
+            "p50": percentile(times, 50) * 1000,
+            "p99": percentile(times, 99) * 1000,
+            "max": max(times, default=0.0) * 1000,
+        },
+    })
+
+
+def run(matches, workers=None, progress=None):
+    # results in the order of matches; a match that raised reports its error instead
+    results = [None] * len(matches)
+    # a fresh process per match, nothing a match leaves behind leaks into the next
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), max_tasks_per_child=1) as pool:
+        futures = {pool.submit(play, m): i for i, m in enumerate(matches)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = dict(matches[i], result="crashed", error=f"{type(e).__name__}: {e}")
+            if progress is not None:
+                progress(results[i])
+    return results
+
+
+def summary(results):
+    played = [r for r in results if r["result"] != "crashed"]
+    outcomes = Counter(r["result"] for r in results)
+    step_means = [r["step ms"]["mean"] for r in played]
+    step_p99 = [r["step ms"]["p99"] for r in played]
+    return {
+        "matches": len(results),
+        "outcomes": dict(outcomes),
+        "errors": sum(r.get("errors", 0) for r in played),
+        "juggernauts": sum(r["juggernauts"] for r in played) / max(1, len(played)),
+        "own": sum(r["own"] for r in played) / max(1, len(played)),
+        "step ms mean": sum(step_means) / max(1, len(step_means)),
+        "step ms p99": percentile(step_p99, 50),
+        "step ms max": max((r["step ms"]["max"] for r in played), default=0.0),
+    }
+
+
+def report(results):
+    print(f"{'seed':>6}{'tiles':>8}{'result':>9}{'tick':>7}{'own':>6}{'enemy':>7}{'jugg':>6}{'errors':>8}"
+          f"{'step ms':>9}{'p99':>9}{'wall s':>8}")
+    for r in results:
+        if r["result"] == "crashed":
+            print(f"{r['seed']:>6}{r['positions']:>8}{'crashed':>9}  {r['error']}")
+            continue
+        s = r["step ms"]
+        print(f"{r['seed']:>6}{r['positions']:>8}{r['result']:>9}{r['tick']:>7}{r['own']:>6}{r['enemy']:>7}"
+              f"{r['juggernauts']:>6}{r['errors']:>8}{s['mean']:>9.3f}{s['p99']:>9.3f}{r['wall s']:>8.1f}")
+    s = summary(results)
+    print()
+    print(f"{s['matches']} matches: " + ", ".join(f"{n} {k}" for k, n in sorted(s["outcomes"].items())))
+    print(f"errors {s['errors']}, juggernauts {s['juggernauts']:.1f} and own entities {s['own']:.1f} per match")
+    print(f"update callback: {s['step ms mean']:.3f} ms mean, {s['step ms p99']:.3f} ms p99 (median match), "
+          f"{s['step ms max']:.1f} ms worst step")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless matches against the offline stand-in")
+    parser.add_argument("--matches", type=int, default=os.cpu_count(), help="number of seeds, from --seed on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seeds", type=int, nargs="+", help="exact seeds instead of --matches")
+    parser.add_argument("--positions", type=int, nargs="+", default=[6000],
+                        help="planet sizes, the matches cycle through them")
+    parser.add_argument("--enemies", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=None, help="processes, all cores by default")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    seeds = args.seeds or list(range(args.seed, args.seed + args.matches))
+    matches = [
+        {"seed": s, "positions": args.positions[i % len(args.positions)], "enemies": args.enemies, "steps": args.steps}
+        for i, s in enumerate(seeds)
+    ]
+    t = time.perf_counter()
+    done = []
+
+    def progress(r):
+        done.append(r)
+        print(f"{len(done)}/{len(matches)} seed {r['seed']}: {r['result']}", file=sys.stderr, flush=True)
+
+    results = run(matches, args.workers, progress)
+    report(results)
+    print(f"wall time {time.perf_counter() - t:.1f} s on {args.workers or os.cpu_count()} workers")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary(results), "matches": results}, f, indent=2)
+    return 1 if any(r["result"] == "crashed" for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+from collections import defaultdict, Counter
+
+
+class Neighborhoods:
+    # the map is static, so (position, radius) -> area_neighborhood is computed once.
+    # Returned lists are shared, callers must not modify them. With a store
+    # attached (see map_cache.py) areas saved by earlier matches are reused.
+    def __init__(self, game):
+        self.game = game
+        self.store = None
+        self._areas = {}
+        self._rings = {}
+
+    def __call__(self, position, radius):
+        key = (int(position), radius)
+        area = self._areas.get(key)
+        if area is None:
+            if self.store is not None:
+                area = self.store.area(position, radius)
+            if area is None:
+                area = self.game.map.area_neighborhood(position, radius)
+            self._areas[key] = area
+        return area
+
+    def areas(self):
+        return dict(self._areas)
+
+    def ring(self, position, inner, outer):
+        # positions within outer but not within inner
+        if inner < 0:
+            return self(position, outer)
+        key = (int(position), inner, outer)
+        ring = self._rings.get(key)
+        if ring is None:
+            inside = set(self(position, inner))
+            ring = [p for p in self(position, outer) if p not in inside]
+            self._rings[key] = ring
+        return ring
+
+
+class NameIndex:
+    # position -> {prototype name: count} for static units (buildings, deposits),
+    # maintained from entity id deltas between steps.
+    # "Is there a smelter within r" becomes a set lookup over the neighborhood, and
+    # queries at increasing radii only scan the ring not covered by the previous miss.
+    def __init__(self, neighborhoods, proto_table):
+        self.neighborhoods = neighborhoods
+        self.proto_table = proto_table
+        self.step = None
+        self._names = defaultdict(Counter)
+        self._entities = {}
+        self._seen = set()
+        self._hits = {}
+        self._misses = {}
+
+    def sync(self, entities, step):
+        if step == self.step:
+            return
+        self.step = step
+        ids = entities.keys()
+        removed = self._seen - ids
+        added = ids - self._seen
+        for _id in removed:
+            self.remove(_id)
+        for _id in added:
+            self.add(entities[_id])
+        self._seen -= removed
+        self._seen |= added
+
+    def add(self, e):
+        if not (e.has("Proto") and e.has("Position")):
+            return
+        info = self.proto_table.get(e.Proto.proto)
+        if info is None or not info.is_unit or info.building_radius <= 0:
+            return
+        if e.Id in self._entities:
+            self.remove(e.Id)
+        pos = int(e.Position.position)
+        self._entities[e.Id] = (pos, info.name)
+        self._names[pos][info.name] += 1
+        self._misses.clear()
+
+    def remove(self, _id):
+        item = self._entities.pop(_id, None)
+        if item is None:
+            return
+        pos, name = item
+        names = self._names[pos]
+        names[name] -= 1
+        if names[name] <= 0:
+            del names[name]
+        if not names:
+            del self._names[pos]
+        self._hits.clear()
+
+    def has(self, position, name, radius):
+        # is a static unit called name centered within radius of position
+        key = (int(position), name)
+        hit = self._hits.get(key)
+        if hit is not None and radius >= hit:
+            return True
+        miss = self._misses.get(key, -1)
+        if radius <= miss:
+            return False
+
+        names = self._names
+        for p in self.neighborhoods.ring(position, miss, radius):
+            found = names.get(p)
+            if found and name in found:
+                self._hits[key] = radius
+                return True
+
+        self._misses[key] = radius
+        return False
@@ -0,0 +1,67 @@
+import numpy as np
+
+
+class Placement:
+    # vectorized placement searches over the planet coordinates. The coordinate
+    # array is built once per map; candidates and targets are position ids and
+    # distances are straight line distances between tile centers, computed for
+    # all candidates at once. With rng given, each candidate takes part with the
+    # given probability, which is what the old per-position random.random()
+    # gates amounted to; without it the choice is deterministic.
+    def __init__(self, game):
+        self.game = game
+        self._map = None
+        self._coords = None
+
+    def use(self, coords):
+        # coordinates of the current map from elsewhere, e.g. the map cache
+        self._coords = coords
+        self._map = self.game.map.name()
+
+    def coords(self):
+        # call from the update callback, the searches only read the array
+        name = self.game.map.name()
+        if self._coords is None or name != self._map:
+            self._coords = np.array([(v.x, v.y, v.z) for v in self.game.map.positions()], dtype=np.float64)
+            self._coords.setflags(write=False)
+            self._map = name
+        return self._coords
+
+    def distances(self, positions, targets):
+        # (len(positions), len(targets)) matrix of straight line distances
+        coords = self._coords if self._coords is not None else self.coords()
+        a = coords[np.asarray(positions, dtype=np.int64)]
+        b = coords[np.asarray(targets, dtype=np.int64)]
+        d2 = (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2.0 * (a @ b.T)
+        return np.sqrt(np.maximum(d2, 0.0))
+
+    @staticmethod
+    def _sample(n, p, rng):
+        if rng is None or p >= 1:
+            return np.ones(n, dtype=bool)
+        return rng.random(n) < p
+
+    def spread_position(self, positions, taloses, threshold=0.0, rng=None):
+        # candidate farthest from its closest talos, candidates take part with probability 1 - threshold
+        if not len(positions):
+            return None
+        if len(taloses):
+            nearest = self.distances(positions, taloses).min(axis=1)
+        else:
+            nearest = np.full(len(positions), np.inf)
+        accepted = self._sample(len(positions), 1 - threshold, rng)
+        if not accepted.any():
+            return int(positions[rng.integers(len(positions))]) if rng is not None else int(positions[0])
+        nearest = np.where(accepted, nearest, -1)
+        return int(positions[int(np.argmax(nearest))])
+
+    def front_position(self, positions, target, min_distance=120, sample=0.2, rng=None):
+        # candidate closest to target but farther than min_distance, candidates take part with probability sample
+        if not len(positions):
+            return None
+        d = self.distances(positions, [target])[:, 0]
+        ok = (d > min_distance) & self._sample(len(positions), sample, rng)
+        if not ok.any():
+            return None
+        d = np.where(ok, d, np.inf)
+        return int(positions[int(np.argmin(d))])
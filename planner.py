@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import traceback
+from time import perf_counter
+from botlog import log
+
+# BOT_PLANNER_THREAD=0 runs searches inline on the next poll, which keeps
+# simulator runs reproducible
+THREADED = os.environ.get("BOT_PLANNER_THREAD", "1") not in ("", "0")
+
+# results older than this many steps are thrown away
+MAX_AGE = 30
+
+
+class Job:
+    __slots__ = ("key", "seq", "fn", "args", "step", "apply", "valid", "max_age", "result", "error")
+
+    def __init__(self, key, seq, fn, args, step, apply, valid, max_age):
+        self.key = key
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.step = step
+        self.apply = apply
+        self.valid = valid
+        self.max_age = max_age
+        self.result = None
+        self.error = None
+
+
+class Planner:
+    # runs placement searches off the update callback. submit() hands a pure
+    # function and a snapshot of its inputs (plain positions, no entities) to a
+    # worker thread; poll(), called once per step, applies finished results on
+    # the main thread. A result is dropped when a newer job with the same key was
+    # submitted, when it is older than MAX_AGE steps or when its valid() check
+    # says the world moved on. Results that stay good for the whole match (per
+    # map tables) pass their own max_age.
+    def __init__(self, threaded=THREADED, max_age=MAX_AGE):
+        self.threaded = threaded
+        self.max_age = max_age
+        self.applied = 0
+        self.stale = 0
+        self.failed = 0
+        # seconds spent in jobs, on the worker or inline
+        self.job_time = 0.0
+        self._seq = 0
+        self._latest = {}
+        self._todo = queue.Queue()
+        self._done = queue.Queue()
+        self._thread = None
+
+    def submit(self, key, fn, *args, step=0, apply=None, valid=None, max_age=None):
+        self._seq += 1
+        job = Job(key, self._seq, fn, args, step, apply, valid, self.max_age if max_age is None else max_age)
+        self._latest[key] = job.seq
+        if self.threaded and self._thread is None:
+            self._thread = threading.Thread(target=self._work, name="bot planner", daemon=True)
+            self._thread.start()
+        self._todo.put(job)
+        return job
+
+    def busy(self, key):
+        return key in self._latest
+
+    def _work(self):
+        while True:
+            job = self._todo.get()
+            if job is None:
+                return
+            self._run(job)
+            self._done.put(job)
+
+    def _run(self, job):
+        t = perf_counter()
+        try:
+            job.result = job.fn(*job.args)
+        except Exception as e:
+            job.error = f"{e}\n{traceback.format_exc()}"
+        self.job_time += perf_counter() - t
+
+    def poll(self, step):
+        if not self._latest:
+            # every job submitted so far is applied or dropped
+            return
+        if not self.threaded:
+            while not self._todo.empty():
+                job = self._todo.get()
+                self._run(job)
+                self._done.put(job)
+
+        while not self._done.empty():
+            job = self._done.get()
+            if self._latest.get(job.key) != job.seq:
+                self.stale += 1
+                continue
+            del self._latest[job.key]
+            if job.error is not None:
+                self.failed += 1
+                log.error("planner %s: %s", job.key, job.error)
+                continue
+            if step - job.step > job.max_age or (job.valid is not None and not job.valid()):
+                self.stale += 1
+                continue
+            self.applied += 1
+            if job.apply is not None:
+                job.apply(job.result)
+
+    def close(self):
+        if self._thread is not None:
+            self._todo.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return (f"{self.applied} applied, {self.stale} stale, {self.failed} failed, {len(self._latest)} running, "
+                f"{self.job_time:.2f} s in jobs")
+
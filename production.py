@@ -0,0 +1,153 @@
+import math
+import numpy as np
+
+# recipe durations are in game ticks, 20 per second
+TICKS_PER_MINUTE = 20 * 60
+
+
+class Flow:
+    # steady state of one building mix, all rates per minute
+    __slots__ = ("rates", "produced", "consumed", "utilization", "bottlenecks")
+
+    def __init__(self, rates, produced, consumed, utilization, bottlenecks):
+        # item name -> net rate (produced - consumed)
+        self.rates = rates
+        self.produced = produced
+        self.consumed = consumed
+        # recipe name -> share of its full speed the inputs allow
+        self.utilization = utilization
+        # (item name, supply / full speed demand) for the items that slow the mix down, worst first
+        self.bottlenecks = bottlenecks
+
+
+class Production:
+    # production flow over the recipe graph of the prototypes. The recipes are
+    # compiled once into two (items, recipes) matrices of per-minute output and
+    # input of one building running the recipe. A building mix is a count of
+    # buildings per recipe:
+    #   steady_state(mix)   rates with every recipe slowed to what its inputs
+    #                       allow, and the items that hold it back
+    #   requirements(...)   buildings per recipe for a target rate of an item,
+    #                       e.g. juggernauts per minute, from one linear solve
+    # Every item is made by a single recipe, which makes the requirement
+    # system square. Results are memoized per mix and per target.
+    def __init__(self, recipes, makers):
+        # recipes: {name: (inputs, outputs, duration)} with {item name: amount}; makers: {recipe: building}
+        self.recipe_names = sorted(recipes)
+        items = sorted({i for r in recipes.values() for i in list(r[0]) + list(r[1])})
+        self.item_names = items
+        self.makers = makers
+        self._item = {name: i for i, name in enumerate(items)}
+        self._recipe = {name: j for j, name in enumerate(self.recipe_names)}
+        self.outputs = np.zeros((len(items), len(self.recipe_names)))
+        self.inputs = np.zeros((len(items), len(self.recipe_names)))
+        for name, (inputs, outputs, duration) in recipes.items():
+            j = self._recipe[name]
+            per_minute = TICKS_PER_MINUTE / max(duration, 1)
+            for item, n in inputs.items():
+                self.inputs[self._item[item], j] += n * per_minute
+            for item, n in outputs.items():
+                self.outputs[self._item[item], j] += n * per_minute
+        # the recipe making each item, items nothing makes are bought in
+        self.producer = {}
+        for i, item in enumerate(items):
+            made_by = np.flatnonzero(self.outputs[i] > 0)
+            if len(made_by):
+                self.producer[item] = int(made_by[0])
+        self._flows = {}
+        self._requirements = {}
+
+    @staticmethod
+    def from_prototypes(prototypes):
+        # prototypes as collected by Bot.init_prototypes: {id: {"name", "type", "json"}}
+        names = {p: info["name"] for p, info in prototypes.items()}
+        recipes = {}
+        makers = {}
+        for p, info in prototypes.items():
+            props = info["json"] if isinstance(info["json"], dict) else {}
+            if info["type"] == "Prototype.Recipe":
+                inputs = {names.get(int(k), str(k)): n for k, n in (props.get("inputs") or {}).items()}
+                outputs = {names.get(int(k), str(k)): n for k, n in (props.get("outputs") or {}).items()}
+                recipes[info["name"]] = (inputs, outputs, props.get("duration", 0))
+            elif info["type"] == "Prototype.Unit":
+                for r in props.get("recipes") or ():
+                    if r in names:
+                        makers[names[r]] = info["name"]
+        return Production(recipes, makers)
+
+    def steady_state(self, mix):
+        # mix: {recipe name: buildings}
+        key = tuple(sorted((r, n) for r, n in mix.items() if n and r in self._recipe))
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = self._flows[key] = self._steady_state(key)
+        return flow
+
+    def _steady_state(self, key):
+        x = np.zeros(len(self.recipe_names))
+        for r, n in key:
+            x[self._recipe[r]] = n
+        # throttle every consumer of an item made slower than it is used by the
+        # same share, until no input is short; the graph is a DAG, so this
+        # settles within its depth
+        u = np.ones_like(x)
+        for _ in range(len(self.recipe_names) + 1):
+            supply = self.outputs @ (x * u)
+            demand = self.inputs @ (x * u)
+            short = np.ones(len(self.item_names))
+            need = demand > 1e-9
+            short[need] = np.minimum(1.0, supply[need] / demand[need])
+            # a recipe runs at the pace of its shortest input
+            pace = np.where(self.inputs > 0, short[:, None], 1.0).min(axis=0)
+            if np.all(pace > 1 - 1e-9):
+                break
+            u *= pace
+        produced = self.outputs @ (x * u)
+        consumed = self.inputs @ (x * u)
+        # an item holds the mix back when none of it is left over and something
+        # using it runs below full speed; its share is supply over full speed demand
+        wanted = self.inputs @ x
+        slowed = (self.inputs > 0) & (u < 1 - 1e-9)[None, :] & (x > 0)[None, :]
+        bottlenecks = []
+        for i, item in enumerate(self.item_names):
+            if slowed[i].any() and produced[i] - consumed[i] < 1e-9:
+                bottlenecks.append((item, float(produced[i] / wanted[i])))
+        bottlenecks.sort(key=lambda b: b[1])
+        names = self.item_names
+        return Flow(
+            {names[i]: float(produced[i] - consumed[i]) for i in range(len(names)) if produced[i] or consumed[i]},
+            {names[i]: float(produced[i]) for i in range(len(names)) if produced[i]},
+            {names[i]: float(consumed[i]) for i in range(len(names)) if consumed[i]},
+            {r: float(u[self._recipe[r]]) for r, _ in key},
+            bottlenecks,
+        )
+
+    def requirements(self, item, per_minute):
+        # {recipe name: buildings} to make per_minute of item, fractional
+        key = (item, float(per_minute))
+        result = self._requirements.get(key)
+        if result is None:
+            result = self._requirements[key] = self._requirements_for(item, per_minute)
+        return dict(result)
+
+    def _requirements_for(self, item, per_minute):
+        if item not in self.producer:
+            raise ValueError(f"nothing makes {item!r}")
+        # net output of the producing recipes over the items they make: M x = d
+        made = sorted(self.producer, key=self._item.get)
+        rows = [self._item[i] for i in made]
+        cols = [self.producer[i] for i in made]
+        net = (self.outputs - self.inputs)[np.ix_(rows, cols)]
+        d = np.zeros(len(made))
+        d[made.index(item)] = per_minute
+        x = np.linalg.solve(net, d)
+        return {self.recipe_names[c]: float(v) for c, v in zip(cols, x) if v > 1e-9}
+
+    def buildings_for(self, item, per_minute):
+        # whole buildings per building type, e.g. {"drill": 3, "pump": 1, ...}
+        # each recipe needs its own whole buildings, a drill on metal cannot help with crystals
+        count = {}
+        for recipe, n in self.requirements(item, per_minute).items():
+            building = self.makers.get(recipe, recipe)
+            count[building] = count.get(building, 0) + math.ceil(n - 1e-9)
+        return count
@@ -0,0 +1,135 @@
+import os
+import atexit
+from bisect import bisect_left
+from collections import defaultdict
+from time import perf_counter
+from botlog import log
+
+# opt-in: BOT_PROFILE=1 enables it, BOT_PROFILE_EVERY sets the dump period in steps
+# and BOT_PROFILE_OUT appends the summaries to a file instead of logging them
+ENABLED = os.environ.get("BOT_PROFILE", "") not in ("", "0")
+EVERY = int(os.environ.get("BOT_PROFILE_EVERY", "500"))
+OUT = os.environ.get("BOT_PROFILE_OUT", "")
+
+# latency histogram bucket upper bounds in milliseconds
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class Profiler:
+    # per-call latency histograms for the tasks run from update_callback and
+    # the bot methods they call, plus call counters for the engine API. When disabled nothing is wrapped, so
+    # the bot runs exactly the code it would without the profiler.
+    def __init__(self, enabled=ENABLED, every=EVERY, out=OUT):
+        self.enabled = enabled
+        self.every = every
+        self.out = out
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(int)
+        self._closed = False
+        if enabled:
+            atexit.register(self.close)
+
+    def wrap(self, name, fn):
+        if not self.enabled:
+            return fn
+        histogram = self.histograms[name]
+
+        def timed(*args, **kwargs):
+            t = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.add((perf_counter() - t) * 1000)
+
+        return timed
+
+    def wrap_methods(self, obj, names):
+        # time each of obj's methods on its own, also when a task calls several
+        if not self.enabled:
+            return
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+
+    def count_calls(self, obj, attr, name=None):
+        # replace obj.attr with a wrapper counting its calls
+        if not self.enabled:
+            return
+        fn = getattr(obj, attr)
+        counters = self.counters
+        name = name or attr
+
+        def counted(*args, **kwargs):
+            counters[name] += 1
+            return fn(*args, **kwargs)
+
+        setattr(obj, attr, counted)
+
+    def instrument_game(self, game):
+        self.count_calls(game.map, "distance_estimate", "map.distance_estimate")
+        self.count_calls(game.map, "area_neighborhood", "map.area_neighborhood")
+        self.count_calls(game.map, "entities", "map.entities")
+        self.count_calls(game.world, "entities", "world.entities (entity scans)")
+        self.count_calls(game.commands, "orders", "commands.orders")
+        self.count_calls(game.commands, "order", "commands.order")
+
+    def summary(self, step=None):
+        lines = [f"========= PROFILE{f' @ step {step}' if step is not None else ''} ========="]
+        lines.append(f"{'task':<24}{'calls':>8}{'total ms':>12}{'avg ms':>10}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>10}")
+        items = sorted(self.histograms.items(), key=lambda x: -x[1].total)
+        for name, h in items:
+            if not h.count:
+                continue
+            lines.append(
+                f"{name:<24}{h.count:>8}{h.total:>12.1f}{h.total / h.count:>10.3f}"
+                f"{h.percentile(50):>9.3g}{h.percentile(90):>9.3g}{h.percentile(99):>9.3g}{h.max:>10.3f}"
+            )
+        if self.counters:
+            lines.append("calls:")
+            for name, n in sorted(self.counters.items()):
+                lines.append(f"  {name}: {n}")
+        return "\n".join(lines)
+
+    def dump(self, step=None):
+        if not self.enabled:
+            return
+        text = self.summary(step)
+        if self.out:
+            with open(self.out, "a") as f:
+                f.write(text + "\n\n")
+        else:
+            log.info("%s", text)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.dump()
@@ -0,0 +1,20 @@
+class ProtoInfo:
+    # flat copy of the prototype attributes the hot paths read, so that
+    # filters do one dict lookup per entity instead of calling into the API
+    __slots__ = (
+        "id", "name", "type", "dps", "building_radius", "recipes",
+        "is_unit", "is_construction", "is_resource", "is_deposit", "is_armed",
+    )
+
+    def __init__(self, _id, name, type, props):
+        self.id = _id
+        self.name = name
+        self.type = type
+        self.dps = float(props.get("dps", 0) or 0)
+        self.building_radius = float(props.get("buildingRadius", 0) or 0)
+        self.recipes = tuple(props.get("recipes", ()) or ())
+        self.is_unit = type == "Prototype.Unit"
+        self.is_construction = type == "Prototype.Construction"
+        self.is_resource = type == "Prototype.Resource"
+        self.is_deposit = self.is_unit and name.endswith(" deposit")
+        self.is_armed = self.is_unit and self.dps > 0
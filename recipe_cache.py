@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+
+class RecipeCache:
+    # desired recipe per own producer. An entry is computed when the producer
+    # appears and again only when a building its choice depends on appears or
+    # disappears (depends maps producer name -> names it looks at), so a stable
+    # base costs one comparison per producer against the recipe it actually runs.
+    def __init__(self, proto_table, depends):
+        self.proto_table = proto_table
+        self.depends = depends
+        self.producers = {}
+        self.desired = {}
+        self.dirty = set()
+        self._names = {}
+        self._by_name = defaultdict(set)
+        self._dependents = defaultdict(set)
+        for producer, names in depends.items():
+            for name in names:
+                self._dependents[name].add(producer)
+
+    def add(self, e):
+        info = self.proto_table.get(e.Proto.proto)
+        if info is None or info.building_radius <= 0:
+            return
+        _id = e.Id
+        self._names[_id] = info.name
+        if info.recipes:
+            self.producers[_id] = e
+            self._by_name[info.name].add(_id)
+            self.dirty.add(_id)
+        self._invalidate(info.name)
+
+    def remove(self, _id):
+        name = self._names.pop(_id, None)
+        if name is None:
+            return
+        self.producers.pop(_id, None)
+        self.desired.pop(_id, None)
+        self.dirty.discard(_id)
+        self._by_name[name].discard(_id)
+        self._invalidate(name)
+
+    def _invalidate(self, name):
+        for producer in self._dependents.get(name, ()):
+            self.dirty |= self._by_name[producer]
+
+    def name(self, _id):
+        return self._names.get(_id)
+
+    def take_dirty(self):
+        # dirty producers in world order
+        dirty = sorted(self.dirty)
+        self.dirty.clear()
+        return dirty
+
+    def changes(self):
+        # (id, recipe) for producers not running their desired recipe
+        for _id, recipe in self.desired.items():
+            if recipe is None:
+                continue
+            e = self.producers[_id]
+            if not e.has("Recipe") or e.Recipe.recipe != recipe:
+                yield _id, recipe
@@ -0,0 +1,125 @@
+import traceback
+from time import perf_counter
+from botlog import log
+
+# task priorities, higher runs first
+COMBAT = 3
+ECONOMY = 2
+BUILD = 1
+REPORTING = 0
+
+ONCE_MAX_DELAY = 10
+
+
+class Task:
+    __slots__ = (
+        "name", "fn", "period", "priority", "next_step", "once", "max_delay",
+        "estimate", "runs", "deferrals", "total_time", "max_time",
+    )
+
+    def __init__(self, name, fn, period, priority, first_step, budget, once=False):
+        self.name = name
+        self.fn = fn
+        self.period = period
+        self.priority = priority
+        self.next_step = first_step
+        self.once = once
+        # steps a task may be deferred before it runs regardless of the budget
+        self.max_delay = period if not once else ONCE_MAX_DELAY
+        # expected cost of one run in seconds, starts at the declared budget
+        # and follows the measured time afterwards
+        self.estimate = budget
+        self.runs = 0
+        self.deferrals = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class Scheduler:
+    # runs registered periodic tasks from the update callback within a per-step
+    # time budget. Due tasks run highest priority first; a task whose expected
+    # cost does not fit into what is left of the step is deferred and stays due,
+    # so it resumes on the next step. The first task to run in a step, tasks at
+    # or above `always_run` priority and tasks already late by a whole period
+    # (ONCE_MAX_DELAY steps for one-shot tasks) are never deferred.
+    def __init__(self, budget=0.020, always_run=COMBAT, profiler=None):
+        self.budget = budget
+        self.always_run = always_run
+        self.profiler = profiler
+        self.tasks = []
+        self.last_step_time = 0.0
+        self.overruns = 0
+        if profiler is not None:
+            self.run = profiler.wrap("step", self.run)
+
+    def every(self, name, fn, period, offset=0, priority=ECONOMY, budget=0.002):
+        # first run on the first step >= 1 with step % period == offset
+        first = offset if offset > 0 else period
+        if self.profiler is not None:
+            fn = self.profiler.wrap(name, fn)
+        task = Task(name, fn, period, priority, first, budget)
+        self.tasks.append(task)
+        return task
+
+    def at(self, name, fn, step, priority=ECONOMY, budget=0.002):
+        if self.profiler is not None:
+            fn = self.profiler.wrap(name, fn)
+        task = Task(name, fn, 0, priority, step, budget, once=True)
+        self.tasks.append(task)
+        return task
+
+    def cancel(self, task):
+        # a periodic task with nothing left to do, it is not looked at again
+        if task in self.tasks:
+            self.tasks.remove(task)
+
+    def run(self, step):
+        start = perf_counter()
+        due = [t for t in self.tasks if t.next_step <= step]
+        if not due:
+            self.last_step_time = 0.0
+            return
+
+        due.sort(key=lambda t: (-t.priority, t.next_step))
+        ran = False
+        for t in due:
+            elapsed = perf_counter() - start
+            late = step - t.next_step >= t.max_delay
+            # deferring only helps when another task already took part of this step
+            if ran and t.priority < self.always_run and not late and elapsed + t.estimate > self.budget:
+                t.deferrals += 1
+                continue
+
+            if t.once:
+                self.tasks.remove(t)
+            else:
+                # keep the original phase unless the task had to be deferred
+                t.next_step += t.period
+                if t.next_step <= step:
+                    t.next_step = step + t.period
+
+            ran = True
+            t0 = perf_counter()
+            try:
+                t.fn()
+            except Exception as e:
+                log.error("%s: %s\n%s", t.name, e, traceback.format_exc())
+            dt = perf_counter() - t0
+
+            t.runs += 1
+            t.total_time += dt
+            t.max_time = max(t.max_time, dt)
+            t.estimate = 0.8 * t.estimate + 0.2 * dt
+
+        self.last_step_time = perf_counter() - start
+        if self.last_step_time > self.budget:
+            self.overruns += 1
+
+    def stats(self):
+        lines = []
+        for t in sorted(self.tasks, key=lambda t: -t.priority):
+            avg = t.total_time / t.runs if t.runs else 0.0
+            lines.append(
+                f"  {t.name}: {t.runs} runs, {t.deferrals} deferred, avg {avg * 1000:.2f} ms, max {t.max_time * 1000:.2f} ms"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,1034 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import types
+import argparse
+import contextlib
+from collections import defaultdict, deque
+from enum import Enum, IntEnum, IntFlag
+
+# Offline stand-in for the uw API.
+# Builds a synthetic planet (or loads a recorded snapshot), serves the prototypes
+# from prototypes.json and runs a very small rules engine (construction, production,
+# movement, combat) so that Bot can be driven step by step without a server.
+# Every command the bot issues is recorded in game.commands.issued.
+#
+#   python sim.py --steps 3000 --seed 1
+#   python sim.py --steps 3000 --seed 1 --record match.jsonl --save world.json
+#   python sim.py --snapshot world.json --steps 500
+#   python sim.py --replay match.jsonl
+
+try:
+    import uw
+    Policy = uw.Policy
+    Prototype = uw.Prototype
+    OrderType = uw.OrderType
+    OrderPriority = uw.OrderPriority
+    Order = uw.Order
+except ImportError:
+    uw = None
+
+    class Policy(Enum):
+        NONE = 0
+        Self = 1
+        Ally = 2
+        Neutral = 3
+        Enemy = 4
+
+    class Prototype(Enum):
+        NONE = 0
+        Resource = 1
+        Recipe = 2
+        Construction = 3
+        Unit = 4
+
+    class OrderType(IntEnum):
+        NONE = 0
+        Stop = 1
+        Guard = 2
+        Run = 3
+        Fight = 4
+        Load = 5
+        Unload = 6
+        SelfDestruct = 7
+
+    class OrderPriority(IntFlag):
+        NONE = 0
+        Assistant = 1 << 0
+        User = 1 << 1
+        Enqueue = 1 << 2
+        Repeat = 1 << 3
+
+    class Order:
+        def __init__(self, entity, position, order_type, priority):
+            self.entity = entity
+            self.position = position
+            self.order_type = order_type
+            self.priority = priority
+
+
+PROTOTYPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prototypes.json")
+TYPES = {
+    "Prototype.Resource": Prototype.Resource,
+    "Prototype.Recipe": Prototype.Recipe,
+    "Prototype.Construction": Prototype.Construction,
+    "Prototype.Unit": Prototype.Unit,
+}
+INVALID = 4294967295
+
+
+def install():
+    # make `import uw` resolve to this module when the real library is missing
+    if "uw" in sys.modules:
+        return sys.modules["uw"]
+    module = types.ModuleType("uw")
+    module.Game = SimGame
+    module.Policy = Policy
+    module.Prototype = Prototype
+    module.OrderType = OrderType
+    module.OrderPriority = OrderPriority
+    module.Order = Order
+    module.Vector3 = Vector3
+    sys.modules["uw"] = module
+    return module
+
+
+class Vector3:
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+
+class SimPrototypes:
+    def __init__(self, path=PROTOTYPES_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = list(data.values())
+
+        self._all = []
+        self._types = {}
+        self._names = {}
+        self._json = {}
+        self._resources = {}
+        self._recipes = {}
+        self._constructions = {}
+        self._units = {}
+        for p in data:
+            _id = int(p["id"])
+            _type = TYPES[p["type"]]
+            js = p["json"]
+            self._all.append(_id)
+            self._types[_id] = _type
+            self._names[_id] = p["name"]
+            self._json[_id] = js
+            if _type == Prototype.Resource:
+                self._resources[_id] = js
+            elif _type == Prototype.Recipe:
+                self._recipes[_id] = js
+            elif _type == Prototype.Construction:
+                self._constructions[_id] = js
+            elif _type == Prototype.Unit:
+                self._units[_id] = js
+
+        self.by_name = defaultdict(dict)
+        for _id in self._all:
+            self.by_name[self._types[_id]][self._names[_id]] = _id
+
+    def all(self):
+        return self._all
+
+    def type(self, _id):
+        return self._types.get(_id, Prototype.NONE)
+
+    def name(self, _id):
+        return self._names.get(_id, "")
+
+    def json(self, _id):
+        return self._json.get(_id, "")
+
+    def resource(self, _id):
+        return self._resources.get(_id)
+
+    def recipes(self, _id):
+        return self._recipes.get(_id)
+
+    def construction(self, _id):
+        return self._constructions.get(_id)
+
+    def unit(self, _id):
+        return self._units.get(_id)
+
+    def hit_chances_table(self):
+        return {}
+
+    def terrain_types_table(self):
+        return {}
+
+    def id_of(self, _type, name):
+        return self.by_name[_type][name]
+
+
+class SimMap:
+    def __init__(self, name, positions, neighbors, sphere_radius=None):
+        self._name = name
+        self._positions = positions
+        self._neighbors = neighbors
+        self._sphere_radius = sphere_radius
+        self._overview = defaultdict(list)
+
+    @staticmethod
+    def sphere(name="planets/sim.uw", count=6000, radius=600.0):
+        # fibonacci sphere, neighbors are the six closest tiles
+        positions = []
+        golden = math.pi * (3.0 - math.sqrt(5.0))
+        for i in range(count):
+            y = 1 - 2 * (i + 0.5) / count
+            r = math.sqrt(1 - y * y)
+            t = golden * i
+            positions.append(Vector3(math.cos(t) * r * radius, y * radius, math.sin(t) * r * radius))
+
+        spacing = math.sqrt(4 * math.pi * radius * radius / count)
+        cell = spacing * 1.5
+        grid = defaultdict(list)
+        keys = []
+        for i, p in enumerate(positions):
+            k = (int(p.x // cell), int(p.y // cell), int(p.z // cell))
+            grid[k].append(i)
+            keys.append(k)
+
+        neighbors = []
+        for i, p in enumerate(positions):
+            kx, ky, kz = keys[i]
+            candidates = []
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for dz in (-1, 0, 1):
+                        for j in grid.get((kx + dx, ky + dy, kz + dz), ()):
+                            if j == i:
+                                continue
+                            q = positions[j]
+                            d = (p.x - q.x) ** 2 + (p.y - q.y) ** 2 + (p.z - q.z) ** 2
+                            candidates.append((d, j))
+            candidates.sort()
+            neighbors.append([j for _, j in candidates[:6]])
+
+        # make the graph symmetric so that BFS areas are well behaved
+        for i, ns in enumerate(neighbors):
+            for j in ns:
+                if i not in neighbors[j]:
+                    neighbors[j].append(i)
+
+        return SimMap(name, positions, neighbors, sphere_radius=radius)
+
+    @staticmethod
+    def from_json(data):
+        positions = [Vector3(*p) for p in data["positions"]]
+        return SimMap(data["name"], positions, data["neighbors"], sphere_radius=data.get("sphere_radius"))
+
+    def to_json(self):
+        return {
+            "name": self._name,
+            "positions": [[p.x, p.y, p.z] for p in self._positions],
+            "neighbors": [list(n) for n in self._neighbors],
+            "sphere_radius": self._sphere_radius,
+        }
+
+    def name(self):
+        return self._name
+
+    def guid(self):
+        return self._name
+
+    def path(self):
+        return self._name
+
+    def max_players(self):
+        return 4
+
+    def positions(self):
+        return self._positions
+
+    def ups(self):
+        return self._positions
+
+    def neighbors(self):
+        return self._neighbors
+
+    def neighbors_of_position(self, pos):
+        return self._neighbors[pos]
+
+    def terrains(self):
+        return [0] * len(self._positions)
+
+    def overview(self):
+        return []
+
+    def entities(self, position):
+        return list(self._overview.get(position, ()))
+
+    def distance_line(self, ai, bi):
+        a = self._positions[ai]
+        b = self._positions[bi]
+        return math.sqrt((a.x - b.x) ** 2 + (a.y - b.y) ** 2 + (a.z - b.z) ** 2)
+
+    def distance_estimate(self, a, b):
+        return self._estimate(a, b)
+
+    def _estimate(self, a, b):
+        # the rules engine uses this directly so that instrumenting
+        # distance_estimate only counts the bot's calls
+        if self._sphere_radius is None:
+            return self.distance_line(a, b)
+        pa = self._positions[a]
+        pb = self._positions[b]
+        r = self._sphere_radius
+        c = (pa.x * pb.x + pa.y * pb.y + pa.z * pb.z) / (r * r)
+        return r * math.acos(max(-1.0, min(1.0, c)))
+
+    def area_neighborhood(self, position, radius):
+        seen = {position}
+        result = [position]
+        queue = deque([position])
+        while queue:
+            p = queue.popleft()
+            for n in self._neighbors[p]:
+                if n in seen:
+                    continue
+                seen.add(n)
+                if self._estimate(position, n) <= radius:
+                    result.append(n)
+                    queue.append(n)
+        return result
+
+    def area_connected(self, position, radius):
+        return self.area_neighborhood(position, radius)
+
+    def area_extended(self, position, radius):
+        return self.area_neighborhood(position, radius)
+
+    def test_construction_placement(self, construction_prototype, position):
+        return not self._overview.get(position)
+
+    def find_construction_placement(self, construction_prototype, position):
+        seen = {position}
+        queue = deque([position])
+        while queue:
+            p = queue.popleft()
+            if not self._overview.get(p):
+                return p
+            for n in self._neighbors[p]:
+                if n not in seen:
+                    seen.add(n)
+                    queue.append(n)
+        return INVALID
+
+
+class SimEntity:
+    def __init__(self, world, _id):
+        self._world = world
+        self.Id = _id
+
+    def has(self, component):
+        return hasattr(self, component)
+
+    def own(self):
+        return self.has("Owner") and self.Owner.force == self._world.my_force()
+
+    def policy(self):
+        if not self.has("Owner"):
+            return Policy.NONE
+        return self._world.policy(self.Owner.force)
+
+
+def component(**kwargs):
+    return types.SimpleNamespace(**kwargs)
+
+
+class SimWorld:
+    def __init__(self):
+        self._my_force = 0
+        self._entities = {}
+        self._policies = {}
+
+    def my_force(self):
+        return self._my_force
+
+    def entities(self):
+        return self._entities
+
+    def entity(self, _id):
+        return self._entities[_id]
+
+    def policy(self, force):
+        return self._policies.get(force, Policy.NONE)
+
+
+class SimCommands:
+    invalid = INVALID
+
+    def __init__(self, game):
+        self._game = game
+        self._orders = {}
+        self.issued = []
+
+    def _record(self, name, *args):
+        self.issued.append((self._game.tick(), name) + args)
+
+    def orders(self, unit):
+        o = self._orders.get(unit)
+        return [o] if o is not None else []
+
+    def order(self, unit, order):
+        self._record("order", unit, int(order.order_type), order.entity, order.position)
+        if unit in self._game.world.entities():
+            self._orders[unit] = order
+
+    def stop(self):
+        return Order(INVALID, INVALID, OrderType.Stop, OrderPriority.User)
+
+    def guard(self):
+        return Order(INVALID, INVALID, OrderType.Guard, OrderPriority.User)
+
+    def run_to_position(self, position):
+        return Order(INVALID, position, OrderType.Run, OrderPriority.User)
+
+    def run_to_entity(self, entity):
+        return Order(entity, INVALID, OrderType.Run, OrderPriority.User)
+
+    def fight_to_position(self, position):
+        return Order(INVALID, position, OrderType.Fight, OrderPriority.User)
+
+    def fight_to_entity(self, entity):
+        return Order(entity, INVALID, OrderType.Fight, OrderPriority.User)
+
+    def command_self_destruct(self, unit):
+        self._record("self_destruct", unit)
+        self._game.remove_entity(unit)
+
+    def command_place_construction(self, proto, position, yaw=0):
+        self._record("place_construction", proto, position)
+        if proto is None or position is None or position == INVALID:
+            return
+        self._game.add_entity(proto, position, force=self._game.world.my_force())
+
+    def command_set_recipe(self, unit, recipe):
+        self._record("set_recipe", unit, recipe)
+        e = self._game.world.entities().get(unit)
+        if e is not None and recipe is not None:
+            e.Recipe = component(recipe=recipe)
+
+    def command_set_priority(self, unit, priority):
+        self._record("set_priority", unit, int(priority))
+        e = self._game.world.entities().get(unit)
+        if e is not None:
+            e.Priority = component(priority=int(priority))
+
+    def command_load(self, unit, resource_type):
+        self._record("load", unit, resource_type)
+
+    def command_unload(self, unit):
+        self._record("unload", unit)
+
+    def command_move(self, unit, position, yaw=0):
+        self._record("move", unit, position)
+
+    def command_aim(self, unit, target):
+        self._record("aim", unit, target)
+
+    def command_renounce_control(self, unit):
+        self._record("renounce_control", unit)
+
+
+# (component, snapshot key, component field)
+FRAME_COMPONENTS = (
+    ("Owner", "owner", "force"),
+    ("Amount", "amount", "amount"),
+    ("Recipe", "recipe", "recipe"),
+    ("Life", "life", "life"),
+    ("Priority", "priority", "priority"),
+)
+
+
+def map_json(m):
+    name = m.name()
+    if isinstance(name, bytes):
+        name = name.decode("utf-8")
+    return {
+        "name": name,
+        "positions": [[p.x, p.y, p.z] for p in m.positions()],
+        "neighbors": [list(n) for n in m.neighbors()],
+        "sphere_radius": getattr(m, "_sphere_radius", None),
+    }
+
+
+def snapshot(game, include_map=True):
+    # plain JSON view of the world, works on a real uw.Game as well as on SimGame
+    world = game.world
+    my_force = world.my_force()
+    forces = set()
+    entities = []
+    for e in world.entities().values():
+        if not (e.has("Proto") and e.has("Position")):
+            continue
+        item = {"id": e.Id, "proto": e.Proto.proto, "position": e.Position.position}
+        for attr, key, field in FRAME_COMPONENTS:
+            if e.has(attr):
+                item[key] = int(getattr(getattr(e, attr), field))
+        if "owner" in item and item["owner"] != my_force:
+            forces.add(item["owner"])
+        entities.append(item)
+
+    data = {
+        "tick": game.tick(),
+        "my_force": my_force,
+        "policies": {str(f): world.policy(f).value for f in sorted(forces)},
+        "entities": entities,
+    }
+    if include_map:
+        data["map"] = map_json(game.map)
+    return data
+
+
+class Recorder:
+    # writes a snapshot every `every` steps to a JSON lines file,
+    # the first line holds the map; replay() feeds it back to a bot
+    def __init__(self, game, path, every=1):
+        self.game = game
+        self.every = every
+        self.steps = 0
+        self.file = open(path, "w")
+        self._header = False
+        game.add_update_callback(self._update)
+
+    def _update(self, stepping):
+        if not stepping or self.file is None:
+            return
+        self.steps += 1
+        if self.steps % self.every:
+            return
+        if not self._header:
+            self.file.write(json.dumps({"map": map_json(self.game.map)}) + "\n")
+            self._header = True
+        self.file.write(json.dumps(snapshot(self.game, include_map=False)) + "\n")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def replay(path, make_bot):
+    # drives a fresh bot through recorded frames; the rules engine is off,
+    # so the world is exactly what was recorded and the bot's commands are
+    # collected in game.commands.issued
+    with open(path) as f:
+        header = json.loads(f.readline())
+        game = SimGame(sim_map=SimMap.from_json(header["map"]), rules=False)
+        bot = make_bot(game)
+        for line in f:
+            game.load_frame(json.loads(line))
+            # the frame was taken after its tick, run the callbacks for that tick
+            game._tick -= 1
+            game.step()
+    return bot, game
+
+
+def make_game(seed=0, positions=6000, radius=600.0, **populate):
+    game = SimGame(seed=seed, sim_map=SimMap.sphere(count=positions, radius=radius))
+    return game.populate(**populate)
+
+
+class SimGame:
+    # ticks a construction needs before it turns into its building
+    CONSTRUCTION_TICKS = 300
+    # fraction of prototype dps applied per tick
+    DAMAGE_SCALE = 0.05
+    # fraction of prototype speed applied per tick
+    SPEED_SCALE = 0.05
+
+    def __init__(self, seed=0, sim_map=None, prototypes=None, rules=True):
+        self.random = random.Random(seed)
+        self.prototypes = prototypes or SimPrototypes()
+        self.map = sim_map if sim_map is not None else SimMap.sphere()
+        self.world = SimWorld()
+        self.commands = SimCommands(self)
+        self.rules = rules
+        self.logs = []
+        self.result = None
+
+        self._tick = 0
+        self._next_id = 1
+        self._update_handlers = []
+        self._map_state_handlers = []
+        self._life = {}
+        self._progress = {}
+        self._move_budget = defaultdict(float)
+        self._pool = {}
+        self._spawns = {}
+
+    # connection / player settings are no-ops offline
+
+    def log(self, message, severity=None):
+        self.logs.append((self._tick, str(message)))
+
+    def engine_log_callback(self, message, severity=3):
+        # what the engine reports through its log callback, replaceable like uwSetLogCallback
+        self.logs.append((self._tick, message.decode("utf-8", "replace")))
+
+    def log_info(self, message):
+        self.log(message)
+
+    def log_warning(self, message):
+        self.log(message)
+
+    def log_error(self, message):
+        self.log(message)
+
+    def set_player_name(self, name):
+        pass
+
+    def set_player_color(self, r, g, b):
+        pass
+
+    def set_start_gui(self, start_gui, extra_params="--observer 1"):
+        pass
+
+    def connect_find_lan(self, timeout_us=1000000):
+        return True
+
+    def connect_direct(self, address, port):
+        pass
+
+    def connect_lobby_id(self, lobby_id):
+        pass
+
+    def connect_new_server(self, visibility=0, name="", extra_params=""):
+        pass
+
+    def try_reconnect(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+    def tick(self):
+        return self._tick
+
+    def add_update_callback(self, callback):
+        self._update_handlers.append(callback)
+
+    def add_map_state_callback(self, callback):
+        self._map_state_handlers.append(callback)
+
+    def add_connection_state_callback(self, callback):
+        pass
+
+    def add_game_state_callback(self, callback):
+        pass
+
+    def add_shooting_callback(self, callback):
+        pass
+
+    # world construction
+
+    def new_id(self):
+        _id = self._next_id
+        self._next_id += 1
+        return _id
+
+    def add_force(self, policy=None):
+        _id = self.new_id()
+        e = SimEntity(self.world, _id)
+        e.Force = component()
+        self.world._entities[_id] = e
+        if policy is None:
+            self.world._my_force = _id
+        else:
+            self.world._policies[_id] = policy
+        return _id
+
+    def add_entity(self, proto, position, force=None, amount=None, recipe=None, _id=None):
+        _id = self.new_id() if _id is None else _id
+        self._next_id = max(self._next_id, _id + 1)
+        e = SimEntity(self.world, _id)
+        e.Proto = component(proto=proto)
+        e.Position = component(position=position, yaw=0.0)
+        if force is not None:
+            e.Owner = component(force=force)
+
+        _type = self.prototypes.type(proto)
+        js = self.prototypes.json(proto)
+        if _type == Prototype.Unit:
+            e.Unit = component(state=0, killCount=0)
+            e.Life = component(life=js.get("maxLife", 1))
+            self._life[_id] = float(js.get("maxLife", 1))
+            if js.get("recipes"):
+                e.Recipe = component(recipe=recipe if recipe is not None else 0)
+        elif _type == Prototype.Construction:
+            e.Priority = component(priority=0)
+            self._progress[_id] = 0
+        elif _type == Prototype.Resource:
+            e.Amount = component(amount=amount or 0)
+
+        self.world._entities[_id] = e
+        self.map._overview[position].append(_id)
+        return e
+
+    def remove_entity(self, _id):
+        e = self.world._entities.pop(_id, None)
+        if e is None:
+            return
+        ids = self.map._overview.get(e.Position.position)
+        if ids and _id in ids:
+            ids.remove(_id)
+        self._life.pop(_id, None)
+        self._progress.pop(_id, None)
+        self.commands._orders.pop(_id, None)
+
+    def move_entity(self, e, position):
+        ids = self.map._overview.get(e.Position.position)
+        if ids and e.Id in ids:
+            ids.remove(e.Id)
+        e.Position = component(position=position, yaw=0.0)
+        self.map._overview[position].append(e.Id)
+
+    def proto_id(self, _type, name):
+        return self.prototypes.id_of(_type, name)
+
+    def free_position_near(self, position, min_dist, max_dist):
+        count = len(self.map.positions())
+        for _ in range(1000):
+            p = self.random.randrange(count)
+            if self.map._overview.get(p):
+                continue
+            if min_dist <= self.map._estimate(position, p) <= max_dist:
+                return p
+        return self.map.find_construction_placement(0, position)
+
+    def populate(self, enemies=1, deposits=(("metal", 4), ("crystals", 2), ("oil", 2), ("aether", 2)),
+                 decorations=200, own_units=(("ATV", 2),), enemy_units=(("golem", 4),)):
+        count = len(self.map.positions())
+        me = self.add_force()
+        spawns = [self.random.randrange(count)]
+        forces = [me]
+        for _ in range(enemies):
+            forces.append(self.add_force(Policy.Enemy))
+            # pick the spawn farthest from the ones already taken out of a few candidates
+            candidates = [self.random.randrange(count) for _ in range(32)]
+            spawns.append(max(candidates, key=lambda c: min(self.map._estimate(c, s) for s in spawns)))
+
+        nucleus = self.proto_id(Prototype.Unit, "nucleus")
+        for force, spawn in zip(forces, spawns):
+            self._spawns[force] = spawn
+            self.add_entity(nucleus, spawn, force=force)
+            for name, n in deposits:
+                proto = self.proto_id(Prototype.Unit, f"{name} deposit")
+                for _ in range(n):
+                    self.add_entity(proto, self.free_position_near(spawn, 80, 400))
+
+        for name, n in own_units:
+            proto = self.proto_id(Prototype.Unit, name)
+            for _ in range(n):
+                self.add_entity(proto, self.free_position_near(spawns[0], 30, 120), force=me)
+
+        for force, spawn in zip(forces[1:], spawns[1:]):
+            for name, n in enemy_units:
+                proto = self.proto_id(Prototype.Unit, name)
+                for _ in range(n):
+                    self.add_entity(proto, self.free_position_near(spawn, 30, 200), force=force)
+
+        trees = [p for p in self.prototypes.all() if self.prototypes.name(p).startswith(("tree ", "plant "))]
+        for _ in range(decorations):
+            self.add_entity(self.random.choice(trees), self.random.randrange(count))
+        return self
+
+    @staticmethod
+    def from_snapshot(data, seed=0, rules=True):
+        game = SimGame(seed=seed, sim_map=SimMap.from_json(data["map"]), rules=rules)
+        game.load_frame(data)
+        return game
+
+    def load_frame(self, frame):
+        # replace the world with a recorded frame; entity objects are kept for
+        # ids that survive, like the real world does between updates
+        world = self.world
+        old = world._entities
+        entities = {}
+        self.map._overview = defaultdict(list)
+
+        my_force = frame.get("my_force", world._my_force)
+        policies = {int(f): Policy(v) for f, v in frame.get("policies", {}).items()}
+        world._my_force = my_force
+        world._policies = policies
+        for force in [my_force] + list(policies):
+            e = old.get(force) or SimEntity(world, force)
+            e.Force = component()
+            entities[force] = e
+
+        for item in frame["entities"]:
+            _id = item["id"]
+            proto = item["proto"]
+            e = old.get(_id) or SimEntity(world, _id)
+            e.Proto = component(proto=proto)
+            e.Position = component(position=item["position"], yaw=0.0)
+            for attr, key, field in FRAME_COMPONENTS:
+                if key in item:
+                    setattr(e, attr, component(**{field: item[key]}))
+                elif hasattr(e, attr):
+                    delattr(e, attr)
+            _type = self.prototypes.type(proto)
+            if _type == Prototype.Unit:
+                if not e.has("Unit"):
+                    e.Unit = component(state=0, killCount=0)
+                self._life[_id] = float(item.get("life", 1))
+            elif e.has("Unit"):
+                delattr(e, "Unit")
+            if _type == Prototype.Construction:
+                self._progress.setdefault(_id, 0)
+            entities[_id] = e
+            self.map._overview[item["position"]].append(_id)
+            if "owner" in item and self.prototypes.name(proto) == "nucleus":
+                self._spawns.setdefault(item["owner"], item["position"])
+
+        world._entities = entities
+        if entities:
+            self._next_id = max(self._next_id, max(entities) + 1)
+        if "tick" in frame:
+            self._tick = frame["tick"]
+
+    # stepping
+
+    def step(self, steps=1):
+        for _ in range(steps):
+            if self.result is not None:
+                return self.result
+            self._tick += 1
+            if self.rules:
+                self._update_rules()
+                self._engine_chatter()
+            for callback in self._update_handlers:
+                callback(True)
+        return self.result
+
+    def run(self, steps):
+        return self.step(steps)
+
+    def _engine_chatter(self):
+        # the kind of log flood a real server produces while a match runs
+        tick = self._tick
+        self.engine_log_callback(b"schedule: update %d" % tick, 0)
+        if tick % 3 == 0:
+            self.engine_log_callback(b"need to wait for %d ms" % (tick % 17), 0)
+        if tick % 5 == 0:
+            self.engine_log_callback(b"skipping %d entities" % (tick % 11), 1)
+        if tick % 500 == 0:
+            self.engine_log_callback(b"game tick %d" % tick, 3)
+
+    def _update_rules(self):
+        entities = self.world._entities
+        for e in list(entities.values()):
+            if e.Id not in entities or not e.has("Proto"):
+                continue
+            _type = self.prototypes.type(e.Proto.proto)
+            if _type == Prototype.Construction:
+                self._update_construction(e)
+            elif _type == Prototype.Unit and e.has("Owner"):
+                if e.has("Recipe"):
+                    self._update_production(e)
+                self._update_unit(e)
+
+        nucleus = self.proto_id(Prototype.Unit, "nucleus")
+        alive = set()
+        for e in entities.values():
+            if e.has("Proto") and e.Proto.proto == nucleus:
+                alive.add(e.Owner.force)
+        me = self.world.my_force()
+        if me not in alive:
+            self.result = "loss"
+        elif len(alive) == 1:
+            self.result = "win"
+
+        enemy_spawn_every = 150
+        if self._tick % enemy_spawn_every == 0:
+            golem = self.proto_id(Prototype.Unit, "golem")
+            for force in alive:
+                if force == me:
+                    continue
+                e = self.add_entity(golem, self.free_position_near(self._spawns[force], 30, 120), force=force)
+                target = self._nearest(e, lambda o: o.own() and o.has("Unit"), 1000000)
+                if target is not None:
+                    self.commands._orders[e.Id] = self.commands.fight_to_entity(target.Id)
+
+    def _update_construction(self, e):
+        if e.Priority.priority <= 0 and e.own():
+            return
+        self._progress[e.Id] += 1
+        if self._progress[e.Id] < self.CONSTRUCTION_TICKS:
+            return
+        js = self.prototypes.construction(e.Proto.proto)
+        output = js.get("output")
+        position = e.Position.position
+        force = e.Owner.force
+        recipe = None
+        unit = self.prototypes.unit(output) or {}
+        for deposit_id in self.map.entities(position):
+            deposit = self.world._entities.get(deposit_id)
+            if deposit is None or not deposit.has("Proto"):
+                continue
+            for r in unit.get("recipes", []):
+                if self.prototypes.recipes(r).get("placeOver") == deposit.Proto.proto:
+                    recipe = r
+        self.remove_entity(e.Id)
+        self.add_entity(output, position, force=force, recipe=recipe)
+
+    def _take(self, force, inputs):
+        pool = self._pool.setdefault(force, {})
+        for r, n in inputs.items():
+            res = pool.get(int(r))
+            if res is None or res.Amount.amount < n:
+                return False
+        for r, n in inputs.items():
+            res = pool[int(r)]
+            res.Amount = component(amount=res.Amount.amount - n)
+        return True
+
+    def _give(self, force, resource, n):
+        pool = self._pool.setdefault(force, {})
+        res = pool.get(resource)
+        if res is None or res.Id not in self.world._entities:
+            res = self.add_entity(resource, self._spawns.get(force, 0), force=force, amount=0)
+            pool[resource] = res
+        res.Amount = component(amount=res.Amount.amount + n)
+
+    def _update_production(self, e):
+        recipe = self.prototypes.recipes(e.Recipe.recipe)
+        if not recipe:
+            return
+        key = ("production", e.Id)
+        self._progress[key] = self._progress.get(key, 0) + 1
+        if self._progress[key] < recipe.get("duration", 200):
+            return
+        force = e.Owner.force
+        if not self._take(force, recipe.get("inputs", {})):
+            return
+        self._progress[key] = 0
+        for r, n in recipe.get("outputs", {}).items():
+            r = int(r)
+            if self.prototypes.type(r) == Prototype.Unit:
+                for _ in range(n):
+                    pos = self.map.find_construction_placement(0, e.Position.position)
+                    self.add_entity(r, pos, force=force)
+            else:
+                self._give(force, r, n)
+
+    def _nearest(self, e, predicate, max_dist):
+        best = None
+        best_dist = max_dist
+        pos = e.Position.position
+        for o in self.world._entities.values():
+            if not o.has("Position") or not predicate(o):
+                continue
+            d = self.map._estimate(pos, o.Position.position)
+            if d < best_dist:
+                best = o
+                best_dist = d
+        return best
+
+    def _update_unit(self, e):
+        unit = self.prototypes.unit(e.Proto.proto) or {}
+        dps = unit.get("dps", 0)
+        speed = max(unit.get("speeds", {"0": 0}).values())
+
+        order = self.commands._orders.get(e.Id)
+        target_pos = None
+        if order is not None:
+            if order.entity != INVALID:
+                target = self.world._entities.get(order.entity)
+                if target is None:
+                    self.commands._orders.pop(e.Id, None)
+                else:
+                    target_pos = target.Position.position
+            else:
+                target_pos = order.position
+
+        if dps > 0 and (self._tick + e.Id) % 5 == 0:
+            hostile = lambda o: o.has("Unit") and o.has("Owner") and o.Owner.force != e.Owner.force
+            target = self._nearest(e, hostile, unit.get("fireRange", 0))
+            if target is not None:
+                self._life[target.Id] = self._life.get(target.Id, 1) - dps * self.DAMAGE_SCALE * 5
+                target.Life = component(life=int(math.ceil(self._life[target.Id])))
+                if self._life[target.Id] <= 0:
+                    self.remove_entity(target.Id)
+                return
+
+        if speed <= 0 or target_pos is None or target_pos == e.Position.position:
+            if order is not None and target_pos == e.Position.position:
+                self.commands._orders.pop(e.Id, None)
+            return
+        self._move_budget[e.Id] += speed * self.SPEED_SCALE
+        pos = e.Position.position
+        step = self.map.distance_line(pos, self.map.neighbors_of_position(pos)[0])
+        if self._move_budget[e.Id] < step:
+            return
+        self._move_budget[e.Id] = 0
+        nxt = min(self.map.neighbors_of_position(pos), key=lambda n: self.map._estimate(n, target_pos))
+        if self.map._estimate(nxt, target_pos) < self.map._estimate(pos, target_pos):
+            self.move_entity(e, nxt)
+
+
+def run_cli():
+    parser = argparse.ArgumentParser(description="Drive the bot against the offline stand-in")
+    parser.add_argument("--steps", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--positions", type=int, default=6000, help="tiles of the synthetic planet")
+    parser.add_argument("--enemies", type=int, default=1)
+    parser.add_argument("--snapshot", help="start from a saved snapshot instead of a synthetic world")
+    parser.add_argument("--save", help="write a snapshot of the final world")
+    parser.add_argument("--record", help="record every step to a JSON lines file")
+    parser.add_argument("--replay", help="replay a recording instead of simulating")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own output")
+    args = parser.parse_args()
+
+    install()
+    from main import Bot
+
+    random.seed(args.seed)
+    out = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    t = time.perf_counter()
+    with out:
+        if args.replay:
+            bot, game = replay(args.replay, lambda g: Bot(game=g))
+        else:
+            if args.snapshot:
+                with open(args.snapshot) as f:
+                    game = SimGame.from_snapshot(json.load(f), seed=args.seed)
+            else:
+                game = make_game(seed=args.seed, positions=args.positions, enemies=args.enemies)
+            bot = Bot(game=game)
+            recorder = Recorder(game, args.record) if args.record else None
+            game.step(args.steps)
+            if recorder is not None:
+                recorder.close()
+    elapsed = time.perf_counter() - t
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(snapshot(game), f)
+
+    counts = defaultdict(int)
+    for c in game.commands.issued:
+        counts[c[1]] += 1
+    own = sum(1 for e in game.world.entities().values() if e.own())
+    print(f"result: {game.result or 'running'} @ tick {game.tick()}")
+    print(f"wall time: {elapsed:.2f} s ({elapsed / max(1, game.tick()) * 1000:.3f} ms per step)")
+    print(f"entities: {len(game.world.entities())} ({own} own)")
+    print(f"commands: {dict(counts)}")
+
+
+if __name__ == "__main__":
+    run_cli()
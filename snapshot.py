@@ -0,0 +1,214 @@
+import numpy as np
+import uw
+
+# owner codes, the policy towards the force owning the entity
+NONE, OWN, ALLY, NEUTRAL, ENEMY = range(5)
+POLICIES = {uw.Policy.Self: OWN, uw.Policy.Ally: ALLY, uw.Policy.Neutral: NEUTRAL, uw.Policy.Enemy: ENEMY}
+
+# what an own entity of a prototype counts as for the bot
+CONSTRUCTION, RESOURCE, ATV, JUGGERNAUT, COLOSSUS, BUILDING, OTHER = range(7)
+SPECIAL_UNITS = {"ATV": ATV, "juggernaut": JUGGERNAUT, "colossus": COLOSSUS}
+
+
+def kind_of(info):
+    if info.is_construction:
+        return CONSTRUCTION
+    if info.is_resource:
+        return RESOURCE
+    if info.name in SPECIAL_UNITS:
+        return SPECIAL_UNITS[info.name]
+    if info.building_radius > 0:
+        return BUILDING
+    return OTHER
+
+
+class ProtoColumns:
+    # the ProtoInfo table as columns over a dense row per prototype, so an
+    # attribute of every entity in a snapshot is one take over its proto rows
+    def __init__(self, proto_table):
+        self.infos = list(proto_table.values())
+        self.row = {info.id: i for i, info in enumerate(self.infos)}
+        self.names = [info.name for info in self.infos]
+        self.kind = np.array([kind_of(info) for info in self.infos], dtype=np.int8)
+        self.is_unit = np.array([info.is_unit for info in self.infos], dtype=bool)
+        self.is_armed = np.array([info.is_armed for info in self.infos], dtype=bool)
+        self.is_deposit = np.array([info.is_deposit for info in self.infos], dtype=bool)
+        # only resources carry an amount worth reading, a plain list for the per entity lookup
+        self.is_resource = [info.is_resource for info in self.infos]
+        self._named = {}
+
+    def named(self, name):
+        # rows of the prototypes called name, a unit and its construction share it
+        rows = self._named.get(name)
+        if rows is None:
+            rows = self._named[name] = np.array([i for i, n in enumerate(self.names) if n == name], dtype=np.int32)
+        return rows
+
+
+class EntityView:
+    # one entity of a snapshot, as it was in that step
+    __slots__ = ("snapshot", "row")
+
+    def __init__(self, snapshot, row):
+        self.snapshot = snapshot
+        self.row = row
+
+    @property
+    def Id(self):
+        return int(self.snapshot.ids[self.row])
+
+    @property
+    def info(self):
+        return self.snapshot.columns.infos[self.snapshot.rows[self.row]]
+
+    @property
+    def proto(self):
+        return self.info.id
+
+    @property
+    def name(self):
+        return self.info.name
+
+    @property
+    def owner(self):
+        return int(self.snapshot.owners[self.row])
+
+    @property
+    def position(self):
+        return int(self.snapshot.positions[self.row])
+
+    @property
+    def amount(self):
+        return int(self.snapshot.amounts[self.row])
+
+    def entity(self):
+        # the live entity, None once it is gone
+        return self.snapshot.world.entities().get(self.Id)
+
+    def __repr__(self):
+        return f"<{self.name} {self.Id} at {self.position}>"
+
+
+class Snapshot:
+    # struct of arrays over world.entities() for one step. A single pass
+    # fills parallel arrays of id, proto row, owner code, position and amount
+    # (-1 for no position; amounts are read for resources only), in world
+    # order. Filters, counts and distance thresholds are masks over them; only
+    # the entities a caller iterates become EntityView rows. No live entity
+    # object is kept, an entity costs a few array slots however many the
+    # match spawns.
+    def __init__(self, game, step, columns):
+        self.step = step
+        self.world = world = game.world
+        self.columns = columns
+        ids, rows, owners, positions, amounts = [], [], [], [], []
+        row_of = columns.row
+        counted = columns.is_resource
+        # the owner code is the same for every entity of a force
+        forces = {}
+        my_force = world.my_force()
+        for e in world.entities().values():
+            if not e.has("Proto"):
+                continue
+            row = row_of.get(e.Proto.proto)
+            if row is None:
+                continue
+            ids.append(e.Id)
+            rows.append(row)
+            if e.has("Owner"):
+                force = e.Owner.force
+                owner = forces.get(force)
+                if owner is None:
+                    owner = forces[force] = OWN if force == my_force else POLICIES.get(world.policy(force), NONE)
+                owners.append(owner)
+            else:
+                owners.append(NONE)
+            positions.append(e.Position.position if e.has("Position") else -1)
+            if counted[row]:
+                amounts.append(e.Amount.amount if e.has("Amount") else 0)
+            else:
+                amounts.append(0)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.rows = np.array(rows, dtype=np.int32)
+        self.owners = np.array(owners, dtype=np.int8)
+        self.positions = np.array(positions, dtype=np.int64)
+        self.amounts = np.array(amounts, dtype=np.int64)
+
+        self.kind = columns.kind[self.rows]
+        self.is_own = self.owners == OWN
+        self.is_enemy = self.owners == ENEMY
+        self.is_unit = columns.is_unit[self.rows]
+        self.is_armed = self.is_own & columns.is_armed[self.rows]
+        self.is_deposit = columns.is_deposit[self.rows]
+        self._selected = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def named(self, name):
+        return np.isin(self.rows, self.columns.named(name))
+
+    def select(self, which):
+        # views of a mask or of row numbers, in that order
+        rows = np.flatnonzero(which) if which.dtype == bool else which
+        return [EntityView(self, int(r)) for r in rows]
+
+    def count(self, mask):
+        return int(np.count_nonzero(mask))
+
+    def group(self, mask):
+        # {name: [views]} of the masked entities, each in world order
+        groups = {}
+        names = self.columns.names
+        rows = self.rows
+        for r in np.flatnonzero(mask).tolist():
+            groups.setdefault(names[rows[r]], []).append(EntityView(self, r))
+        return groups
+
+    def total(self, mask):
+        # {name: summed amount} of the masked entities
+        sums = np.bincount(self.rows[mask], weights=self.amounts[mask], minlength=len(self.columns.names))
+        present = np.bincount(self.rows[mask], minlength=len(self.columns.names))
+        totals = {}
+        for r in np.flatnonzero(present).tolist():
+            name = self.columns.names[r]
+            totals[name] = totals.get(name, 0) + int(sums[r])
+        return totals
+
+    def closer(self, mask, field, threshold):
+        # (rows, distances) of the masked entities nearer than threshold to
+        # the origin of a DistanceField, nearest first, ties in world order
+        rows = np.flatnonzero(mask)
+        dist = field.of(self.positions[rows])
+        close = np.flatnonzero(dist < threshold)
+        close = close[np.argsort(dist[close], kind="stable")]
+        return rows[close], dist[close]
+
+    def _cached(self, key, mask):
+        views = self._selected.get(key)
+        if views is None:
+            views = self._selected[key] = self.select(mask)
+        return views
+
+    @property
+    def own_units(self):
+        return self._cached("own units", self.is_own & self.is_unit)
+
+    @property
+    def armed(self):
+        return self._cached("armed", self.is_armed)
+
+    @property
+    def enemies(self):
+        return self._cached("enemies", self.is_enemy)
+
+    @property
+    def enemy_units(self):
+        return self._cached("enemy units", self.is_enemy & self.is_unit)
+
+    @property
+    def deposits(self):
+        return self._cached("deposits", self.is_deposit)
+
+    def own_by_name(self, name):
+        return self._cached(("own", name), self.is_own & self.is_unit & self.named(name))
@@ -0,0 +1,105 @@
+import math
+from heapq import heappush, heappop
+from operator import itemgetter
+
+LEAF_SIZE = 8
+
+# exact distances nearest() measures at most per query when given an estimator.
+# The straight line only prunes enemies nearby, for a distant cluster it is
+# below the estimate for almost all of them, so past this many the query
+# settles for the best measured among the closest in a straight line
+MEASURE_LIMIT = 16
+
+
+class SpatialIndex:
+    # k-d tree over the 3D planet coordinates of a set of snapshot entities.
+    # Points come out of the tree in order of straight line distance, which is
+    # a lower bound of map.distance_estimate, so k-nearest and within-radius
+    # queries against the estimator stop as soon as no closer entity can exist.
+    def __init__(self, game, entities):
+        positions = game.map.positions()
+        points = []
+        for e in entities:
+            v = positions[e.position]
+            points.append((v.x, v.y, v.z, e))
+        self.positions = positions
+        self.size = len(points)
+        self._root = self._build(points) if points else None
+
+    def __len__(self):
+        return self.size
+
+    def _build(self, points):
+        lo = (min(p[0] for p in points), min(p[1] for p in points), min(p[2] for p in points))
+        hi = (max(p[0] for p in points), max(p[1] for p in points), max(p[2] for p in points))
+        if len(points) <= LEAF_SIZE:
+            return (lo, hi, points, None)
+
+        extents = [hi[i] - lo[i] for i in range(3)]
+        axis = extents.index(max(extents))
+        points.sort(key=itemgetter(axis))
+        mid = len(points) // 2
+        return (lo, hi, self._build(points[:mid]), self._build(points[mid:]))
+
+    @staticmethod
+    def _box_distance2(node, x, y, z):
+        lo, hi = node[0], node[1]
+        d = 0.0
+        for v, a, b in ((x, lo[0], hi[0]), (y, lo[1], hi[1]), (z, lo[2], hi[2])):
+            if v < a:
+                d += (a - v) ** 2
+            elif v > b:
+                d += (v - b) ** 2
+        return d
+
+    def iter_nearest(self, position):
+        # yields (straight line distance, entity) in increasing order
+        if self._root is None:
+            return
+        v = self.positions[position]
+        x, y, z = v.x, v.y, v.z
+        counter = 0
+        heap = [(0.0, counter, self._root, None)]
+        while heap:
+            d2, _, node, entity = heappop(heap)
+            if node is None:
+                yield math.sqrt(d2), entity
+                continue
+            if node[3] is None:
+                for px, py, pz, e in node[2]:
+                    counter += 1
+                    heappush(heap, ((px - x) ** 2 + (py - y) ** 2 + (pz - z) ** 2, counter, None, e))
+                continue
+            for child in (node[2], node[3]):
+                counter += 1
+                heappush(heap, (self._box_distance2(child, x, y, z), counter, child, None))
+
+    def nearest(self, position, k=1, distance=None, limit=MEASURE_LIMIT):
+        # k closest entities to position, ordered by distance(position, e.position)
+        # (straight line distance when no estimator is given). With an estimator
+        # at most max(limit, k) of them are measured, None measures until exact
+        best = []
+        counter = 0
+        limit = max(limit, k) if distance is not None and limit is not None else None
+        for line, e in self.iter_nearest(position):
+            if len(best) == k and (line >= -best[0][0] or counter == limit):
+                break
+            d = distance(position, e.position) if distance is not None else line
+            counter += 1
+            if len(best) < k:
+                heappush(best, (-d, counter, e))
+            elif d < -best[0][0]:
+                heappop(best)
+                heappush(best, (-d, counter, e))
+        best.sort(key=lambda x: (-x[0], x[1]))
+        return [e for _, _, e in best]
+
+    def within(self, position, radius, distance=None):
+        # entities with distance(position, e.position) <= radius
+        result = []
+        for line, e in self.iter_nearest(position):
+            if line > radius:
+                break
+            if distance is None or distance(position, e.position) <= radius:
+                result.append(e)
+        return result
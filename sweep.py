@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+
+import matches
+from config import Config, DEFAULTS
+
+# Parameter sweep over the strategy constants of config.py, played out in
+# headless matches against the offline stand-in (matches.py).
+#
+#   python sweep.py defense_distance=600,820,1000 juggernaut_aggression=6,8,10
+#   python sweep.py talos_distance=200:320 talos_threat_distance=800:1600 --samples 24
+#
+# "name=a,b,c" lists values, a grid over all of them unless a range is given;
+# "name=lo:hi" is a range and makes it a random search of --samples configs.
+# Early stopping is successive halving: every config plays --seeds matches,
+# the best 1/--eta go on with --eta times as many seeds, until one is left or
+# the seeds run out. Each match result is cached per config hash in
+# sweep_cache/<key>.json, a rerun or a wider sweep plays only what is new.
+
+CACHE = os.environ.get("BOT_SWEEP_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sweep_cache"))
+
+
+def parse_space(specs):
+    # returns ({name: [values]}, {name: (lo, hi)})
+    grid, ranges = {}, {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in DEFAULTS or not values:
+            raise ValueError(f"bad parameter {spec!r}, expected name=a,b,c or name=lo:hi")
+        kind = type(DEFAULTS[name])
+        if ":" in values:
+            lo, hi = values.split(":")
+            ranges[name] = (kind(lo), kind(hi))
+        else:
+            grid[name] = [kind(v) for v in values.split(",")]
+    return grid, ranges
+
+
+def candidates(grid, ranges, samples, rng):
+    if not ranges:
+        names = sorted(grid)
+        return [Config(**dict(zip(names, values))) for values in itertools.product(*(grid[n] for n in names))]
+    configs = []
+    for _ in range(samples):
+        values = {n: rng.choice(v) for n, v in grid.items()}
+        for n, (lo, hi) in ranges.items():
+            values[n] = rng.randint(lo, hi) if isinstance(lo, int) else rng.uniform(lo, hi)
+        configs.append(Config(**values))
+    return configs
+
+
+def score(result):
+    # a win is 1 and a loss 0; a match still running at the end scores its
+    # share of the entities alive
+    if result["result"] == "win":
+        return 1.0
+    if result["result"] in ("loss", "crashed"):
+        return 0.0
+    return result["own"] / max(1, result["own"] + result["enemy"])
+
+
+class Cache:
+    # match results per config, one file per config hash
+    def __init__(self, path=CACHE):
+        self.path = path
+        self._entries = {}
+
+    @staticmethod
+    def match_key(match):
+        return f"{match['seed']}-{match['positions']}-{match['enemies']}-{match['steps']}"
+
+    def _load(self, config):
+        key = config.key()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = {"config": config.to_dict(), "matches": {}}
+            file = os.path.join(self.path, key + ".json")
+            if os.path.exists(file):
+                with open(file) as f:
+                    entry = json.load(f)
+            self._entries[key] = entry
+        return entry
+
+    def get(self, config, match):
+        return self._load(config)["matches"].get(self.match_key(match))
+
+    def put(self, config, match, result):
+        entry = self._load(config)
+        entry["matches"][self.match_key(match)] = result
+        os.makedirs(self.path, exist_ok=True)
+        file = os.path.join(self.path, config.key() + ".json")
+        with open(file + ".tmp", "w") as f:
+            json.dump(entry, f)
+        os.replace(file + ".tmp", file)
+
+
+def evaluate(configs, seeds, template, cache, workers=None):
+    # mean score per config over the seeds; the uncached matches of all
+    # configs run in one pool
+    pending = []
+    for config in configs:
+        for seed in seeds:
+            match = dict(template, seed=seed)
+            if cache.get(config, match) is None:
+                pending.append((config, match))
+    if pending:
+        runs = [dict(match, config=config.changes()) for config, match in pending]
+        for (config, match), result in zip(pending, matches.run(runs, workers)):
+            # crashes are not cached, they are worth another look
+            if result["result"] != "crashed":
+                cache.put(config, match, result)
+            else:
+                print(f"{config}: seed {match['seed']} crashed: {result['error']}", file=sys.stderr)
+    scores = []
+    for config in configs:
+        results = [cache.get(config, dict(template, seed=seed)) for seed in seeds]
+        scores.append(sum(score(r) if r is not None else 0.0 for r in results) / len(seeds))
+    return scores, len(pending)
+
+
+def halving(configs, seeds, eta, max_seeds, template, cache, workers=None):
+    # successive halving; returns [(score, seeds played, config)] best first
+    ranked = {}
+    alive = list(configs)
+    n = seeds
+    while True:
+        played = list(range(min(n, max_seeds)))
+        scores, ran = evaluate(alive, played, template, cache, workers)
+        for config, s in zip(alive, scores):
+            ranked[config.key()] = (s, len(played), config)
+        print(f"{len(alive)} configs on {len(played)} seeds, {ran} matches played", file=sys.stderr, flush=True)
+        if len(alive) <= 1 or len(played) >= max_seeds:
+            break
+        order = sorted(range(len(alive)), key=lambda i: -scores[i])
+        alive = [alive[i] for i in order[:max(1, len(alive) // eta)]]
+        n *= eta
+    # configs that went further rank above the ones stopped early
+    return sorted(ranked.values(), key=lambda r: (-r[1], -r[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the strategy constants in headless matches")
+    parser.add_argument("params", nargs="+", help="name=a,b,c for a grid, name=lo:hi for a random range")
+    parser.add_argument("--samples", type=int, default=16, help="configs of a random search")
+    parser.add_argument("--seeds", type=int, default=2, help="seeds every config plays in the first round")
+    parser.add_argument("--max-seeds", type=int, default=16, help="seeds of the last round")
+    parser.add_argument("--eta", type=int, default=2, help="keep 1/eta of the configs per round")
+    parser.add_argument("--positions", type=int, default=6000)
+    parser.add_argument("--enemies", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=None, help="processes, all cores by default")
+    parser.add_argument("--random-seed", type=int, default=0, help="for sampling the random search")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--json", help="also write the ranking to this file")
+    args = parser.parse_args()
+
+    grid, ranges = parse_space(args.params)
+    configs = candidates(grid, ranges, args.samples, random.Random(args.random_seed))
+    # the defaults always take part as the baseline
+    if not any(not c.changes() for c in configs):
+        configs.append(Config())
+    template = {"positions": args.positions, "enemies": args.enemies, "steps": args.steps}
+    t = time.perf_counter()
+    ranking = halving(configs, args.seeds, max(2, args.eta), args.max_seeds, template, Cache(), args.workers)
+
+    print(f"{'score':>7}{'seeds':>7}  config")
+    for s, n, config in ranking[:args.top]:
+        print(f"{s:>7.3f}{n:>7}  {config.key()} {config.changes() or 'defaults'}")
+    baseline = next(r for r in ranking if not r[2].changes())
+    print(f"defaults {baseline[0]:.3f} on {baseline[1]} seeds; {len(configs)} configs in "
+          f"{time.perf_counter() - t:.1f} s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{"score": s, "seeds": n, "key": c.key(), "config": c.to_dict()} for s, n, c in ranking],
+                      f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
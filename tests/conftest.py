@@ -0,0 +1,32 @@
+import os
+import sys
+
+# the bot reads these on import, the tests run without a map cache on disk and
+# with planner jobs run inline
+os.environ.setdefault("BOT_MAP_CACHE", "0")
+os.environ.setdefault("BOT_PLANNER_THREAD", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sim
+
+sim.install()
+
+import pytest
+from proto_info import ProtoInfo
+
+
+def proto_table(game):
+    # as Bot.init_prototypes builds it
+    table = {}
+    for p in game.prototypes.all():
+        props = game.prototypes.json(p)
+        table[p] = ProtoInfo(p, str(game.prototypes.name(p)), str(game.prototypes.type(p)),
+                             props if isinstance(props, dict) else {})
+    return table
+
+
+@pytest.fixture
+def world():
+    import bench
+    return bench.build_world(2000, seed=3)
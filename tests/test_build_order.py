@@ -0,0 +1,171 @@
+import inspect
+import random
+
+from build_order import ACTIONS, BuildOrder
+from config import Config
+from main import Bot
+
+BUILDINGS = ("concrete plant", "bot assembler", "drill", "talos", "laboratory", "pump", "arsenal", "factory",
+             "forgepress", "generator", "smelter", "blender", "experimental assembler")
+
+
+def recorder(name):
+    # the action as called, arguments bound to the Bot method's signature so
+    # positional and keyword calls compare equal
+    signature = inspect.signature(getattr(Bot, name))
+
+    def record(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        del arguments["self"]
+        self.calls.append((name, arguments))
+
+    return record
+
+
+class FakeBot:
+    # the counts of a random base; actions are recorded, not run
+    count = Bot.count
+
+    def __init__(self, rng):
+        self.buildings = {name: [None] * rng.choice((0, 0, 1, 2, 3, 4)) for name in BUILDINGS}
+        self.constructions = {name: [None] * rng.choice((0, 0, 0, 1, 2)) for name in BUILDINGS}
+        self.drill_positions = {name: [0] * rng.choice((0, 1, 2)) for name in ("metal", "crystals", "oil", "aether")}
+        self.resource_counts = {name: rng.randrange(10) for name in ("metal", "reinforced concrete")}
+        self.juggernauts = [None] * rng.choice((0, 1, 1, 2))
+        self.colossus = []
+        self.atvs = [None] * rng.choice((0, 5, 9, 15, 21, 30))
+        self.calls = []
+
+    # the helpers of the old chain
+    def have_building(self, name, count):
+        return len(self.buildings.get(name, [])) >= count
+
+    def have_drill(self, resource, count):
+        return len(self.drill_positions.get(resource, [])) >= count
+
+    def have_construction(self, name, count):
+        return len(self.constructions.get(name, [])) >= count
+
+    def have_building_or_construction(self, name, count):
+        return (len(self.buildings.get(name, [])) + len(self.constructions.get(name, []))) >= count
+
+    def should_build_building(self, name, count):
+        return not self.have_building_or_construction(name, count)
+
+    def have_jaggernaut(self, count):
+        return len(self.juggernauts) >= count
+
+    def have_resources(self, resource, count):
+        return self.resource_counts.get(resource, 0) >= count
+
+
+for _name in ACTIONS:
+    setattr(FakeBot, _name, recorder(_name))
+
+
+def if_chain(self):
+    # Bot.build_order() as it was before build_order.yaml, the reference
+    if self.have_jaggernaut(1) and self.have_resources("metal", 6) and self.have_resources("reinforced concrete", 6) and not self.have_construction("talos", 2):
+        self.build_talos(with_gap=True, distance=260)
+        return
+    c_strat = True
+    if self.have_drill("metal", 1) and self.should_build_building("concrete plant", 1):
+        self.build_nearby_drill("concrete plant", "metal", 0)
+        return
+    if not self.have_building_or_construction("bot assembler", 1) and self.have_building_or_construction("concrete plant", 1) and self.should_build_building("concrete plant", 2):
+        self.build_nearby_building("concrete plant", "concerte plant")
+        return
+    if self.have_building("concrete plant", 2) and self.have_building("drill", 2) and self.should_build_building("drill", 4):
+        self.build_drills("crystals", 1)
+        return
+    if not self.have_building("drill", 4) and self.have_building("concrete plant", 2) and self.should_build_building("talos", 1):
+        self.build_nearby_drill("talos", "crystals", 0, with_gap=True)
+        return
+    if (self.have_building_or_construction("drill", 4)) and self.should_build_building("laboratory", 1):
+        self.build_nearby_drill("laboratory", "crystals")
+        return
+    if self.have_building_or_construction("laboratory", 1) and self.should_build_building("pump", 1):
+        self.build_drills("oil", 1)
+        return
+    if not self.have_building("pump", 1) and self.have_building("concrete plant", 2) and self.should_build_building("talos", 2):
+        self.build_nearby_drill("talos", "oil", 0, with_gap=True)
+        return
+    if self.have_building("laboratory", 1) and self.have_building("drill", 3) and self.should_build_building("arsenal", 1):
+        self.build_nearby_drill("arsenal", "metal", 2)
+        return
+    if self.have_drill("oil", 1) and self.should_build_building("bot assembler", 1):
+        self.build_nearby_building("bot assembler", "laboratory", with_gap=c_strat)
+        return
+    if self.have_building("arsenal", 1) and self.should_build_building("talos", 3):
+        self.build_talos(with_gap=True, distance=160)
+        return
+    if self.have_building("bot assembler", 1) and self.have_building("concrete plant", 2) and not c_strat:
+        self.destroy_building("concrete plant")
+    if len(self.atvs) < 9 and self.should_build_building("factory", 1):
+        self.build_nearby_drill("factory", "metal", 1, with_gap=True)
+    if len(self.atvs) > 20 and self.have_building("factory", 1):
+        self.destroy_building("factory")
+    if (self.have_building_or_construction("bot assembler", 1) and self.have_building("concrete plant", 2) and self.have_resources("reinforced concrete", 5)) or (self.have_building("bot assembler", 1) and self.have_building("concrete plant", 2)):
+        self.destroy_building("concrete plant")
+        return
+    if not c_strat or not self.have_resources("metal", 4) or not self.have_resources("reinforced concrete", 4) or not self.have_jaggernaut(1):
+        return
+    if self.should_build_building("forgepress", 1):
+        self.build_nearby_drill("forgepress", "metal", 2, with_gap=True)
+        return
+    if self.have_building("forgepress", 1) and self.should_build_building("pump", 2):
+        self.build_drills("aether", 1)
+        return
+    if self.have_drill("aether", 1) and self.have_building("forgepress", 1) and self.should_build_building("generator", 1):
+        self.build_nearby_building("generator", "nucleus", with_gap=True)
+        return
+    if self.have_building("generator", 1) and self.should_build_building("smelter", 1):
+        self.build_nearby_drill("smelter", "metal", 1, with_gap=True)
+        return
+    if self.have_drill("aether", 1) and self.have_building("generator", 1) and self.should_build_building("blender", 1):
+        self.build_nearby_drill("blender", "aether")
+        return
+    if self.have_building("blender", 1) and self.should_build_building("blender", 2):
+        self.build_nearby_drill("blender", "aether", with_gap=True)
+        return
+    if self.have_building("blender", 2) and self.should_build_building("blender", 3):
+        self.build_nearby_drill("blender", "aether", with_gap=True)
+        return
+    if self.have_building("smelter", 1) and self.should_build_building("forgepress", 2):
+        self.build_nearby_building("forgepress", "smelter", with_gap=True)
+        return
+    if self.have_building_or_construction("generator", 1) and self.have_building("smelter", 1) and self.should_build_building("laboratory", 2):
+        self.build_nearby_building("laboratory", "smelter", with_gap=True)
+        return
+    if self.have_building("blender", 1) and self.have_building("laboratory", 2) and self.should_build_building("laboratory", 3):
+        self.build_nearby_building("laboratory", "generator")
+        return
+    if self.have_building_or_construction("laboratory", 3) and self.should_build_building("experimental assembler", 1):
+        self.build_nearby_building("experimental assembler", "smelter")
+        return
+    if self.have_building("experiental assembler", 1) and self.have_building("laboratory", 3):
+        self.destroy_temporary_laboratory()
+        return
+
+
+def test_build_order_decides_as_the_if_chain():
+    rng = random.Random(5)
+    rules = BuildOrder.load(params=Config().to_dict())
+    acted = set()
+    bot = FakeBot(rng)
+    for _ in range(3000):
+        # now and then the same base again, which the compiled order may skip
+        if rng.random() > 0.2:
+            bot = FakeBot(rng)
+        bot.calls = []
+        if_chain(bot)
+        expected = bot.calls
+
+        bot.calls = []
+        acted.update(rules.run(bot))
+        assert bot.calls == expected
+
+    # every rule that can act did at some point
+    assert acted == {r.name for r in rules.rules if r.action is not None} - {"drop temporary laboratory"}
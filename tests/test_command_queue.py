@@ -0,0 +1,105 @@
+import sim
+from command_queue import CommandQueue, SETTING_RESEND
+
+
+def make_game():
+    game = sim.SimGame(rules=False)
+    me = game.add_force()
+    unit = lambda name: game.proto_id(sim.Prototype.Unit, name)
+    atvs = [game.add_entity(unit("ATV"), p, force=me).Id for p in (10, 11, 12)]
+    factory = game.add_entity(unit("factory"), 20, force=me).Id
+    return game, atvs, factory
+
+
+def sent(game, name=None):
+    issued = [c[1:] for c in game.commands.issued]
+    game.commands.issued.clear()
+    return [c for c in issued if name is None or c[0] == name]
+
+
+def test_orders_in_a_step_collapse_into_the_last():
+    game, (a, b, _), _ = make_game()
+    queue = CommandQueue(game)
+    queue.order(a, queue.run_to_position(100))
+    queue.order(a, queue.fight_to_position(200))
+    queue.order(b, queue.run_to_position(300))
+    assert queue.orders(a)[0].position == 200
+    queue.flush()
+    assert sent(game) == [("order", a, int(sim.OrderType.Fight), sim.INVALID, 200),
+                          ("order", b, int(sim.OrderType.Run), sim.INVALID, 300)]
+    assert queue.coalesced == 1
+
+
+def test_order_the_unit_still_runs_is_dropped():
+    game, (a, _, _), _ = make_game()
+    queue = CommandQueue(game)
+    queue.order(a, queue.run_to_position(100))
+    queue.flush()
+    sent(game)
+
+    queue.order(a, queue.run_to_position(100))
+    queue.flush()
+    assert sent(game) == []
+    assert queue.dropped == 1
+
+    # a different order goes out, and the same one again once the unit dropped it
+    queue.order(a, queue.run_to_position(101))
+    queue.flush()
+    assert len(sent(game, "order")) == 1
+    game.commands._orders.pop(a)
+    queue.order(a, queue.run_to_position(101))
+    queue.flush()
+    assert len(sent(game, "order")) == 1
+
+
+def test_settings_are_dropped_while_the_entity_has_them():
+    game, _, factory = make_game()
+    queue = CommandQueue(game)
+    recipes = game.prototypes.unit(game.world.entity(factory).Proto.proto)["recipes"]
+    queue.command_set_recipe(factory, recipes[0])
+    queue.command_set_recipe(factory, recipes[1])
+    queue.command_set_priority(factory, 2)
+    queue.flush()
+    assert sent(game) == [("set_recipe", factory, recipes[1]), ("set_priority", factory, 2)]
+    assert queue.coalesced == 1
+
+    queue.command_set_recipe(factory, recipes[1])
+    queue.command_set_priority(factory, 2)
+    queue.flush()
+    assert sent(game) == []
+
+
+def test_lost_setting_is_resent_after_the_resend_window():
+    game, _, factory = make_game()
+    queue = CommandQueue(game)
+    e = game.world.entity(factory)
+    recipe = game.prototypes.unit(e.Proto.proto)["recipes"][0]
+    queue.command_set_recipe(factory, recipe)
+    queue.flush()
+    sent(game)
+
+    # the entity does not report it, as when the command got lost
+    e.Recipe = sim.component(recipe=0)
+    for _ in range(SETTING_RESEND - 1):
+        queue.command_set_recipe(factory, recipe)
+        queue.flush()
+    assert sent(game) == []
+    queue.command_set_recipe(factory, recipe)
+    queue.flush()
+    assert sent(game) == [("set_recipe", factory, recipe)]
+
+
+def test_placements_and_self_destructs_go_out_last_in_order():
+    game, (a, b, _), factory = make_game()
+    queue = CommandQueue(game)
+    talos = game.proto_id(sim.Prototype.Construction, "talos")
+    queue.command_self_destruct(b)
+    queue.command_place_construction(talos, 500)
+    queue.order(b, queue.run_to_position(100))
+    queue.command_set_priority(factory, 1)
+    queue.flush()
+    assert [c[0] for c in sent(game)] == ["set_priority", "order", "self_destruct", "place_construction"]
+    assert b not in game.world.entities()
+
+    queue.forget([b])
+    assert b not in queue._sent_orders
@@ -0,0 +1,39 @@
+import json
+import os
+
+import pytest
+from production import Production, TICKS_PER_MINUTE
+
+PROTOTYPES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prototypes.json")
+
+
+@pytest.fixture(scope="module")
+def production():
+    with open(PROTOTYPES) as f:
+        return Production.from_prototypes({p["id"]: p for p in json.load(f)})
+
+
+def test_requirements_by_hand():
+    # ore from nothing in 2 s, plate from 2 ore in 6 s, gear from a plate and an ore in 3 s
+    seconds = lambda s: s * TICKS_PER_MINUTE / 60
+    production = Production({
+        "ore": ({}, {"ore": 1}, seconds(2)),
+        "plate": ({"ore": 2}, {"plate": 1}, seconds(6)),
+        "gear": ({"plate": 1, "ore": 1}, {"gear": 1}, seconds(3)),
+    }, {"ore": "drill"})
+    # 20 gears a minute: 1 gear building, 2 plate buildings and 20 + 40 ore a minute
+    assert production.requirements("gear", 20) == pytest.approx({"gear": 1, "plate": 2, "ore": 2})
+    assert production.buildings_for("gear", 20) == {"gear": 1, "plate": 2, "drill": 2}
+    with pytest.raises(ValueError):
+        production.requirements("coal", 1)
+
+
+def test_requirements_run_at_the_target_rate(production):
+    for item in sorted(production.producer):
+        mix = production.requirements(item, 3)
+        flow = production.steady_state(mix)
+        assert flow.rates[item] == pytest.approx(3)
+        assert not flow.bottlenecks
+        for other, rate in flow.rates.items():
+            if other != item:
+                assert rate == pytest.approx(0, abs=1e-9), (item, other)
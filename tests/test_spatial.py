@@ -0,0 +1,80 @@
+import random
+import numpy as np
+
+from conftest import proto_table
+from distance_field import DistanceField
+from snapshot import ProtoColumns, Snapshot
+from spatial import SpatialIndex
+from threat_map import ThreatMap
+
+
+def coords_of(game):
+    return np.array([(v.x, v.y, v.z) for v in game.map.positions()], dtype=np.float64)
+
+
+def line(game, a, b):
+    va, vb = game.map.positions()[a], game.map.positions()[b]
+    return ((va.x - vb.x) ** 2 + (va.y - vb.y) ** 2 + (va.z - vb.z) ** 2) ** 0.5
+
+
+def snapshot_of(game):
+    return Snapshot(game, 1, ProtoColumns(proto_table(game)))
+
+
+def test_nearest_and_within_match_brute_force(world):
+    rng = random.Random(2)
+    enemies = snapshot_of(world).enemy_units
+    index = SpatialIndex(world, enemies)
+    estimate = world.map.distance_estimate
+    count = len(world.map.positions())
+    for _ in range(20):
+        p = rng.randrange(count)
+        for k in (1, 5):
+            expected = sorted(estimate(p, e.position) for e in enemies)[:k]
+            found = index.nearest(p, k, distance=estimate, limit=None)
+            assert [estimate(p, e.position) for e in found] == expected
+
+        expected = sorted(line(world, p, e.position) for e in enemies)[:3]
+        assert np.allclose([line(world, p, e.position) for e in index.nearest(p, 3)], expected)
+
+        radius = rng.choice((100, 300, 800))
+        within = {e.Id for e in index.within(p, radius, distance=estimate)}
+        assert within == {e.Id for e in enemies if estimate(p, e.position) <= radius}
+
+
+def test_limited_nearest_measures_at_most_limit(world):
+    enemies = snapshot_of(world).enemy_units
+    index = SpatialIndex(world, enemies)
+    calls = []
+
+    def estimate(a, b):
+        calls.append(b)
+        return world.map.distance_estimate(a, b)
+
+    found = index.nearest(0, 2, distance=estimate, limit=8)
+    assert len(found) == 2
+    assert len(calls) <= 8
+
+
+def test_threat_map_closest_matches_brute_force(world):
+    rng = random.Random(4)
+    table = proto_table(world)
+    coords = coords_of(world)
+    threats = ThreatMap(coords)
+    estimate = world.map.distance_estimate
+    count = len(coords)
+    for _ in range(5):
+        enemies = snapshot_of(world).enemy_units
+        threats.update(enemies, table)
+        armed = [e for e in enemies if table[e.proto].dps > 0]
+
+        origin = rng.randrange(count)
+        field = DistanceField(origin, np.array([estimate(origin, p) for p in range(count)]))
+        entity, distance = threats.closest(field)
+        assert distance == min(field(e.position) for e in armed)
+        assert field(entity.position) == distance
+        assert np.isclose(threats.heat.sum(), sum(table[e.proto].dps for e in armed))
+
+        # some of them move to another tile
+        for e in rng.sample(armed, len(armed) // 10):
+            world.move_entity(world.world.entity(e.Id), rng.randrange(count))
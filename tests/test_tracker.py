@@ -0,0 +1,72 @@
+import random
+
+import sim
+from conftest import proto_table
+from tracker import EntityTracker
+
+
+def view(tracker):
+    # what the bot reads off the tracker, as plain ids
+    by_name = lambda d: {name: set(ids) for name, ids in d.items() if ids}
+    return {
+        "main": tracker.main_building.Id if tracker.main_building is not None else None,
+        "buildings": by_name(tracker.buildings),
+        "constructions": by_name(tracker.constructions),
+        "drills": by_name(tracker.drills),
+        "atvs": set(tracker.atvs),
+        "juggernauts": set(tracker.juggernauts),
+        "colossus": set(tracker.colossus),
+        "others": set(tracker.others),
+        "enemy nuclei": set(tracker.enemy_main_buildings),
+        "resources": dict(tracker.resources),
+        "resource counts": {name: n for name, n in tracker.resource_counts.items() if n},
+    }
+
+
+def mutate(game, rng):
+    entities = game.world.entities()
+    me = game.world.my_force()
+    own = [e for e in entities.values() if e.own()]
+    unit = lambda name: game.proto_id(sim.Prototype.Unit, name)
+    construction = lambda name: game.proto_id(sim.Prototype.Construction, name)
+
+    for e in rng.sample(own, 5):
+        game.remove_entity(e.Id)
+    for name in rng.sample(["ATV", "juggernaut", "colossus", "factory", "laboratory", "drill"], 3):
+        game.add_entity(unit(name), rng.randrange(len(game.map.positions())), force=me)
+    for name in rng.sample(["talos", "laboratory", "arsenal"], 2):
+        game.add_entity(construction(name), rng.randrange(len(game.map.positions())), force=me)
+
+    # constructions finishing, in place (as the game does) or as a new entity
+    for e in [e for e in entities.values() if e.own() and game.prototypes.construction(e.Proto.proto)][:2]:
+        output = game.prototypes.construction(e.Proto.proto)["output"]
+        if rng.random() < 0.5:
+            e.Proto = sim.component(proto=output)
+        else:
+            game.remove_entity(e.Id)
+            game.add_entity(output, e.Position.position, force=me)
+
+    # drills learning their recipe, stored resources changing
+    for e in entities.values():
+        if e.own() and e.has("Recipe") and e.Recipe.recipe == 0 and rng.random() < 0.5:
+            recipes = game.prototypes.unit(e.Proto.proto).get("recipes") or [0]
+            e.Recipe = sim.component(recipe=recipes[0])
+    resources = [p for p in game.prototypes.all() if game.prototypes.type(p) == sim.Prototype.Resource]
+    game._give(me, rng.choice(resources), rng.randrange(1, 5))
+    for e in entities.values():
+        if e.own() and e.has("Amount") and rng.random() < 0.3:
+            e.Amount = sim.component(amount=max(0, e.Amount.amount - 1))
+
+
+def test_updates_match_a_full_rescan(world):
+    rng = random.Random(1)
+    table = proto_table(world)
+    tracker = EntityTracker(table)
+    for _ in range(30):
+        tracker.update(world.world.entities())
+        rescan = EntityTracker(table)
+        rescan.update(world.world.entities())
+        assert view(tracker) == view(rescan)
+        # nothing changed since
+        assert tracker.update(world.world.entities()) == ([], set(), [])
+        mutate(world, rng)
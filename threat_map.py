@@ -0,0 +1,106 @@
+import numpy as np
+
+# edge of the grid cells tiles are grouped by, in map units
+CELL = 150.0
+
+
+class ThreatMap:
+    # enemy dps accumulated over coarse clusters of tiles. Tiles are grouped by
+    # a grid over their coordinates, each cluster keeps the summed dps of the
+    # armed enemies standing in it and the enemies themselves. update() only
+    # touches the sums for enemies that moved to another cluster, appeared or
+    # died. Queries around a fixed position (a talos, the base) read the
+    # clusters within a radius, which are looked up once per position.
+    def __init__(self, coords, cell=CELL):
+        self.cell = cell
+        self.step = None
+        keys = np.floor(np.asarray(coords) / cell).astype(np.int64)
+        _, self.tile_cluster = np.unique(keys, axis=0, return_inverse=True)
+        self.tile_cluster = self.tile_cluster.reshape(-1)
+        count = int(self.tile_cluster.max()) + 1 if len(self.tile_cluster) else 0
+        sums = np.zeros((count, 3))
+        np.add.at(sums, self.tile_cluster, coords)
+        self.centers = sums / np.maximum(np.bincount(self.tile_cluster, minlength=count), 1)[:, None]
+        self.heat = np.zeros(count)
+        self.members = [{} for _ in range(count)]
+        self._coords = coords
+        self._where = {}
+        self._near = {}
+        self._order = None
+
+    def update(self, enemies, proto_table, step=None):
+        # enemies: the enemy units of this step as snapshot views; returns how many of them changed cluster
+        self.step = step
+        changed = 0
+        seen = set()
+        tile_cluster = self.tile_cluster
+        for e in enemies:
+            info = proto_table.get(e.proto)
+            if info is None or info.dps <= 0:
+                continue
+            _id = e.Id
+            seen.add(_id)
+            c = int(tile_cluster[e.position])
+            old = self._where.get(_id)
+            if old is not None:
+                if old[0] == c:
+                    # the view of this step, it moved within the cluster
+                    self.members[c][_id] = e
+                    continue
+                self._remove(_id)
+            self._where[_id] = (c, info.dps)
+            self.members[c][_id] = e
+            self.heat[c] += info.dps
+            changed += 1
+        for _id in [i for i in self._where if i not in seen]:
+            self._remove(_id)
+            changed += 1
+        return changed
+
+    def _remove(self, _id):
+        c, dps = self._where.pop(_id)
+        del self.members[c][_id]
+        self.heat[c] = self.heat[c] - dps if self.members[c] else 0.0
+
+    def near(self, position, radius):
+        # clusters whose center lies within radius (straight line) of the tile
+        key = (int(position), radius)
+        clusters = self._near.get(key)
+        if clusters is None:
+            d = np.sqrt(((self.centers - self._coords[int(position)]) ** 2).sum(axis=1))
+            clusters = self._near[key] = np.flatnonzero(d <= radius)
+        return clusters
+
+    def threat_near(self, position, radius):
+        return float(self.heat[self.near(position, radius)].sum())
+
+    def hottest(self, position, radius):
+        # (cluster, heat) of the hottest cluster near position, None when it is quiet
+        clusters = self.near(position, radius)
+        if not len(clusters):
+            return None
+        i = int(np.argmax(self.heat[clusters]))
+        if self.heat[clusters[i]] <= 0:
+            return None
+        return int(clusters[i]), float(self.heat[clusters[i]])
+
+    def closest(self, field):
+        # (entity, distance) of the armed enemy closest to the origin of a
+        # DistanceField. Clusters are visited in order of their center's
+        # distance, until none can hold anything closer.
+        if self._order is None or self._order[0] != field.origin:
+            d = np.sqrt(((self.centers - self._coords[field.origin]) ** 2).sum(axis=1))
+            order = np.argsort(d, kind="stable")
+            self._order = (field.origin, order, d[order])
+        _, order, lower = self._order
+        slack = self.cell * np.sqrt(3)
+        best = None
+        best_dist = np.inf
+        for c, d in zip(order[self.heat[order] > 0].tolist(), lower[self.heat[order] > 0].tolist()):
+            if d - slack > best_dist:
+                break
+            for e in self.members[c].values():
+                dist = field(e.position)
+                if dist < best_dist:
+                    best, best_dist = e, dist
+        return (best, best_dist) if best is not None else None
@@ -0,0 +1,158 @@
+from collections import defaultdict
+
+
+class EntityTracker:
+    # keeps the bot's view of its own base up to date from entity deltas:
+    # ids that appeared, disappeared or changed proto (construction finishing in place)
+    # since the previous update are the only ones that get classified again
+    def __init__(self, proto_table):
+        self.proto_table = proto_table
+        self._seen = set()
+        self._kinds = {}
+        self._protos = {}
+        self._pending_drills = {}
+        self._drill_resources = {}
+
+        self.main_building = None
+        self.buildings = defaultdict(dict)
+        self.constructions = defaultdict(dict)
+        self.drills = defaultdict(dict)
+        self.atvs = {}
+        self.juggernauts = {}
+        self.colossus = {}
+        self.others = {}
+        self.enemy_main_buildings = {}
+
+        self.resources = {}
+        self.resource_counts = defaultdict(int)
+
+    def update(self, entities):
+        ids = entities.keys()
+        if ids == self._seen:
+            # nothing appeared or left, one pass instead of two set differences
+            removed = added = set()
+        else:
+            removed = self._seen - ids
+            added = ids - self._seen
+            self._seen -= removed
+            self._seen |= added
+
+        changed = []
+        for kind in self.constructions.values():
+            for _id, e in kind.items():
+                if _id in entities and e.Proto.proto != self._protos[_id]:
+                    changed.append(_id)
+
+        appeared = []
+        for _id in removed:
+            self._remove(_id)
+        for _id in changed:
+            self._remove(_id)
+            if self._add(entities[_id]):
+                appeared.append(entities[_id])
+        # ids are handed out in creation order, keep the lists in world order
+        for _id in sorted(added):
+            if self._add(entities[_id]):
+                appeared.append(entities[_id])
+
+        for _id, e in list(self._pending_drills.items()):
+            self._add_drill(e)
+
+        for _id, (name, amount) in self.resources.items():
+            current = entities[_id].Amount.amount
+            if current != amount:
+                self.resource_counts[name] += current - amount
+                self.resources[_id] = (name, current)
+
+        return appeared, removed, changed
+
+    def kind(self, _id):
+        # (kind, name) the entity was classified as, e.g. ("construction", "talos")
+        return self._kinds.get(_id, (None, None))
+
+    def _add(self, e):
+        if not e.has("Proto"):
+            return False
+        info = self.proto_table.get(e.Proto.proto)
+        if info is None:
+            return False
+        name = info.name
+        _id = e.Id
+
+        if not e.own():
+            if name == "nucleus":
+                self.enemy_main_buildings[_id] = e
+                self._kinds[_id] = ("enemy nucleus", name)
+                return True
+            return False
+
+        self._protos[_id] = e.Proto.proto
+
+        if info.is_construction:
+            self.constructions[name][_id] = e
+            self._kinds[_id] = ("construction", name)
+        elif info.is_resource:
+            amount = e.Amount.amount
+            self.resources[_id] = (name, amount)
+            self.resource_counts[name] += amount
+            self._kinds[_id] = ("resource", name)
+        elif name == "ATV":
+            self.atvs[_id] = e
+            self._kinds[_id] = ("atv", name)
+        elif name == "juggernaut":
+            self.juggernauts[_id] = e
+            self._kinds[_id] = ("juggernaut", name)
+        elif name == "colossus":
+            self.colossus[_id] = e
+            self._kinds[_id] = ("colossus", name)
+        elif info.building_radius > 0:
+            self.buildings[name][_id] = e
+            self._kinds[_id] = ("building", name)
+            if name == "nucleus":
+                self.main_building = e
+            elif name in ["drill", "pump"]:
+                self._add_drill(e)
+        else:
+            self.others[_id] = e
+            self._kinds[_id] = ("other", name)
+        return True
+
+    def _add_drill(self, e):
+        # the recipe (and so the mined resource) may not be known yet when the drill appears
+        recipe = self.proto_table.get(e.Recipe.recipe) if e.has("Recipe") else None
+        if recipe is None:
+            self._pending_drills[e.Id] = e
+            return
+        self._pending_drills.pop(e.Id, None)
+        self.drills[recipe.name][e.Id] = e
+        self._drill_resources[e.Id] = recipe.name
+
+    def _remove(self, _id):
+        self._protos.pop(_id, None)
+        self._pending_drills.pop(_id, None)
+        resource = self._drill_resources.pop(_id, None)
+        if resource is not None:
+            self.drills[resource].pop(_id, None)
+        kind = self._kinds.pop(_id, None)
+        if kind is None:
+            return
+        kind, name = kind
+        if kind == "enemy nucleus":
+            self.enemy_main_buildings.pop(_id, None)
+        elif kind == "construction":
+            self.constructions[name].pop(_id, None)
+        elif kind == "resource":
+            name, amount = self.resources.pop(_id)
+            self.resource_counts[name] -= amount
+        elif kind == "atv":
+            self.atvs.pop(_id, None)
+        elif kind == "juggernaut":
+            self.juggernauts.pop(_id, None)
+        elif kind == "colossus":
+            self.colossus.pop(_id, None)
+        elif kind == "building":
+            self.buildings[name].pop(_id, None)
+            if self.main_building is not None and self.main_building.Id == _id:
+                self.main_building = None
+        else:
+            self.others.pop(_id, None)